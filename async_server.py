@@ -0,0 +1,130 @@
+import asyncio
+from framing import (HEADER, DEFAULT_MAX_FRAME_SIZE, FrameTooLarge, pack_frame, wire_version,
+                     binary_to_base64, parse_control, control_payload, CONTROL_HELLO,
+                     CONTROL_HELLO_ACK, WIRE_BINARY, MAX_WIRE_VERSION)
+from flow_control import OutboundQueue, RateLimiter
+
+DEFAULT_QUEUE_SIZE = 256
+
+
+class AsyncRelay:
+    """Single-threaded asyncio relay speaking the same 4-byte length-prefixed framing as server.py.
+
+    Every client gets a bounded OutboundQueue drained by its own writer task,
+    so fan-out only enqueues and never waits on a slow peer. A peer whose queue
+    is full is disconnected instead of stalling the sender. With `rate` set,
+    each connection may send `rate` messages/s (bursts of `burst`); the rest
+    are dropped before fan-out. Clients that did not negotiate binary
+    envelopes receive them re-encoded as Base64.
+    """
+
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE, max_frame_size=DEFAULT_MAX_FRAME_SIZE,
+                 rate=None, burst=None):
+        self.queue_size = queue_size
+        self.max_frame_size = max_frame_size
+        self.limiter = RateLimiter(rate, burst or max(1, int(rate))) if rate else None
+        self.clients = {}
+        self.binary_clients = set()
+        self.stats = {
+            'connections': 0,
+            'messages_relayed': 0,
+            'rate_limited': 0,
+            'slow_consumers_evicted': 0
+        }
+
+    async def handle_client(self, reader, writer):
+        addr = writer.get_extra_info('peername')
+        print(f"[+] New connection from {addr}")
+        queue = OutboundQueue(high=self.queue_size * 3 // 4, low=self.queue_size // 4, limit=self.queue_size)
+        ready = asyncio.Event()
+        self.clients[writer] = (queue, ready)
+        self.stats['connections'] += 1
+        sender = asyncio.create_task(self._drain_queue(writer, queue, ready))
+
+        try:
+            while True:
+                raw_len = await reader.readexactly(HEADER.size)
+                msg_len = HEADER.unpack(raw_len)[0]
+                if msg_len > self.max_frame_size:
+                    raise FrameTooLarge(f"Frame of {msg_len} bytes exceeds limit of {self.max_frame_size}")
+                msg = await reader.readexactly(msg_len)
+                control = parse_control(msg)
+                if control is not None:
+                    if control[0] == CONTROL_HELLO:
+                        self.negotiate(writer, queue, control[1])
+                        ready.set()
+                    continue
+                if self.limiter and not self.limiter.allow(writer):
+                    self.stats['rate_limited'] += 1
+                    continue
+                self.broadcast(writer, raw_len + msg)
+        except FrameTooLarge as e:
+            print(f"[!] Dropping {addr}: {e}")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            print(f"[-] Connection closed: {addr}")
+            self.clients.pop(writer, None)
+            self.binary_clients.discard(writer)
+            if self.limiter:
+                self.limiter.forget(writer)
+            sender.cancel()
+            writer.close()
+
+    def negotiate(self, writer, queue, version):
+        """Answer a client's HELLO and remember whether it reads binary envelopes."""
+        version = min(version, MAX_WIRE_VERSION)
+        if version >= WIRE_BINARY:
+            self.binary_clients.add(writer)
+        queue.put(pack_frame(control_payload(CONTROL_HELLO_ACK, version)))
+
+    def broadcast(self, source, frame):
+        """Queue an already-framed packet for every peer except the sender."""
+        self.stats['messages_relayed'] += 1
+        legacy_frame = frame
+        if wire_version(frame[HEADER.size:]) == WIRE_BINARY:
+            legacy_frame = pack_frame(binary_to_base64(frame[HEADER.size:]))
+        for writer, (queue, ready) in list(self.clients.items()):
+            if writer is source:
+                continue
+            if queue.put(frame if writer in self.binary_clients else legacy_frame):
+                ready.set()
+            else:
+                self.stats['slow_consumers_evicted'] += 1
+                self.clients.pop(writer, None)
+                self.binary_clients.discard(writer)
+                writer.close()
+
+    async def _drain_queue(self, writer, queue, ready):
+        try:
+            while True:
+                await ready.wait()
+                frames = queue.take()
+                if not queue:
+                    ready.clear()
+                if frames:
+                    writer.writelines(frames)
+                    await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+
+async def serve(host='localhost', port=9999, queue_size=DEFAULT_QUEUE_SIZE,
+                max_frame_size=DEFAULT_MAX_FRAME_SIZE, rate=None, burst=None):
+    relay = AsyncRelay(queue_size, max_frame_size, rate, burst)
+    server = await asyncio.start_server(relay.handle_client, host, port)
+    print(f"[*] SecureTalk Server (asyncio) started on port {port}...")
+    async with server:
+        await server.serve_forever()
+
+
+def start_async_server(host='localhost', port=9999, queue_size=DEFAULT_QUEUE_SIZE,
+                       max_frame_size=DEFAULT_MAX_FRAME_SIZE, rate=None, burst=None):
+    try:
+        asyncio.run(serve(host, port, queue_size, max_frame_size, rate, burst))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    start_async_server()
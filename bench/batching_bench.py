@@ -0,0 +1,151 @@
+"""Latency vs throughput of per-message emits and MessageBatcher micro-batches.
+
+Usage:
+    python -m bench.batching_bench [--recipients 50] [--rates 1000 2000 5000 10000 20000]
+                                   [--windows 0 5 20 50] [--max-messages 32] [--seconds 2]
+
+A local load generator. One room of `recipients` members is modelled with
+socket pairs. A reader process drains every member's socket, decoding the
+first member's frames. The server loop offers messages at a fixed rate,
+open loop, and sends one length-prefixed Socket.IO EVENT frame per emit to
+every member. Window 0 means receive_message per message. Otherwise the
+messages go through MessageBatcher with that window in ms, and every
+member gets one receive_batch frame per batch. Latency runs from when a
+message was due until the first member decoded it, so it includes queueing
+once the server falls behind.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import selectors
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wire_json
+from framing import HEADER, HEADER_SIZE, pack_frame
+from message_batcher import MessageBatcher
+from wire_json import RawJSON
+
+TEXT = 'x' * 80
+
+
+def read_all(socks, server_socks, results):
+    """Drain every socket until the server closes them; report the first one's latencies."""
+    for sock in server_socks:
+        sock.close()
+    selector = selectors.DefaultSelector()
+    for sock in socks:
+        selector.register(sock, selectors.EVENT_READ)
+    watched = socks[0]
+    buf = bytearray()
+    latencies = []
+    last = None
+    while selector.get_map():
+        for key, _ in selector.select():
+            chunk = key.fileobj.recv(1 << 16)
+            if not chunk:
+                selector.unregister(key.fileobj)
+                continue
+            if key.fileobj is not watched:
+                continue
+            buf += chunk
+            now = time.monotonic()
+            while len(buf) >= HEADER_SIZE:
+                size = HEADER.unpack_from(buf)[0]
+                if len(buf) < HEADER_SIZE + size:
+                    break
+                event, data = json.loads(bytes(buf[HEADER_SIZE + 2:HEADER_SIZE + size]))
+                del buf[:HEADER_SIZE + size]
+                for message in (data if event == 'receive_batch' else [data]):
+                    latencies.append(now - message['due'])
+                last = now
+    results.send((latencies, last))
+
+
+def serve(socks, rate, seconds, batcher):
+    frames = 0
+
+    def broadcast(event, data):
+        nonlocal frames
+        frame = pack_frame(('42' + wire_json.dumps([event, data], separators=(',', ':'))).encode())
+        for sock in socks:
+            sock.sendall(frame)
+        frames += 1
+
+    total = int(rate * seconds)
+    start = time.monotonic()
+    next_flush = start + batcher.tick if batcher else float('inf')
+    i = 0
+    while i < total:
+        now = time.monotonic()
+        if now >= next_flush:
+            for batch in batcher.flush().values():
+                broadcast('receive_batch', batch)
+            next_flush = now + batcher.tick
+            continue
+        due = start + i / rate
+        if due > now:
+            time.sleep(min(due, next_flush) - now)
+            continue
+        packet = RawJSON.encode({'username': 'alice', 'message': TEXT, 'room': 'BENCH1', 'due': due})
+        i += 1
+        if batcher is None:
+            broadcast('receive_message', packet)
+            continue
+        batch = batcher.add('BENCH1', packet)
+        if batch is not None:
+            broadcast('receive_batch', batch)
+    if batcher:
+        for batch in batcher.flush(force=True).values():
+            broadcast('receive_batch', batch)
+    return start, frames
+
+
+def run(recipients, rate, seconds, window_ms, max_messages):
+    pairs = [socket.socketpair() for _ in range(recipients)]
+    receiving, results = multiprocessing.Pipe(duplex=False)
+    reader = multiprocessing.Process(target=read_all, args=([b for _, b in pairs], [a for a, _ in pairs], results))
+    reader.start()
+    for _, b in pairs:
+        b.close()
+    batcher = MessageBatcher(window_ms / 1000, max_messages) if window_ms else None
+    start, frames = serve([a for a, _ in pairs], rate, seconds, batcher)
+    for a, _ in pairs:
+        a.close()
+    latencies, last = receiving.recv()
+    reader.join()
+    latencies.sort()
+    elapsed = (last - start) if last else seconds
+    return {
+        'delivered': len(latencies) / elapsed,
+        'frames': frames / elapsed,
+        'p50': latencies[len(latencies) // 2] if latencies else 0.0,
+        'p99': latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] if latencies else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recipients', type=int, default=50)
+    parser.add_argument('--rates', type=int, nargs='+', default=[1000, 2000, 5000, 10000, 20000])
+    parser.add_argument('--windows', type=float, nargs='+', default=[0, 5, 20, 50],
+                        help="batch windows in ms; 0 = one emit per message")
+    parser.add_argument('--max-messages', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    args = parser.parse_args()
+
+    print(f"{args.recipients} recipients, batches of up to {args.max_messages}, {args.seconds:g} s per point")
+    print(f"{'window ms':<11}{'offered/s':>11}{'delivered/s':>13}{'frames/s':>11}{'p50 ms':>10}{'p99 ms':>10}")
+    for window in args.windows:
+        for rate in args.rates:
+            r = run(args.recipients, rate, args.seconds, window, args.max_messages)
+            print(f"{('off' if not window else f'{window:g}'):<11}{rate:>11,}{r['delivered']:>13,.0f}"
+                  f"{r['frames']:>11,.0f}{r['p50'] * 1e3:>10.1f}{r['p99'] * 1e3:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
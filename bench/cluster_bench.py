@@ -0,0 +1,118 @@
+"""Messages/sec of the web server with 1, 2, 4 and 8 worker processes.
+
+Usage:
+    python -m bench.cluster_bench [--clients 40] [--rooms 3] [--messages 50] [--workers 1 2 4 8]
+
+For each worker count, starts a Unix-socket bus broker and that many
+web_chat_server.py workers on one port, connects a swarm of Socket.IO
+clients (websocket transport, needs the `python-socketio` client and
+`websocket-client` packages) spread over the public rooms, and has every
+client send `messages` messages. Throughput is counted at the receivers,
+so a message that never crossed between workers is not counted.
+"""
+import argparse
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import socketio
+
+from message_bus import BusBroker
+from web_cluster import start_workers
+
+# Capacities 50, 25 and 50; RANDOM only holds 10 users.
+ROOMS = ['MAIN01', 'TECH02', 'default']
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('localhost', port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server did not start on port {port}")
+
+
+class SwarmClient:
+    def __init__(self, url, room):
+        self.received = 0
+        self.joined = threading.Event()
+        self.sio = socketio.Client(reconnection=False)
+        self.sio.on('room_joined', lambda data: self.joined.set())
+        self.sio.on('receive_message', self._on_message)
+        self.sio.connect(url, transports=['websocket'])
+        self.sio.emit('join_room', {'room': room})
+
+    def _on_message(self, data):
+        self.received += 1
+
+
+def run(workers, args):
+    port = free_port()
+    path = os.path.join(tempfile.gettempdir(), f'securetalk-bench-bus-{os.getpid()}.sock')
+    broker = BusBroker(path).start()
+    env = dict(os.environ, PYTHONUNBUFFERED='1')
+    procs = start_workers(workers, port, f'unix://{path}', env)
+    try:
+        wait_for_port(port)
+        time.sleep(1.0)
+        url = f'http://localhost:{port}'
+        rooms = ROOMS[:args.rooms]
+        clients = [SwarmClient(url, rooms[i % len(rooms)]) for i in range(args.clients)]
+        for client in clients:
+            client.joined.wait(10)
+        per_room = {room: sum(1 for i in range(args.clients) if rooms[i % len(rooms)] == room) for room in rooms}
+        expected = sum(n * (n - 1) * args.messages for n in per_room.values())
+
+        start = time.perf_counter()
+        for i in range(args.messages):
+            for client in clients:
+                client.sio.emit('send_message', {'message': f'bench message {i}'})
+        deadline = time.time() + args.timeout
+        while sum(c.received for c in clients) < expected and time.time() < deadline:
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        delivered = sum(c.received for c in clients)
+
+        for client in clients:
+            client.sio.disconnect()
+        return args.clients * args.messages / elapsed, delivered / elapsed, delivered, expected
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+        broker.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=40)
+    parser.add_argument('--rooms', type=int, default=3, choices=range(1, len(ROOMS) + 1))
+    parser.add_argument('--messages', type=int, default=50)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--timeout', type=float, default=60.0)
+    args = parser.parse_args()
+
+    print(f"{'workers':>8}{'sent/s':>12}{'delivered/s':>14}{'delivered':>20}")
+    for workers in args.workers:
+        sent, delivered_rate, delivered, expected = run(workers, args)
+        print(f"{workers:>8}{sent:>12,.0f}{delivered_rate:>14,.0f}{delivered:>12}/{expected}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Batch ASCON API vs a per-call encrypt_message()/decrypt_message() loop.
+
+Usage:
+    python -m bench.crypto_batch_bench [--count 2000] [--payload 128] [--workers 4]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from encryption_utils import (encrypt_message, decrypt_message, encrypt_many, decrypt_many,
+                              generate_shared_key)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--payload', type=int, default=128)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    key = generate_shared_key()
+    messages = ['m' * args.payload] * args.count
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        # Warm the pool so process start-up is not billed to the first run.
+        list(pool.map(abs, range(args.workers)))
+
+        blobs, t_loop_enc = timed(lambda: [encrypt_message(key, m) for m in messages])
+        _, t_loop_dec = timed(lambda: [decrypt_message(key, b) for b in blobs])
+        _, t_batch_enc = timed(lambda: encrypt_many(key, messages))
+        _, t_batch_dec = timed(lambda: decrypt_many(key, blobs))
+        _, t_pool_enc = timed(lambda: encrypt_many(key, messages, executor=pool))
+        plain, t_pool_dec = timed(lambda: decrypt_many(key, blobs, executor=pool))
+        assert plain == messages
+
+    print(f"{args.count} messages of {args.payload} B, {args.workers} worker processes")
+    print(f"{'strategy':<22}{'encrypt msg/s':>15}{'decrypt msg/s':>15}")
+    for name, t_enc, t_dec in (
+        ('per-call loop', t_loop_enc, t_loop_dec),
+        ('encrypt/decrypt_many', t_batch_enc, t_batch_dec),
+        (f'..._many x{args.workers} procs', t_pool_enc, t_pool_dec),
+    ):
+        print(f"{name:<22}{args.count / t_enc:>15,.0f}{args.count / t_dec:>15,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Stress test: latency of well-behaved relay clients next to one abusive client.
+
+Usage:
+    python -m bench.flow_control_stress [--mode both] [--clients 20] [--client-rate 5]
+                                        [--seconds 5] [--rate 20] [--queue-size 256]
+
+Starts server.py in a subprocess for each scenario. `clients` well-behaved
+connections each send a timestamped probe `client-rate` times a second
+and read everything relayed to them; latency is measured from a probe
+being sent until each other client has read it. Two extra connections
+come from a separate process: a flooder that sends as fast as the relay
+accepts, and a slow consumer that never reads.
+
+    calm        no abuser
+    unlimited   abuser, no --rate and an effectively unbounded --queue-size
+    bounded     abuser, --queue-size as given but no --rate
+    limited     abuser, --rate and --queue-size as given
+
+`delivered` is the share of probes that reached every other client.
+`relayed/s` is flood frames that reached a well-behaved client, per
+second; the rest were dropped by the relay's rate limit. `slow evicted`
+tells whether the relay disconnected the consumer that never read.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.relay_load import free_port, start_server
+from framing import HEADER, pack_frame
+
+PROBE = b'probe '
+FLOOD = pack_frame(b'flood ' + b'x' * 58)
+UNBOUNDED_QUEUE = 10 ** 7
+
+
+def abuse(port, seconds, results):
+    """Flood the relay from one connection while another never reads."""
+    slow = socket.create_connection(('localhost', port))
+    slow.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    flooder = socket.create_connection(('localhost', port))
+    # The flooder reads what is relayed to it, so only its sending is abusive.
+    threading.Thread(target=lambda: all(iter(lambda: flooder.recv(1 << 16), b'')), daemon=True).start()
+    burst = FLOOD * 64
+    sent = 0
+    deadline = time.monotonic() + seconds
+    try:
+        while time.monotonic() < deadline:
+            flooder.sendall(burst)
+            sent += 64
+    except OSError:
+        pass
+    # An evicted consumer finds the end of the stream once it does read.
+    slow.settimeout(0.5)
+    evicted = False
+    deadline = time.monotonic() + 2.0
+    try:
+        while time.monotonic() < deadline:
+            if not slow.recv(1 << 16):
+                evicted = True
+                break
+    except socket.timeout:
+        pass
+    except OSError:
+        evicted = True
+    results.send((sent, evicted))
+    flooder.close()
+    slow.close()
+
+
+async def client(index, port, args, stop, latencies, counts):
+    reader, writer = await asyncio.open_connection('localhost', port)
+
+    async def send():
+        interval = 1 / args.client_rate
+        next_send = time.monotonic() + interval * index / args.clients
+        while not stop.is_set():
+            await asyncio.sleep(max(0.0, next_send - time.monotonic()))
+            writer.write(pack_frame(PROBE + struct.pack('>d', time.monotonic()).hex().encode()))
+            counts['probes'] += 1
+            await writer.drain()
+            next_send += interval
+
+    async def receive():
+        while True:
+            size = HEADER.unpack(await reader.readexactly(HEADER.size))[0]
+            payload = await reader.readexactly(size)
+            if payload.startswith(PROBE):
+                latencies.append(time.monotonic() - struct.unpack('>d', bytes.fromhex(payload[6:].decode()))[0])
+            else:
+                counts['flood'] += 1
+
+    sender = asyncio.create_task(send())
+    receiver = asyncio.create_task(receive())
+    await stop.wait()
+    # Probes already sent get a moment to arrive.
+    await asyncio.sleep(0.5)
+    sender.cancel()
+    receiver.cancel()
+    writer.close()
+
+
+async def run_clients(port, args, abuser):
+    stop = asyncio.Event()
+    latencies = []
+    counts = {'probes': 0, 'flood': 0}
+    tasks = [asyncio.create_task(client(i, port, args, stop, latencies, counts))
+             for i in range(args.clients)]
+    await asyncio.sleep(0.5)
+    if abuser:
+        abuser.start()
+    start = time.monotonic()
+    counts['flood'] = 0
+    await asyncio.sleep(args.seconds)
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    counts['seconds'] = time.monotonic() - start
+    return latencies, counts
+
+
+def run(mode, scenario, args):
+    port = free_port()
+    options = ['--queue-size', str(UNBOUNDED_QUEUE if scenario == 'unlimited' else args.queue_size)]
+    if scenario == 'limited':
+        options += ['--rate', str(args.rate)]
+    proc = start_server(mode, port, options)
+    try:
+        abuser = receiving = None
+        if scenario != 'calm':
+            receiving, results = multiprocessing.Pipe(duplex=False)
+            abuser = multiprocessing.Process(target=abuse, args=(port, args.seconds, results))
+        latencies, counts = asyncio.run(run_clients(port, args, abuser))
+        sent, evicted = receiving.recv() if abuser else (0, None)
+        if abuser:
+            abuser.join()
+    finally:
+        proc.terminate()
+        proc.wait()
+    latencies.sort()
+    return {
+        'delivered': len(latencies) / (counts['probes'] * (args.clients - 1)),
+        'p50': latencies[len(latencies) // 2] if latencies else 0.0,
+        'p99': latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] if latencies else 0.0,
+        'max': latencies[-1] if latencies else 0.0,
+        'flood_sent': sent / args.seconds,
+        'flood_relayed': counts['flood'] / args.clients / counts['seconds'],
+        'evicted': evicted
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=['threaded', 'async', 'both'], default='both')
+    parser.add_argument('--scenarios', nargs='+', choices=['calm', 'unlimited', 'bounded', 'limited'],
+                        default=['calm', 'unlimited', 'bounded', 'limited'])
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--client-rate', type=float, default=5.0, help="probes/s per well-behaved client")
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--rate', type=float, default=20.0, help="relay --rate for the limited scenario")
+    parser.add_argument('--queue-size', type=int, default=256, help="relay --queue-size for the limited scenario")
+    args = parser.parse_args()
+
+    modes = ['threaded', 'async'] if args.mode == 'both' else [args.mode]
+    print(f"{args.clients} clients x {args.client_rate:g} probes/s, {args.seconds:g} s; "
+          f"limited = --rate {args.rate:g} --queue-size {args.queue_size}")
+    print(f"{'mode':<10}{'scenario':<11}{'delivered':>10}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+          f"{'flood sent/s':>14}{'relayed/s':>11}{'slow evicted':>14}")
+    for mode in modes:
+        for scenario in args.scenarios:
+            r = run(mode, scenario, args)
+            evicted = '-' if r['evicted'] is None else ('yes' if r['evicted'] else 'no')
+            print(f"{mode:<10}{scenario:<11}{r['delivered']:>10.1%}{r['p50'] * 1e3:>9.1f}{r['p99'] * 1e3:>9.1f}"
+                  f"{r['max'] * 1e3:>9.1f}{r['flood_sent']:>14,.0f}{r['flood_relayed']:>11,.0f}{evicted:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Micro-benchmark: legacy recvall() concatenation vs framing.FrameReader.
+
+Usage:
+    python -m bench.framing_bench [--bytes 268435456]
+
+Streams length-prefixed frames of 64 B, 4 KB and 1 MB through a local
+socketpair and measures how fast each reader can take them apart.
+"""
+import argparse
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from framing import FrameReader, pack_frame
+
+SIZES = [64, 4 * 1024, 1024 * 1024]
+
+
+def legacy_recvall(sock, n):
+    """The recvall() that server.py and client.py used before framing.py."""
+    data = b''
+    while len(data) < n:
+        packet = sock.recv(n - len(data))
+        if not packet:
+            return None
+        data += packet
+    return data
+
+
+def legacy_read_frame(sock):
+    raw_len = legacy_recvall(sock, 4)
+    if not raw_len:
+        return None
+    return legacy_recvall(sock, struct.unpack('>I', raw_len)[0])
+
+
+def stream_frames(sock, blob, repeats):
+    try:
+        for _ in range(repeats):
+            sock.sendall(blob)
+    finally:
+        sock.shutdown(socket.SHUT_WR)
+
+
+def run(frame_size, frame_count, reader_name):
+    frame = pack_frame(os.urandom(frame_size))
+    per_blob = max(1, min(frame_count, (1 << 20) // len(frame)))
+    repeats = max(1, frame_count // per_blob)
+    blob = frame * per_blob
+
+    tx, rx = socket.socketpair()
+    sender = threading.Thread(target=stream_frames, args=(tx, blob, repeats))
+    start = time.perf_counter()
+    sender.start()
+
+    received = 0
+    if reader_name == 'recvall':
+        while legacy_read_frame(rx) is not None:
+            received += 1
+    else:
+        reader = FrameReader(rx, max_frame_size=frame_size)
+        while reader.read_frame() is not None:
+            received += 1
+
+    elapsed = time.perf_counter() - start
+    sender.join()
+    tx.close()
+    rx.close()
+    assert received == per_blob * repeats
+    return received / elapsed, received * frame_size / elapsed / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bytes', type=int, default=256 * 1024 * 1024,
+                        help="approximate payload volume streamed per run")
+    args = parser.parse_args()
+
+    print(f"{'frame':>8} {'reader':<12}{'frames/s':>14}{'MB/s':>10}")
+    for size in SIZES:
+        count = max(16, min(args.bytes // size, 2_000_000))
+        for name in ('recvall', 'FrameReader'):
+            fps, mbps = run(size, count, name)
+            print(f"{size:>8} {name:<12}{fps:>14,.0f}{mbps:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
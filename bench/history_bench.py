@@ -0,0 +1,108 @@
+"""Memory and append throughput of room history: list of dicts vs RoomHistory.
+
+Usage:
+    python -m bench.history_bench [--rooms 10000] [--messages 50] [--extra 20]
+
+Fills every room with `messages` entries and then appends `extra` more
+per room, so the trimming path runs too. Appends are timed on one fill
+and memory is the tracemalloc peak of a second one. Replay time is the
+cost of building and JSON-serializing each room's join payload: the
+whole history before, the last 20 entries with RoomHistory.
+
+RoomHistory stores PacketRecords as handle_message() does, so its
+appends include serializing the packet; the server pays that once per
+message for fan-out anyway, and replay then only splices the stored text.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wire_json
+from encryption_utils import encrypt_message, generate_shared_key
+from message_history import PacketRecord, RoomHistory
+from wire_json import RawJSON
+
+DEPTH = 50
+
+
+def legacy_append(history, username, message, timestamp, encrypted):
+    """handle_message() before RoomHistory: a dict per message, trimmed with pop(0)."""
+    history.append({
+        'username': username,
+        'message': message,
+        'timestamp': timestamp,
+        'encrypted_message': None
+    })
+    if len(history) > DEPTH:
+        history.pop(0)
+    history[-1]['encrypted_message'] = encrypted.decode('utf-8')
+
+
+def legacy_replay(history, limit):
+    return json.dumps({'messages': history})
+
+
+def ring_append(history, username, message, timestamp, encrypted):
+    packet = RawJSON.encode({'username': username, 'message': message, 'timestamp': timestamp,
+                             'encrypted_message': encrypted.decode('utf-8')})
+    history.append(PacketRecord(username, timestamp, packet))
+
+
+def ring_replay(history, limit):
+    return wire_json.dumps({'messages': [record.to_wire() for record in history.page(limit)],
+                            'total': len(history)})
+
+
+def fill(args, make, append, encrypted):
+    rooms = [make() for _ in range(args.rooms)]
+    for i in range(args.messages + args.extra):
+        message = f'message number {i} with some chat text'
+        for room_index, history in enumerate(rooms):
+            append(history, f'User{room_index % 97}', message, '12:00:00', encrypted)
+    return rooms
+
+
+def run(args, make, append, replay, encrypted):
+    total = args.messages + args.extra
+    start = time.perf_counter()
+    rooms = fill(args, make, append, encrypted)
+    elapsed = time.perf_counter() - start
+
+    del rooms
+    tracemalloc.start()
+    rooms = fill(args, make, append, encrypted)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for history in rooms:
+        replay(history, 20)
+    replay_time = time.perf_counter() - start
+    return total * args.rooms / elapsed, peak, replay_time / args.rooms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=10000)
+    parser.add_argument('--messages', type=int, default=50)
+    parser.add_argument('--extra', type=int, default=20)
+    args = parser.parse_args()
+
+    encrypted = encrypt_message(generate_shared_key(), 'message number 0 with some chat text')
+    print(f"{args.rooms} rooms x {args.messages} messages (+{args.extra} trimmed)")
+    print(f"{'store':<14}{'appends/s':>12}{'peak MiB':>10}{'replay us':>11}")
+    for name, make, append, replay in (
+        ('list+dict', list, legacy_append, legacy_replay),
+        ('RoomHistory', lambda: RoomHistory(DEPTH), ring_append, ring_replay),
+    ):
+        rate, peak, replay_time = run(args, make, append, replay, encrypted)
+        print(f"{name:<14}{rate:>12,.0f}{peak / 2 ** 20:>10.1f}{replay_time * 1e6:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Reconnect payload and join cost: full history replay vs seq-based delta sync.
+
+Usage:
+    python -m bench.history_sync_bench [--clients 50] [--rate 5] [--duration 600] [--outage 1 5 30] [--session 30]
+
+Simulates one room on a virtual clock. Messages arrive at `rate` per
+second; each client stays connected for an exponentially distributed
+time averaging `session` seconds, then drops for one averaging `outage`
+seconds and rejoins. On every rejoin the server builds the
+message_history reply handle_join_room() would send:
+
+  full   the history page every join got before, up to 50 messages
+  delta  only the messages from the client's since_seq on, or, when some
+         were already evicted, what is held plus a gap marker
+
+Bytes are the encoded Socket.IO packet; join time is building and
+encoding that reply, median and p99 over all rejoins. Both modes replay
+the same schedule.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wire_json
+from encryption_utils import encrypt_message, generate_shared_key
+from message_history import PacketRecord, RoomHistory
+from wire_json import RawJSON
+
+ROOM = 'BENCH1'
+TEXTS = ['on my way', 'did anyone look at the deploy logs from last night?',
+         'Running a few minutes late, start without me and I will catch up on the notes', 'ok', 'thanks!']
+
+
+def encode(event, data):
+    # What python-socketio writes for one EVENT packet.
+    return '42' + wire_json.dumps([event, data], separators=(',', ':'))
+
+
+def message_packet(key, seq, text):
+    size = len(text.encode('utf-8'))
+    return RawJSON.encode({
+        'username': f'User{seq % 50}', 'message': text, 'encrypted_message': encrypt_message(key, text).decode('utf-8'),
+        'seq': seq, 'timestamp': '12:00:00', 'room': ROOM, 'bytes_sent': size,
+        'packet_info': {'size_bytes': size, 'protocol': 'WebSocket', 'encrypted': True, 'e2e': False}
+    })
+
+
+def full_reply(history, since_seq):
+    return {'messages': [record.to_wire() for record in history.page()], 'total': len(history)}
+
+
+def delta_reply(history, since_seq):
+    reply = {'epoch': history.epoch, 'next_seq': history.next_seq}
+    records = history.since(since_seq)
+    if records is not None:
+        reply.update(sync='delta', messages=[record.to_wire() for record in records])
+    else:
+        reply.update(sync='gap', missed=history.first_seq - since_seq,
+                     messages=[record.to_wire() for record in history])
+    return reply
+
+
+def schedule(clients, session, outage, duration, seed=1):
+    """Time-ordered (rejoin time, drop time) pairs for `clients` clients churning over `duration` seconds."""
+    rng = random.Random(seed)
+    rejoins = []
+    for _ in range(clients):
+        t = rng.expovariate(1 / session)
+        while t < duration:
+            dropped = t
+            t += rng.expovariate(1 / outage)
+            rejoins.append((t, dropped))
+            t += rng.expovariate(1 / session)
+    rejoins.sort()
+    return [(t, dropped) for t, dropped in rejoins if t < duration]
+
+
+def run(build, packets, rate, rejoins):
+    """Replay the schedule; returns (bytes per rejoin, join seconds, gap replies)."""
+    history = RoomHistory(epoch='bench')
+    sizes, times, gaps = [], [], 0
+    sent = 0
+    for t, dropped in rejoins:
+        while sent < len(packets) and sent / rate <= t:
+            history.append(PacketRecord('alice', '12:00:00', packets[sent], sent))
+            sent += 1
+        # Live messages reached the client until it dropped; it asks for the first one after.
+        since_seq = int(dropped * rate) + 1
+        start = time.perf_counter()
+        reply = build(history, since_seq)
+        wire = encode('message_history', reply)
+        times.append(time.perf_counter() - start)
+        sizes.append(len(wire))
+        gaps += reply.get('sync') == 'gap'
+    return sizes, times, gaps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--rate', type=float, default=5, help="room messages per second")
+    parser.add_argument('--duration', type=float, default=600, help="simulated seconds")
+    parser.add_argument('--session', type=float, default=30, help="mean seconds connected")
+    parser.add_argument('--outage', type=float, nargs='+', default=[1, 5, 30], help="mean seconds disconnected")
+    args = parser.parse_args()
+
+    key = generate_shared_key()
+    packets = [message_packet(key, seq, TEXTS[seq % len(TEXTS)]) for seq in range(int(args.duration * args.rate) + 1)]
+    print(f"{args.clients} clients, {args.rate:g} msg/s, {args.session:g} s sessions, history depth 50")
+    print(f"{'outage s':>9}  {'mode':<7}{'rejoins':>8}{'bytes/rejoin':>14}{'total KB':>10}"
+          f"{'join p50 us':>13}{'join p99 us':>13}{'gaps':>6}")
+    for outage in args.outage:
+        rejoins = schedule(args.clients, args.session, outage, args.duration)
+        for mode, build in (('full', full_reply), ('delta', delta_reply)):
+            sizes, times, gaps = run(build, packets, args.rate, rejoins)
+            p99 = sorted(times)[int(len(times) * 0.99)]
+            print(f"{outage:>9g}  {mode:<7}{len(sizes):>8}{statistics.mean(sizes):>14,.0f}{sum(sizes) / 1024:>10,.0f}"
+                  f"{statistics.median(times) * 1e6:>13.1f}{p99 * 1e6:>13.1f}{gaps if mode == 'delta' else '-':>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Per-room key derivation: derive-per-message vs the KeyManager cache.
+
+Usage:
+    python -m bench.key_cache_bench [--rooms 100] [--messages 5000]
+
+Encrypts messages spread round-robin over N rooms three ways: deriving
+the room key with scrypt for every message, deriving it with HKDF for
+every message, and asking KeyManager for it. Receivers decrypt through
+a second KeyManager that derived each room's key once when it joined.
+The derivation counts show the KDF is paid once per room, not per
+message.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from encryption_utils import encrypt_message, decrypt_message
+from key_manager import KeyManager, derive_master_key, hkdf, room_tag
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=100)
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--scrypt-messages', type=int, default=50,
+                        help="scrypt is slow; it is timed over this many messages only")
+    args = parser.parse_args()
+
+    rooms = [f'ROOM{i:04d}' for i in range(args.rooms)]
+    master = derive_master_key('SecureTalkDemo2024')
+    plan = [rooms[i % len(rooms)] for i in range(args.messages)]
+
+    def scrypt_each():
+        for room in plan[:args.scrypt_messages]:
+            encrypt_message(derive_master_key(room)[:16], 'hello')
+
+    def hkdf_each():
+        for room in plan:
+            encrypt_message(hkdf(master, room_tag(room), room.encode()), 'hello')
+
+    sender = KeyManager(master)
+    blobs = []
+
+    def cached():
+        for room in plan:
+            key_id, key = sender.room_key(room)
+            blobs.append(encrypt_message(key, 'hello', key_id=key_id))
+
+    receiver = KeyManager(master)
+    for room in rooms:
+        receiver.key_for_id(room_tag(room) + bytes(4), room)
+    receiver.stats['derivations'] = 0
+
+    def receive():
+        for blob in blobs:
+            decrypt_message(receiver, blob)
+
+    t_scrypt = timed(scrypt_each) / args.scrypt_messages
+    t_hkdf = timed(hkdf_each) / args.messages
+    t_cached = timed(cached) / args.messages
+    t_recv = timed(receive) / args.messages
+
+    print(f"{args.messages} messages over {args.rooms} rooms")
+    print(f"{'strategy':<26}{'us/msg':>10}{'derivations':>14}")
+    print(f"{'scrypt per message':<26}{t_scrypt * 1e6:>10.1f}{args.scrypt_messages:>14}")
+    print(f"{'HKDF per message':<26}{t_hkdf * 1e6:>10.1f}{args.messages:>14}")
+    print(f"{'KeyManager (encrypt)':<26}{t_cached * 1e6:>10.1f}{sender.stats['derivations']:>14}")
+    print(f"{'KeyManager (decrypt)':<26}{t_recv * 1e6:>10.1f}{receiver.stats['derivations']:>14}")
+
+
+if __name__ == "__main__":
+    main()
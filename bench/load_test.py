@@ -0,0 +1,568 @@
+"""Scenario load tests of the web server and the TCP relay, saved as comparable JSON.
+
+Usage:
+    python -m bench.load_test --list
+    python -m bench.load_test --server tcp-threaded --scenario steady [--users 100] [--rooms 4]
+                              [--rate 1] [--payload 64:0.6,256:0.3,2048:0.1] [--churn 0.1]
+                              [--typing 5] [--seconds 10] [--seed 1]
+                              [--env SECURETALK_BATCH_WINDOW_MS=20]
+                              [--output run.json] [--baseline base.json] [--tolerance 10]
+
+Servers:
+    web            web_chat_server.py over Socket.IO websockets; needs the
+                   python-socketio client and websocket-client packages
+    tcp-threaded   server.py --mode threaded
+    tcp-async      server.py --mode async
+
+A scenario sets defaults for the load; options given on the command line
+override them. `users` clients spread over `rooms` rooms, each sending
+`rate` messages/s with exponential gaps, sizes drawn from `payload`
+(bytes:weight,...). `churn` is how often a client leaves and reconnects
+(per client per second) and `typing` how many typing events each web
+client sends per second. The TCP relay has no rooms or typing, so those
+options are ignored there. Schedules come from `seed`, so a rerun offers
+the same load.
+
+Clients connect and join, warm up for a second, then every message sent
+during the `seconds` measurement window is tracked until it reaches each
+member of its room (or the drain second after the window runs out).
+Relay payloads are real encrypt_message() output. Latency is end to end,
+per delivery. Server CPU and RSS come from /proc (Linux). Client CPU is
+reported too: near 100% means the swarm, not the server, was the limit.
+
+--output saves the run as JSON; --baseline compares against a saved run
+and marks each metric that got worse by more than --tolerance percent.
+--fail-on-regression then exits with status 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.relay_load import free_port, raise_fd_limit
+from encryption_utils import encrypt_message, generate_shared_key
+from framing import HEADER, pack_frame
+
+SERVERS = ['web', 'tcp-threaded', 'tcp-async']
+
+SCENARIOS = {
+    'steady': {
+        'users': 100, 'rooms': 4, 'rate': 1.0, 'payload': '64:0.6,256:0.3,2048:0.1',
+        'churn': 0.0, 'typing': 0.0, 'seconds': 10.0
+    },
+    'fanout': {
+        'users': 300, 'rooms': 1, 'rate': 0.2, 'payload': '128',
+        'churn': 0.0, 'typing': 0.0, 'seconds': 10.0
+    },
+    'churn': {
+        'users': 100, 'rooms': 4, 'rate': 0.5, 'payload': '128',
+        'churn': 0.2, 'typing': 0.0, 'seconds': 10.0
+    },
+    'typing-storm': {
+        'users': 100, 'rooms': 2, 'rate': 0.2, 'payload': '64',
+        'churn': 0.0, 'typing': 10.0, 'seconds': 10.0
+    },
+    'large-payloads': {
+        'users': 50, 'rooms': 2, 'rate': 0.5, 'payload': '4096:0.5,32768:0.5',
+        'churn': 0.0, 'typing': 0.0, 'seconds': 10.0
+    }
+}
+LOAD_OPTIONS = ['users', 'rooms', 'rate', 'payload', 'churn', 'typing', 'seconds']
+
+# Limits that would otherwise reject the offered load rather than measure it.
+WEB_ENV = {'SECURETALK_SEND_RATE': '0', 'SECURETALK_ROOM_RATE': '0'}
+WARMUP = 1.0
+DRAIN = 1.0
+JOIN_TIMEOUT = 30
+
+# metric: True if higher is better
+COMPARED = {
+    'deliveries_per_s': True,
+    'delivery_ratio': True,
+    'p50_ms': False,
+    'p99_ms': False,
+    'server_cpu_pct': False,
+    'server_rss_peak_mb': False
+}
+
+
+def parse_payload(spec):
+    """"64:0.8,1024:0.2" -> ([64, 1024], [0.8, 0.2]); a bare size has weight 1."""
+    sizes, weights = [], []
+    for part in spec.split(','):
+        size, _, weight = part.partition(':')
+        sizes.append(int(size))
+        weights.append(float(weight or 1))
+    return sizes, weights
+
+
+class Recorder:
+    """Send times of tracked messages and the latencies of their deliveries."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent_at = {}
+        self.latencies = []
+        self.measuring = False
+        self.counts = {'sent': 0, 'expected': 0, 'deliveries': 0, 'joins': 0, 'leaves': 0,
+                       'typing_sent': 0, 'typing_received': 0, 'errors': 0}
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counts[name] += n
+
+    def sent(self, key, recipients):
+        if not self.measuring:
+            return
+        with self.lock:
+            self.sent_at[key] = time.perf_counter()
+            self.counts['sent'] += 1
+            self.counts['expected'] += recipients
+
+    def received(self, key):
+        sent_at = self.sent_at.get(key)
+        if sent_at is not None:
+            latency = time.perf_counter() - sent_at
+            with self.lock:
+                self.latencies.append(latency)
+                self.counts['deliveries'] += 1
+
+
+class ProcessSampler(threading.Thread):
+    """Polls a process's CPU time and RSS from /proc; values stay None where /proc is missing."""
+
+    def __init__(self, pid, interval=0.2):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.rss_peak = None
+        self.rss_last = None
+        self._done = threading.Event()
+        self._marks = []
+
+    def cpu_seconds(self):
+        try:
+            with open(f'/proc/{self.pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def rss_mb(self):
+        try:
+            with open(f'/proc/{self.pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) / 1024
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def mark(self):
+        self._marks.append((time.perf_counter(), self.cpu_seconds()))
+
+    def cpu_pct(self):
+        (t0, cpu0), (t1, cpu1) = self._marks[:2]
+        if cpu0 is None or cpu1 is None:
+            return None
+        return 100 * (cpu1 - cpu0) / (t1 - t0)
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            rss = self.rss_mb()
+            if rss is not None:
+                self.rss_last = rss
+                self.rss_peak = max(self.rss_peak or 0, rss)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+def start_target(server, port, env):
+    if server == 'web':
+        command = [os.path.join(ROOT, 'web_chat_server.py')]
+    else:
+        command = [os.path.join(ROOT, 'server.py'), '--mode', server.split('-', 1)[1], '--port', str(port)]
+    proc = subprocess.Popen([sys.executable] + command, env=dict(os.environ, PORT=str(port), **env),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, preexec_fn=raise_fd_limit)
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('localhost', port), timeout=0.2).close()
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{server} server did not start on port {port}")
+
+
+class Swarm:
+    """Shared state of one run: load settings, the recorder and current room sizes."""
+
+    def __init__(self, config):
+        self.config = config
+        self.sizes, self.weights = parse_payload(config['payload'])
+        self.recorder = Recorder()
+        self.members = {}
+        self.stopping = False
+        self.client_cpu_pct = None
+        self._window = None
+
+    def user_rng(self, uid):
+        return random.Random(f"{self.config['seed']}:{uid}")
+
+    def next_gap(self, rng, rate):
+        return rng.expovariate(rate) if rate > 0 else float('inf')
+
+    def joined(self, room, delta):
+        with self.recorder.lock:
+            self.members[room] = self.members.get(room, 0) + delta
+        if not self.stopping:
+            self.recorder.count('joins' if delta > 0 else 'leaves')
+
+    def recipients(self, room):
+        return max(0, self.members.get(room, 0) - 1)
+
+    def connected(self):
+        return sum(self.members.values())
+
+    def begin(self, sampler):
+        """Start tracking sends."""
+        self.recorder.measuring = True
+        sampler.mark()
+        self._window = (time.perf_counter(), os.times())
+
+    def end(self, sampler):
+        """Stop tracking sends and tell users to stop; returns the window length."""
+        self.recorder.measuring = False
+        sampler.mark()
+        self.stopping = True
+        (start, cpu), now, times = self._window, time.perf_counter(), os.times()
+        self.client_cpu_pct = 100 * (times.user + times.system - cpu.user - cpu.system) / (now - start)
+        return now - start
+
+
+async def tcp_user(swarm, uid, port, key, texts):
+    config, rec = swarm.config, swarm.recorder
+    rng = swarm.user_rng(uid)
+    while not swarm.stopping:
+        try:
+            reader, writer = await asyncio.open_connection('localhost', port)
+        except OSError:
+            rec.count('errors')
+            await asyncio.sleep(0.1)
+            continue
+        swarm.joined('relay', 1)
+        receiving = asyncio.create_task(tcp_receive(reader, rec))
+        now = time.perf_counter()
+        leave_at = now + swarm.next_gap(rng, config['churn'])
+        next_send = now + swarm.next_gap(rng, config['rate'])
+        try:
+            while not swarm.stopping:
+                wake = min(leave_at, next_send)
+                await asyncio.sleep(min(0.2, max(0.0, wake - time.perf_counter())))
+                now = time.perf_counter()
+                if now >= leave_at:
+                    break
+                if now < next_send:
+                    continue
+                payload = encrypt_message(key, texts[rng.choices(swarm.sizes, swarm.weights)[0]])
+                rec.sent(payload[-24:], swarm.recipients('relay'))
+                writer.write(pack_frame(payload))
+                await writer.drain()
+                next_send += swarm.next_gap(rng, config['rate'])
+        except ConnectionError:
+            rec.count('errors')
+        finally:
+            swarm.joined('relay', -1)
+            if swarm.stopping:
+                await asyncio.sleep(DRAIN)
+            receiving.cancel()
+            writer.close()
+
+
+async def tcp_receive(reader, rec):
+    try:
+        while True:
+            size = HEADER.unpack(await reader.readexactly(HEADER.size))[0]
+            rec.received((await reader.readexactly(size))[-24:])
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+
+
+async def run_tcp(swarm, port, sampler):
+    config = swarm.config
+    key = generate_shared_key()
+    texts = {size: 'x' * size for size in swarm.sizes}
+    users = [asyncio.create_task(tcp_user(swarm, uid, port, key, texts)) for uid in range(config['users'])]
+    deadline = time.time() + JOIN_TIMEOUT
+    while swarm.connected() < config['users'] and time.time() < deadline:
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(WARMUP)
+    swarm.begin(sampler)
+    await asyncio.sleep(config['seconds'])
+    elapsed = swarm.end(sampler)
+    await asyncio.gather(*users, return_exceptions=True)
+    return elapsed
+
+
+def create_rooms(url, count, users):
+    codes = []
+    for i in range(count):
+        body = json.dumps({'name': f'Load test {i}', 'maxUsers': users + 1, 'isPublic': False}).encode()
+        request = urllib.request.Request(f'{url}/api/create-room', body, {'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=10) as response:
+            codes.append(json.loads(response.read())['roomCode'])
+    return codes
+
+
+def web_user(swarm, uid, url, room, socketio):
+    config, rec = swarm.config, swarm.recorder
+    rng = swarm.user_rng(uid)
+    own = f'{uid:x}.'
+    seq = 0
+
+    def on_message(data):
+        rec.received(data.get('message', '').split(' ', 1)[0])
+
+    def on_batch(messages):
+        for data in messages:
+            key = data.get('message', '').split(' ', 1)[0]
+            if not key.startswith(own):
+                rec.received(key)
+
+    while not swarm.stopping:
+        sio = socketio.Client(reconnection=False)
+        joined = threading.Event()
+        sio.on('room_joined', lambda data: joined.set())
+        sio.on('receive_message', on_message)
+        sio.on('receive_batch', on_batch)
+        sio.on('typing_users', lambda data: rec.count('typing_received'))
+        try:
+            sio.connect(url, transports=['websocket'])
+            sio.emit('join_room', {'room': room})
+            if not joined.wait(10):
+                raise TimeoutError('join timed out')
+        except Exception:
+            rec.count('errors')
+            sio.disconnect()
+            time.sleep(0.1)
+            continue
+        swarm.joined(room, 1)
+        now = time.perf_counter()
+        leave_at = now + swarm.next_gap(rng, config['churn'])
+        next_send = now + swarm.next_gap(rng, config['rate'])
+        next_typing = now + swarm.next_gap(rng, config['typing'])
+        try:
+            while not swarm.stopping:
+                wake = min(leave_at, next_send, next_typing)
+                time.sleep(min(0.2, max(0.0, wake - time.perf_counter())))
+                now = time.perf_counter()
+                if now >= leave_at:
+                    break
+                if now >= next_typing:
+                    sio.emit('typing', {'is_typing': True})
+                    rec.count('typing_sent')
+                    next_typing += swarm.next_gap(rng, config['typing'])
+                if now >= next_send:
+                    size = rng.choices(swarm.sizes, swarm.weights)[0]
+                    key = f'{own}{seq:x}'
+                    seq += 1
+                    rec.sent(key, swarm.recipients(room))
+                    sio.emit('send_message', {'message': f"{key} {'x' * max(1, size - len(key) - 1)}"})
+                    next_send += swarm.next_gap(rng, config['rate'])
+        except Exception:
+            rec.count('errors')
+        finally:
+            swarm.joined(room, -1)
+            if swarm.stopping:
+                time.sleep(DRAIN)
+            sio.disconnect()
+
+
+def run_web(swarm, url, sampler):
+    try:
+        import socketio
+    except ImportError:
+        raise SystemExit("the web server needs the python-socketio client: pip install python-socketio websocket-client")
+    config = swarm.config
+    rooms = create_rooms(url, config['rooms'], config['users'])
+    threads = [threading.Thread(target=web_user, args=(swarm, uid, url, rooms[uid % len(rooms)], socketio),
+                                daemon=True)
+               for uid in range(config['users'])]
+    for thread in threads:
+        thread.start()
+    deadline = time.time() + JOIN_TIMEOUT
+    while swarm.connected() < config['users'] and time.time() < deadline:
+        time.sleep(0.05)
+    time.sleep(WARMUP)
+    swarm.begin(sampler)
+    time.sleep(config['seconds'])
+    elapsed = swarm.end(sampler)
+    for thread in threads:
+        thread.join(DRAIN + 10)
+    return elapsed
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else None
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(config, env):
+    port = free_port()
+    proc = start_target(config['server'], port, env)
+    sampler = ProcessSampler(proc.pid)
+    sampler.start()
+    swarm = Swarm(config)
+    try:
+        if config['server'] == 'web':
+            elapsed = run_web(swarm, f'http://localhost:{port}', sampler)
+        else:
+            elapsed = asyncio.run(run_tcp(swarm, port, sampler))
+    finally:
+        sampler.stop()
+        proc.terminate()
+        proc.wait()
+
+    counts = swarm.recorder.counts
+    latencies = sorted(swarm.recorder.latencies)
+    ms = lambda value: None if value is None else round(value * 1e3, 3)
+    return {
+        'sent': counts['sent'],
+        'sent_per_s': counts['sent'] / elapsed,
+        'deliveries': counts['deliveries'],
+        'deliveries_per_s': counts['deliveries'] / elapsed,
+        'delivery_ratio': counts['deliveries'] / counts['expected'] if counts['expected'] else None,
+        'p50_ms': ms(percentile(latencies, 0.5)),
+        'p99_ms': ms(percentile(latencies, 0.99)),
+        'max_ms': ms(latencies[-1] if latencies else None),
+        'joins': counts['joins'],
+        'leaves': counts['leaves'],
+        'typing_sent': counts['typing_sent'],
+        'typing_received': counts['typing_received'],
+        'errors': counts['errors'],
+        'server_cpu_pct': sampler.cpu_pct(),
+        'server_rss_mb': sampler.rss_last,
+        'server_rss_peak_mb': sampler.rss_peak,
+        'client_cpu_pct': swarm.client_cpu_pct,
+        'window_s': elapsed
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print new vs baseline per metric; returns the metrics that got worse than `tolerance` %."""
+    if baseline['config'] != results['config']:
+        changed = sorted(k for k in set(baseline['config']) | set(results['config'])
+                         if baseline['config'].get(k) != results['config'].get(k))
+        print(f"[!] baseline was run with different settings: {', '.join(changed)}")
+    print(f"\n{'metric':<22}{'baseline':>12}{'this run':>12}{'change':>10}")
+    worse = []
+    for metric, higher_is_better in COMPARED.items():
+        old, new = baseline['results'].get(metric), results['results'].get(metric)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        regressed = (change < -tolerance) if higher_is_better else (change > tolerance)
+        if regressed:
+            worse.append(metric)
+        print(f"{metric:<22}{old:>12,.2f}{new:>12,.2f}{change:>+9.1f}%{'  worse' if regressed else ''}")
+    return worse
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--list', action='store_true', help="show the scenarios and exit")
+    parser.add_argument('--server', choices=SERVERS, default='tcp-threaded')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='steady')
+    parser.add_argument('--users', type=int)
+    parser.add_argument('--rooms', type=int)
+    parser.add_argument('--rate', type=float, help="messages/s per user")
+    parser.add_argument('--payload', help="message sizes in bytes with weights, e.g. 64:0.8,1024:0.2")
+    parser.add_argument('--churn', type=float, help="leave-and-reconnects/s per user")
+    parser.add_argument('--typing', type=float, help="typing events/s per web user")
+    parser.add_argument('--seconds', type=float, help="length of the measurement window")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help="extra environment for the server process; may be repeated")
+    parser.add_argument('--output', help="write the run to this JSON file")
+    parser.add_argument('--baseline', help="compare against a JSON file saved with --output")
+    parser.add_argument('--tolerance', type=float, default=10.0, help="percent change counted as a regression")
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    if args.list:
+        for name, load in SCENARIOS.items():
+            print(f"{name:<16}" + ' '.join(f'{key}={value}' for key, value in load.items()))
+        return
+
+    config = dict(SCENARIOS[args.scenario], server=args.server, scenario=args.scenario, seed=args.seed)
+    config.update({key: getattr(args, key) for key in LOAD_OPTIONS if getattr(args, key) is not None})
+    env = dict(WEB_ENV) if args.server == 'web' else {}
+    env.update(item.split('=', 1) for item in args.env)
+    config['env'] = env
+    if args.server != 'web' and (config['rooms'] > 1 or config['typing']):
+        print("[!] the TCP relay has one shared room and no typing events; --rooms and --typing are ignored")
+
+    limit = raise_fd_limit()
+    if config['users'] * (3 if args.server == 'web' else 2) + 64 > limit:
+        print(f"[!] File descriptor limit is {limit}; some connections will fail")
+
+    results = {
+        'config': config,
+        'started': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count()
+    }
+    results['results'] = r = run(config, env)
+
+    print(f"{config['server']} / {config['scenario']}: {config['users']} users, {config['rooms']} rooms, "
+          f"{config['rate']:g} msg/s each, payload {config['payload']}, churn {config['churn']:g}, "
+          f"typing {config['typing']:g}, {config['seconds']:g} s")
+    print(f"{'sent/s':>10}{'delivered/s':>13}{'ratio':>8}{'p50 ms':>9}{'p99 ms':>9}"
+          f"{'server CPU':>12}{'RSS MB':>9}{'client CPU':>12}{'errors':>8}")
+    fmt = lambda value, spec: '-' if value is None else format(value, spec)
+    print(f"{r['sent_per_s']:>10,.0f}{r['deliveries_per_s']:>13,.0f}{fmt(r['delivery_ratio'], '.1%'):>8}"
+          f"{fmt(r['p50_ms'], '.1f'):>9}{fmt(r['p99_ms'], '.1f'):>9}{fmt(r['server_cpu_pct'], '.0f') + '%':>12}"
+          f"{fmt(r['server_rss_peak_mb'], '.0f'):>9}{r['client_cpu_pct']:>11.0f}%{r['errors']:>8}")
+    if config['churn'] or config['typing']:
+        print(f"joins {r['joins']}, leaves {r['leaves']}, typing sent {r['typing_sent']}, "
+              f"typing_users received {r['typing_received']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"[*] saved to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            worse = compare(results, json.load(f), args.tolerance)
+        if worse and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
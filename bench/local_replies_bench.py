@@ -0,0 +1,72 @@
+"""Throughput and quality of the offline smart-reply engine.
+
+Usage:
+    python -m bench.local_replies_bench [--rounds 200] [--labels bench/smart_reply_labels.json]
+
+Times LocalReplyEngine.suggest() over the labeled messages `rounds`
+times and reports suggestions/sec and per-call latency, then scores
+the engine on the labeled set: a message labeled with an intent must be
+recognized as that intent, and one labeled null (off-topic) must fall
+below the confidence threshold so it is left to the LLM or generic replies.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from local_replies import LocalReplyEngine
+from metrics import Histogram
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--labels', default=os.path.join(ROOT, 'bench', 'smart_reply_labels.json'))
+    args = parser.parse_args()
+
+    with open(args.labels) as f:
+        labels = json.load(f)
+    messages = [message for message, _ in labels]
+
+    start = time.perf_counter()
+    engine = LocalReplyEngine()
+    build = time.perf_counter() - start
+
+    latency = Histogram()
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        for message in messages:
+            t = time.perf_counter()
+            engine.suggest(message)
+            latency.observe(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    calls = args.rounds * len(messages)
+
+    print(f"index built in {build * 1e3:.1f} ms")
+    print(f"{calls} suggestions: {calls / elapsed:,.0f}/s, "
+          f"p50 {latency.quantile(0.5) * 1e6:.0f} us, p99 {latency.quantile(0.99) * 1e6:.0f} us")
+
+    correct = recognized = abstained = 0
+    misses = []
+    for message, expected in labels:
+        intent, score = engine.classify(message)
+        got = intent if score >= engine.min_score else None
+        if got == expected:
+            correct += 1
+            recognized += expected is not None
+            abstained += expected is None
+        else:
+            misses.append((message, expected, intent, score))
+    on_topic = sum(1 for _, expected in labels if expected is not None)
+    print(f"accuracy {correct}/{len(labels)} ({correct / len(labels):.1%}): "
+          f"intents {recognized}/{on_topic}, off-topic abstentions {abstained}/{len(labels) - on_topic}")
+    for message, expected, intent, score in misses:
+        print(f"  miss: {message!r} expected {expected}, nearest {intent} ({score:.2f})")
+
+
+if __name__ == "__main__":
+    main()
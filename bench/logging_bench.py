@@ -0,0 +1,99 @@
+"""Join and message throughput with print() logging vs the queued structured logger.
+
+Usage:
+    python -m bench.logging_bench [--members 50] [--joins 5000] [--messages 20000]
+
+Replays only the logging done by handle_join_room() and handle_message()
+for a room of `members` sessions, writing to a line-buffered /dev/null
+so every line costs a write() as it does on a terminal or pipe. Before:
+the six [DEBUG] prints per join (two of them walking every member) and
+one [MSG] print with the plaintext per message. After: the log_event()
+calls at the default INFO level, with the queue listener writing in
+batches on its own thread, and the same at DEBUG level. Rates count the
+handler thread only; the listener is drained and stopped afterwards.
+"""
+import argparse
+import contextlib
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from structured_logging import log_event, setup_logging
+
+
+def make_room(members):
+    active_users = {f'sid{i:05d}': {'username': f'User{i}'} for i in range(members)}
+    return active_users, set(active_users)
+
+
+def join_print(active_users, users, sid):
+    print(f"[+] {active_users[sid]['username']} joined room MAIN01 (General Chat)")
+    print(f"[DEBUG] Room MAIN01 now has {len(users)} users")
+    print(f"[DEBUG] Session IDs in room: {list(users)}")
+    print(f"[DEBUG] Usernames in room: {[active_users[s]['username'] for s in users]}")
+    print(f"[DEBUG] Current user session ID: {sid}")
+    print(f"[DEBUG] Was already in room: {False}")
+
+
+def join_logged(log, active_users, users, sid):
+    log_event(log, logging.INFO, 'user joined', username=active_users[sid]['username'], room='MAIN01',
+              room_name='General Chat')
+    log_event(log, logging.DEBUG, 'room members', room='MAIN01', count=len(users),
+              sids=lambda: list(users),
+              usernames=lambda: [active_users[s]['username'] for s in users if s in active_users],
+              sid=sid, was_already_in_room=False)
+
+
+def message_print(i):
+    print(f"[MSG] User{i % 50} in MAIN01: hello everyone, this is message number {i}")
+
+
+def message_logged(log, i):
+    message = f"hello everyone, this is message number {i}"
+    log_event(log, logging.DEBUG, 'message', username=f'User{i % 50}', room='MAIN01',
+              size=len(message.encode('utf-8')))
+
+
+def rate(count, fn):
+    start = time.perf_counter()
+    for i in range(count):
+        fn(i)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--members', type=int, default=50)
+    parser.add_argument('--joins', type=int, default=5000)
+    parser.add_argument('--messages', type=int, default=20000)
+    args = parser.parse_args()
+
+    active_users, users = make_room(args.members)
+    sids = list(users)
+    results = []
+    with open(os.devnull, 'w', buffering=1) as devnull:
+        with contextlib.redirect_stdout(devnull):
+            joins = rate(args.joins, lambda i: join_print(active_users, users, sids[i % len(sids)]))
+            messages = rate(args.messages, message_print)
+        results.append(('print()', joins, messages))
+
+        for level in ('INFO', 'DEBUG'):
+            # The rate limiter is opened up so every record reaches the writer.
+            listener = setup_logging('bench', level=level, stream=devnull, rate=1e9, burst=1e9)
+            log = logging.getLogger('bench.web')
+            joins = rate(args.joins, lambda i: join_logged(log, active_users, users, sids[i % len(sids)]))
+            messages = rate(args.messages, lambda i: message_logged(log, i))
+            listener.stop()
+            results.append((f'queued, {level}', joins, messages))
+
+    print(f"room of {args.members} members")
+    print(f"{'logging':<16}{'joins/s':>12}{'messages/s':>14}")
+    for name, joins, messages in results:
+        print(f"{name:<16}{joins:>12,.0f}{messages:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
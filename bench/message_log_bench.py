@@ -0,0 +1,82 @@
+"""Append rate and replay latency of the durable message log.
+
+Usage:
+    python -m bench.message_log_bench [--messages 1000000] [--rooms 10] [--dir /tmp/securetalk-log]
+
+Appends `messages` encrypted payloads spread over `rooms` rooms with
+group commit, then a smaller run that fsyncs every message for
+comparison. Replay latency is measured for "last 50" and "since seq X"
+reads at random positions in the log.
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from encryption_utils import encrypt_message, generate_shared_key
+from message_log import MessageLog
+
+
+def append_run(directory, count, rooms, payload, **kwargs):
+    shutil.rmtree(directory, ignore_errors=True)
+    log = MessageLog(directory, **kwargs)
+    start = time.perf_counter()
+    for i in range(count):
+        log.append(rooms[i % len(rooms)], 'User1', payload, durable=kwargs.get('fsync_batch') == 1)
+    log.close()
+    elapsed = time.perf_counter() - start
+    return count / elapsed, log.stats
+
+
+def percentile(samples, q):
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=1_000_000)
+    parser.add_argument('--rooms', type=int, default=10)
+    parser.add_argument('--fsync-messages', type=int, default=2000,
+                        help="messages in the fsync-per-message comparison run")
+    parser.add_argument('--reads', type=int, default=1000)
+    parser.add_argument('--dir', default=os.path.join(tempfile.gettempdir(), 'securetalk-log-bench'))
+    args = parser.parse_args()
+
+    payload = encrypt_message(generate_shared_key(), 'a typical chat message of moderate length')
+    rooms = [f'ROOM{i:02d}' for i in range(args.rooms)]
+
+    rate, stats = append_run(args.dir, args.fsync_messages, rooms, payload, fsync_batch=1)
+    print(f"fsync per message: {rate:>12,.0f} appends/s ({stats['fsyncs']} fsyncs)")
+    rate, stats = append_run(args.dir, args.messages, rooms, payload)
+    print(f"group commit:      {rate:>12,.0f} appends/s ({stats['fsyncs']} fsyncs, {stats['commits']} commits)")
+
+    log = MessageLog(args.dir)
+    per_room = args.messages // len(rooms)
+    last, since = [], []
+    for _ in range(args.reads):
+        room = random.choice(rooms)
+        start = time.perf_counter()
+        records = log.read_last(room, 50)
+        last.append(time.perf_counter() - start)
+        assert len(records) == min(50, per_room)
+        seq = random.randrange(max(1, per_room - 50))
+        start = time.perf_counter()
+        log.read_since(room, seq, 50)
+        since.append(time.perf_counter() - start)
+    log.close()
+
+    print(f"{args.messages:,} messages in {len(rooms)} rooms")
+    for name, samples in (('last 50', last), ('since seq X (50)', since)):
+        print(f"{name:<18} p50 {statistics.median(samples) * 1e6:8.1f} us"
+              f"   p99 {percentile(samples, 0.99) * 1e6:8.1f} us")
+    shutil.rmtree(args.dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Server CPU per chat message: per-recipient encoding vs one precomputed packet vs E2E relay.
+
+Usage:
+    python -m bench.message_pipeline_bench [--messages 2000] [--recipients 10 50 500] [--replays 1] [--repeat 3]
+
+Runs the work handle_message() does for one message in a room of
+`recipients` members, plus `replays` later history replays of it. Socket
+writes are the same in every mode and are left out; each cell is the best
+of `repeat` interleaved runs.
+
+  per-recipient  old path on python-socketio < 5.4: encrypt, build the
+                 receive_message dict and encode it once per recipient,
+                 encode message_sent, store a HistoryRecord and rebuild
+                 its dict on each replay
+  encode-once    old path where the room emit is encoded once
+                 (python-socketio >= 5.4)
+  packet         encrypt, serialize the packet once with message_packet()
+                 and reuse those bytes for fan-out, message_sent and replay
+  e2e relay      the client's ciphertext is relayed without server crypto
+"""
+import argparse
+import base64
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wire_json
+from encryption_utils import encrypt_message, generate_shared_key
+from message_history import PacketRecord, RoomHistory
+from wire_json import RawJSON
+
+ROOM = 'BENCH1'
+TEXT = 'Running a few minutes late, start without me and I will catch up on the notes'
+
+
+class HistoryRecord:
+    """A stored message as the per-recipient path kept it: fields, rebuilt into a dict on every replay."""
+
+    __slots__ = ('username', 'message', 'timestamp', 'encrypted', 'size', 'seq')
+
+    def __init__(self, username, message, timestamp, encrypted=None, seq=None):
+        self.username = sys.intern(username)
+        self.message = message
+        self.timestamp = timestamp
+        self.encrypted = encrypted
+        self.seq = seq
+        self.size = len(message) + len(timestamp or '') + (len(encrypted) if encrypted else 0)
+
+    def to_dict(self):
+        return {
+            'username': self.username,
+            'message': self.message,
+            'timestamp': self.timestamp,
+            'encrypted_message': self.encrypted.decode('ascii') if self.encrypted else None
+        }
+
+
+def encode(event, data):
+    # What python-socketio writes for one EVENT packet.
+    return '42' + wire_json.dumps([event, data], separators=(',', ':'))
+
+
+def packet_info(size, e2e=False):
+    return {'size_bytes': size, 'protocol': 'WebSocket', 'encrypted': True, 'e2e': e2e}
+
+
+def old_path(key, recipients, replays, per_recipient):
+    history = RoomHistory()
+
+    def handle(i):
+        message = f'{TEXT} #{i}'
+        size = len(message.encode('utf-8'))
+        encrypted = encrypt_message(key, message)
+        record = history.append(HistoryRecord('alice', message, '12:00:00', encrypted))
+        payload = {
+            'username': 'alice', 'message': message, 'encrypted_message': encrypted.decode('utf-8'),
+            'timestamp': '12:00:00', 'room': ROOM, 'packet_info': packet_info(size), 'room_stats': None
+        }
+        for _ in range(recipients - 1 if per_recipient else 1):
+            encode('receive_message', payload)
+        encode('message_sent', {'message': message, 'timestamp': '12:00:00', 'bytes_sent': size,
+                                'room': ROOM, 'room_stats': None})
+        for _ in range(replays):
+            encode('message_history', {'messages': [record.to_dict()]})
+    return handle
+
+
+def packet_path(key, recipients, replays):
+    history = RoomHistory()
+
+    def handle(i):
+        message = f'{TEXT} #{i}'
+        size = len(message.encode('utf-8'))
+        encrypted = encrypt_message(key, message)
+        packet = RawJSON.encode({
+            'username': 'alice', 'message': message, 'encrypted_message': encrypted.decode('utf-8'),
+            'timestamp': '12:00:00', 'room': ROOM, 'bytes_sent': size, 'packet_info': packet_info(size)
+        })
+        record = history.append(PacketRecord('alice', '12:00:00', packet))
+        encode('receive_message', packet)
+        encode('message_sent', packet)
+        for _ in range(replays):
+            encode('message_history', {'messages': [record.to_wire()]})
+    return handle
+
+
+def e2e_path(recipients, replays):
+    history = RoomHistory()
+    ciphertexts = [base64.b64encode(os.urandom(12 + len(TEXT) + 6 + 16)).decode('ascii') for _ in range(64)]
+
+    def handle(i):
+        ciphertext = ciphertexts[i % len(ciphertexts)]
+        logged = b'e2e:' + ciphertext.encode('ascii')
+        size = len(ciphertext)
+        packet = RawJSON.encode({
+            'username': 'alice', 'ciphertext': ciphertext, 'timestamp': '12:00:00', 'room': ROOM,
+            'bytes_sent': size, 'packet_info': packet_info(size, e2e=True)
+        })
+        record = history.append(PacketRecord('alice', '12:00:00', packet))
+        encode('receive_message', packet)
+        encode('message_sent', packet)
+        for _ in range(replays):
+            encode('message_history', {'messages': [record.to_wire()]})
+        return logged
+    return handle
+
+
+def cpu_per_message(handle, messages):
+    handle(0)
+    start = time.process_time()
+    for i in range(messages):
+        handle(i)
+    return (time.process_time() - start) / messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--recipients', type=int, nargs='+', default=[10, 50, 500])
+    parser.add_argument('--replays', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    key = generate_shared_key()
+    modes = ('per-recipient', 'encode-once', 'packet', 'e2e relay')
+    print(f"{args.messages} messages, {args.replays} replay(s) each; CPU µs per message")
+    print(f"{'recipients':<12}" + ''.join(f'{mode:>15}' for mode in modes))
+    for recipients in args.recipients:
+        handlers = (old_path(key, recipients, args.replays, per_recipient=True),
+                    old_path(key, recipients, args.replays, per_recipient=False),
+                    packet_path(key, recipients, args.replays),
+                    e2e_path(recipients, args.replays))
+        runs = [[] for _ in handlers]
+        for _ in range(args.repeat):
+            for run, handle in zip(runs, handlers):
+                run.append(cpu_per_message(handle, args.messages))
+        cells = [min(run) * 1e6 for run in runs]
+        print(f"{recipients:<12}" + ''.join(f'{cell:>15.1f}' for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Load generator comparing the threaded and asyncio TCP relays.
+
+Usage:
+    python -m bench.relay_load --mode both --connections 2000 --senders 10 --messages 200
+
+Starts server.py in a subprocess for each mode, opens the requested number of
+connections, then lets a few of them send length-prefixed encrypted messages
+while every other connection counts what it receives.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import socket
+import struct
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from encryption_utils import encrypt_message, generate_shared_key
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    try:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ValueError, OSError):
+        pass
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+def start_server(mode, port, options=()):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'server.py'), '--mode', mode, '--port', str(port), *options],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, preexec_fn=raise_fd_limit
+    )
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('localhost', port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f"{mode} server did not start on port {port}")
+
+
+async def open_connections(port, count, batch=200):
+    conns = []
+    for start in range(0, count, batch):
+        tasks = [asyncio.open_connection('localhost', port) for _ in range(min(batch, count - start))]
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if not isinstance(result, Exception):
+                conns.append(result)
+    return conns
+
+
+async def count_frames(reader, counter, expected, done):
+    try:
+        while counter[0] < expected:
+            raw_len = await reader.readexactly(4)
+            await reader.readexactly(struct.unpack('>I', raw_len)[0])
+            counter[0] += 1
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    done.set()
+
+
+async def run_mode(mode, args, frame):
+    port = free_port()
+    proc = start_server(mode, port)
+    try:
+        conns = await open_connections(port, args.connections)
+        held = len(conns)
+        await asyncio.sleep(0.5)
+
+        senders = conns[:args.senders]
+        receivers = conns[args.senders:]
+        expected_per_receiver = len(senders) * args.messages
+        counters = [[0] for _ in receivers]
+        events = [asyncio.Event() for _ in receivers]
+        readers = [
+            asyncio.create_task(count_frames(r, c, expected_per_receiver, e))
+            for (r, _), c, e in zip(receivers, counters, events)
+        ]
+
+        start = time.perf_counter()
+        for _ in range(args.messages):
+            for _, writer in senders:
+                writer.write(frame)
+            await asyncio.gather(*(w.drain() for _, w in senders))
+
+        try:
+            await asyncio.wait_for(asyncio.gather(*(e.wait() for e in events)), args.timeout)
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - start
+
+        delivered = sum(c[0] for c in counters)
+        sent = len(senders) * args.messages
+        for task in readers:
+            task.cancel()
+        for _, writer in conns:
+            writer.close()
+
+        return {
+            'mode': mode,
+            'connections_held': held,
+            'messages_sent': sent,
+            'deliveries': delivered,
+            'expected_deliveries': expected_per_receiver * len(receivers),
+            'elapsed_s': elapsed,
+            'messages_per_sec': sent / elapsed if elapsed else 0.0,
+            'deliveries_per_sec': delivered / elapsed if elapsed else 0.0
+        }
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=['threaded', 'async', 'both'], default='both')
+    parser.add_argument('--connections', type=int, default=500)
+    parser.add_argument('--senders', type=int, default=5)
+    parser.add_argument('--messages', type=int, default=100)
+    parser.add_argument('--payload', type=int, default=64, help="plaintext size in bytes")
+    parser.add_argument('--timeout', type=float, default=60.0)
+    args = parser.parse_args()
+
+    limit = raise_fd_limit()
+    if args.connections + 64 > limit:
+        print(f"[!] File descriptor limit is {limit}; some connections will fail")
+
+    payload = encrypt_message(generate_shared_key(), 'x' * args.payload)
+    frame = struct.pack('>I', len(payload)) + payload
+
+    modes = ['threaded', 'async'] if args.mode == 'both' else [args.mode]
+    print(f"{'mode':<10}{'held':>8}{'sent/s':>12}{'delivered/s':>14}{'delivered':>14}")
+    for mode in modes:
+        r = asyncio.run(run_mode(mode, args, frame))
+        print(f"{r['mode']:<10}{r['connections_held']:>8}{r['messages_per_sec']:>12.0f}"
+              f"{r['deliveries_per_sec']:>14.0f}{r['deliveries']:>8}/{r['expected_deliveries']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""/api/rooms latency: full-list rebuild per request vs RoomRegistry pages.
+
+Usage:
+    python -m bench.room_directory_bench [--rooms 100 10000 100000] [--limit 50] [--requests 200]
+
+For each directory size, times the old get_rooms() body (a dict of every
+public room, built and serialized per request) against RoomRegistry.page():
+a cold build after a membership change, a cached page, a page 90% of the
+way through the cursor chain, and a name-prefix search. `304` is a cached
+page whose ETag the client already holds, so no body is sent.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from room_registry import RoomRegistry
+
+WORDS = ['alpha', 'book', 'chess', 'dev', 'economics', 'film', 'games', 'history', 'jazz', 'kotlin',
+         'linux', 'music', 'news', 'opera', 'python', 'quiz', 'rust', 'sports', 'travel', 'writers']
+
+
+def make_rooms(count, seed=1):
+    rng = random.Random(seed)
+    rooms = {}
+    while len(rooms) < count:
+        code = ''.join(rng.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789', k=6))
+        rooms[code] = {
+            'name': f'{rng.choice(WORDS).title()} {rng.choice(WORDS)} {len(rooms)}',
+            'description': 'A room for talking about things',
+            'maxUsers': 10,
+            'features': ['encryption'],
+            'isPublic': rng.random() < 0.9,
+            'created_at': time.time(),
+            'creator': 'Anonymous'
+        }
+    return rooms
+
+
+def old_get_rooms(stored_rooms, active_rooms):
+    user_counts = {code: len(room['users']) for code, room in active_rooms.items()}
+    return json.dumps({
+        code: {
+            'code': code,
+            'name': room['name'],
+            'description': room['description'],
+            'maxUsers': room['maxUsers'],
+            'currentUsers': user_counts.get(code, 0),
+            'isPublic': room.get('isPublic', True)
+        }
+        for code, room in stored_rooms.items()
+        if room.get('isPublic', True)
+    })
+
+
+def timed(fn, requests):
+    fn()
+    start = time.perf_counter()
+    for _ in range(requests):
+        fn()
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, nargs='+', default=[100, 10000, 100000])
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"page size {args.limit}; µs per request (response KB)")
+    print(f"{'rooms':>8}{'full list':>18}{'cold page':>14}{'cached':>10}{'304':>8}{'deep page':>14}{'search':>10}")
+    for count in args.rooms:
+        rooms = make_rooms(count)
+        active_rooms = {code: {'users': {f'sid{i}' for i in range(3)}} for code in list(rooms)[:count // 10]}
+        registry = RoomRegistry(lambda codes: [len(active_rooms[c]['users']) if c in active_rooms else 0
+                                               for c in codes])
+        registry.update(rooms)
+        requests = max(5, args.requests * 1000 // max(count, 1000)) if count > 1000 else args.requests
+
+        full_body = old_get_rooms(rooms, active_rooms)
+        full = timed(lambda: old_get_rooms(rooms, active_rooms), requests)
+
+        some_room = next(code for code, room in rooms.items() if room['isPublic'])
+
+        def cold():
+            registry.touch(some_room)
+            return registry.page(args.limit)
+        cold_time = timed(cold, args.requests)
+        page = registry.page(args.limit)
+        cached = timed(lambda: registry.page(args.limit), args.requests)
+        etag = page.etag
+        not_modified = timed(lambda: registry.page(args.limit).etag == etag, args.requests)
+
+        cursor = None
+        pages = 0
+        target = int(0.9 * json.loads(registry.page(args.limit).body)['total'] / args.limit)
+        while pages < target:
+            cursor = json.loads(registry.page(args.limit, cursor).body)['next']
+            pages += 1
+
+        def deep():
+            registry.touch(some_room)
+            return registry.page(args.limit, cursor)
+        deep_time = timed(deep, args.requests)
+
+        def search():
+            registry.touch(some_room)
+            return registry.page(args.limit, None, 'python r')
+        search_time = timed(search, args.requests)
+
+        print(f"{count:>8,}{full * 1e6:>11,.0f} ({len(full_body) / 1024:>4,.0f})"
+              f"{cold_time * 1e6:>8,.0f} ({len(page.body) / 1024:>3.0f})"
+              f"{cached * 1e6:>10.1f}{not_modified * 1e6:>8.1f}{deep_time * 1e6:>14,.0f}{search_time * 1e6:>10,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Outbound packets and staleness of room_stats: per-event emits vs RoomStatsScheduler.
+
+Usage:
+    python -m bench.room_stats_bench [--users 50] [--rate 10] [--churn 0.5] [--seconds 120] [--interval 1.0]
+
+Simulates one room of about `users` members on a virtual clock for
+`seconds`, with `rate` messages/s and `churn` joins plus leaves per second
+(Poisson arrivals). Before: every message sends receive_message to the
+other members, message_sent to the sender and room_stats to everyone, and
+every join or leave sends room_stats to the room. After: room_stats rides
+along on the message packets, and membership changes without a message go
+out on the scheduler's flush (every interval/4, at most once per
+`interval`). Staleness is the time from a stats change until members see it.
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from room_stats import RoomStatsScheduler
+
+
+def make_events(rate, churn, seconds, seed=1):
+    rng = random.Random(seed)
+    events = []
+    for kind, per_second in (('message', rate), ('churn', churn)):
+        t = rng.expovariate(per_second) if per_second else seconds
+        while t < seconds:
+            events.append((t, kind))
+            t += rng.expovariate(per_second)
+    events.sort()
+    return events
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--rate', type=float, default=10.0)
+    parser.add_argument('--churn', type=float, default=0.5)
+    parser.add_argument('--seconds', type=float, default=120.0)
+    parser.add_argument('--interval', type=float, default=1.0)
+    args = parser.parse_args()
+
+    events = make_events(args.rate, args.churn, args.seconds)
+    messages = sum(1 for _, kind in events if kind == 'message')
+    changes = len(events) - messages
+    n = args.users
+
+    message_packets = messages * n
+    before_stats = messages * n + changes * n
+    before_total = message_packets + before_stats
+
+    clock = [0.0]
+    state = {'users': n, 'messages': 0}
+    scheduler = RoomStatsScheduler(lambda room: dict(state), interval=args.interval, clock=lambda: clock[0])
+    pending_since = None
+    staleness = []
+    after_stats = 0
+    tick = args.interval / 4
+    next_flush = tick
+    rng = random.Random(2)
+    for t, kind in events + [(args.seconds, None)]:
+        while next_flush <= t:
+            clock[0] = next_flush
+            if scheduler.flush():
+                after_stats += n
+                staleness.append(next_flush - pending_since)
+                pending_since = None
+            next_flush += tick
+        clock[0] = t
+        if kind == 'message':
+            state['messages'] += 1
+            scheduler.mark('ROOM')
+            if scheduler.take('ROOM') is not None and pending_since is not None:
+                staleness.append(t - pending_since)
+                pending_since = None
+            staleness.append(0.0)
+        elif kind == 'churn':
+            state['users'] += rng.choice((-1, 1))
+            scheduler.mark('ROOM')
+            if pending_since is None:
+                pending_since = t
+    after_total = message_packets + after_stats
+
+    print(f"{n} users, {args.rate:g} msgs/s, {args.churn:g} joins+leaves/s, {args.seconds:.0f} s, "
+          f"interval {args.interval:g} s")
+    print(f"{'mode':<18}{'room_stats/s':>14}{'total pkts/s':>14}{'stale p50 ms':>14}{'stale max ms':>14}")
+    print(f"{'per-event':<18}{before_stats / args.seconds:>14,.0f}{before_total / args.seconds:>14,.0f}"
+          f"{0:>14.0f}{0:>14.0f}")
+    print(f"{'coalesced':<18}{after_stats / args.seconds:>14,.0f}{after_total / args.seconds:>14,.0f}"
+          f"{percentile(staleness, 0.5) * 1e3:>14.0f}{max(staleness, default=0) * 1e3:>14.0f}")
+    churn_staleness = [s for s in staleness if s > 0]
+    print(f"membership changes delivered late: {len(churn_staleness)}, "
+          f"p50 {percentile(churn_staleness, 0.5) * 1e3:.0f} ms, p99 {percentile(churn_staleness, 0.99) * 1e3:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Memory per connection and join/leave rate: per-sid dicts vs SessionRegistry.
+
+Usage:
+    python -m bench.session_registry_bench [--sessions 10000 100000] [--room-size 50] [--ops 200000]
+
+The old layout is what web_chat_server.py kept: active_users mapping each
+sid to a {'username', 'room', 'join_time'} dict, and a set of sids per
+room. Room codes arrive in each join's JSON, so every session holds its
+own copy unless they are interned. Memory is what tracemalloc sees for
+connecting every session and putting it in a room. Sids are allocated
+beforehand, since both layouts share them. `move` is one session leaving
+its room for another, `connect` a connect plus disconnect, `count` a
+member count.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_registry import SessionRegistry
+
+
+class DictSessions:
+    """The handlers' former bookkeeping, reduced to the operations being compared."""
+
+    def __init__(self):
+        self.active_users = {}
+        self.rooms = {}
+
+    def add(self, sid, number):
+        self.active_users[sid] = {'username': f'User{number}', 'room': None, 'join_time': time.time()}
+
+    def join(self, sid, room_code):
+        user = self.active_users[sid]
+        old = user['room']
+        if old:
+            users = self.rooms[old]
+            users.discard(sid)
+            if not users:
+                del self.rooms[old]
+        self.rooms.setdefault(room_code, set()).add(sid)
+        user['room'] = room_code
+
+    def remove(self, sid):
+        user = self.active_users.pop(sid)
+        if user['room']:
+            users = self.rooms[user['room']]
+            users.discard(sid)
+            if not users:
+                del self.rooms[user['room']]
+
+    def count(self, room_code):
+        return len(self.rooms.get(room_code, ()))
+
+
+def room_code(i):
+    """A fresh str, as json.loads() hands the handler for each join."""
+    return f'R{i:05d}'.encode().decode()
+
+
+def populate(layout, sids, rooms):
+    for number, sid in enumerate(sids, 1):
+        layout.add(sid, number)
+        layout.join(sid, room_code(number % rooms))
+
+
+def memory_per_session(factory, sids, rooms):
+    tracemalloc.start()
+    layout = factory()
+    populate(layout, sids, rooms)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / len(sids), layout
+
+
+def rate(fn, ops):
+    start = time.perf_counter()
+    fn(ops)
+    return ops / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--room-size', type=int, default=50)
+    parser.add_argument('--ops', type=int, default=200000)
+    args = parser.parse_args()
+
+    print(f"rooms of {args.room_size}; bytes per session, operations/s")
+    print(f"{'sessions':>9}  {'layout':<10}{'bytes':>8}{'move/s':>12}{'connect/s':>12}{'count/s':>12}")
+    for count in args.sessions:
+        sids = [f'{random.getrandbits(80):020x}' for _ in range(count)]
+        rooms = max(1, count // args.room_size)
+        codes = [room_code(i) for i in range(rooms)]
+        rng = random.Random(1)
+        picks = [(rng.choice(sids), rng.choice(codes)) for _ in range(args.ops)]
+        spare = [f'spare{i}' for i in range(args.ops)]
+        for name, factory in (('dicts', DictSessions), ('registry', SessionRegistry)):
+            per_session, layout = memory_per_session(factory, sids, rooms)
+
+            def move(ops):
+                join = layout.join
+                for sid, code in picks[:ops]:
+                    join(sid, code)
+
+            def connect(ops):
+                add, join, remove = layout.add, layout.join, layout.remove
+                for i, (_, code) in enumerate(picks[:ops]):
+                    add(spare[i], i)
+                    join(spare[i], code)
+                    remove(spare[i])
+
+            def count_members(ops):
+                members = layout.count
+                for _, code in picks[:ops]:
+                    members(code)
+
+            print(f"{count:>9,}  {name:<10}{per_session:>8,.0f}{rate(move, args.ops):>12,.0f}"
+                  f"{rate(connect, args.ops):>12,.0f}{rate(count_members, args.ops):>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
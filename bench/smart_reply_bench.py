@@ -0,0 +1,103 @@
+"""Smart-reply latency and provider load: direct provider calls vs SmartReplyService.
+
+Usage:
+    python -m bench.smart_reply_bench [--requests 2000] [--clients 16] [--latency 0.15]
+                                      [--unique 0.3] [--workers 16]
+
+`clients` threads send `requests` suggestion requests between them. A
+share `unique` of the messages are one-offs; the rest are drawn with a
+Zipf-like skew from common chat phrases with varied case and punctuation,
+the way "hi", "Hi!" and "thanks" repeat in real rooms. The provider is a
+StubProvider sleeping `latency` seconds per call. Before: every request
+calls the provider, as generate_smart_replies_with_llm() did. After: the
+cached, coalescing SmartReplyService with a `workers`-thread pool.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import Histogram
+from smart_replies import SmartReplyService, StubProvider
+
+PHRASES = ['hi', 'hello', 'thanks', 'ok', 'lol', 'good morning', 'how are you', 'see you later',
+           'what time is the meeting', 'nice work', 'brb', 'sounds good', 'any updates', 'haha', 'yes', 'no']
+
+
+def make_messages(count, unique, seed=1):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(PHRASES))]
+    messages = []
+    for i in range(count):
+        if rng.random() < unique:
+            messages.append(f'one-off message number {i} about topic {rng.randrange(10 ** 6)}')
+        else:
+            phrase = rng.choices(PHRASES, weights)[0]
+            phrase = rng.choice([phrase, phrase.capitalize(), phrase.upper()]) + rng.choice(['', '!', '?', '.', ' '])
+            messages.append(phrase)
+    return messages
+
+
+def run(messages, clients, suggest):
+    latency = Histogram()
+    lock = threading.Lock()
+    work = iter(messages)
+
+    def client():
+        while True:
+            with lock:
+                message = next(work, None)
+            if message is None:
+                return
+            start = time.perf_counter()
+            suggest(message)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latency.observe(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.15)
+    parser.add_argument('--unique', type=float, default=0.3)
+    parser.add_argument('--workers', type=int, default=16)
+    args = parser.parse_args()
+
+    messages = make_messages(args.requests, args.unique)
+    direct = StubProvider(latency=args.latency)
+    before_time, before = run(messages, args.clients, direct.suggest)
+
+    cached = StubProvider(latency=args.latency)
+    # Enough pending slots for every client so the comparison measures caching, not shedding.
+    service = SmartReplyService(cached, workers=args.workers, max_pending=args.clients, timeout=5.0)
+    after_time, after = run(messages, args.clients, service.suggest)
+    service.close()
+    report = service.report()
+
+    print(f"{args.requests} requests, {args.clients} clients, {args.workers} workers, "
+          f"provider latency {args.latency * 1e3:.0f} ms, {args.unique:.0%} one-off messages")
+    print(f"{'mode':<10}{'provider calls':>16}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, calls, elapsed, hist in (('direct', direct.calls, before_time, before),
+                                       ('service', cached.calls, after_time, after)):
+        print(f"{name:<10}{calls:>16}{args.requests / elapsed:>10,.0f}"
+              f"{hist.quantile(0.5) * 1e3:>10.2f}{hist.quantile(0.99) * 1e3:>10.1f}")
+    print(f"hit rate {report['hit_rate']:.1%}, coalesced {report['coalesced']}, "
+          f"timeouts {report['timeouts']}, rejected {report['rejected']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Time from launching a server to its first accepted connection.
+
+Usage:
+    python -m bench.startup_bench [--server web tcp-threaded tcp-async] [--repeat 5] [--budget-ms 1500]
+
+Each run starts the server in a fresh subprocess and polls its port until a
+TCP connect succeeds; the time between Popen and that connect is the cold
+start a client, health check or orchestrator actually waits for. Runs are
+interleaved across servers since the machine is noisy. Exits 1 if the
+web server's median exceeds --budget-ms, so it can gate CI.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def command(server, port):
+    if server == 'web':
+        return [sys.executable, os.path.join(ROOT, 'web_chat_server.py')], {'PORT': str(port)}
+    mode = server.split('-', 1)[1]
+    return [sys.executable, os.path.join(ROOT, 'server.py'), '--mode', mode, '--port', str(port)], {}
+
+
+def time_to_accept(server, port, timeout=30):
+    """Seconds from Popen until `server` accepts a connection on `port`."""
+    argv, extra = command(server, port)
+    start = time.perf_counter()
+    proc = subprocess.Popen(argv, cwd=ROOT, env=dict(os.environ, **extra),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                socket.create_connection(('localhost', port), timeout=0.05).close()
+                return time.perf_counter() - start
+            except OSError:
+                if proc.poll() is not None:
+                    error = proc.stderr.read().decode(errors='replace').strip().splitlines()
+                    raise RuntimeError(f"{server} exited: {error[-1] if error else proc.returncode}")
+                time.sleep(0.002)
+        raise RuntimeError(f"{server} did not accept a connection within {timeout}s")
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--server', nargs='+', default=['web'], choices=['web', 'tcp-threaded', 'tcp-async'])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--port', type=int, default=5600)
+    parser.add_argument('--budget-ms', type=float, default=1500, help="fail if the web server's median is above this")
+    args = parser.parse_args()
+
+    times = {server: [] for server in args.server}
+    for run in range(args.repeat):
+        for i, server in enumerate(args.server):
+            times[server].append(time_to_accept(server, args.port + run * len(args.server) + i))
+
+    print(f"{'server':<14}{'median ms':>10}{'best ms':>10}{'worst ms':>10}")
+    for server, samples in times.items():
+        print(f"{server:<14}{statistics.median(samples) * 1e3:>10.0f}{min(samples) * 1e3:>10.0f}"
+              f"{max(samples) * 1e3:>10.0f}")
+    if 'web' in times and statistics.median(times['web']) * 1e3 > args.budget_ms:
+        print(f"web server startup is over the {args.budget_ms:.0f} ms budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
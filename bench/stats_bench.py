@@ -0,0 +1,133 @@
+"""CPU cost of serving live stats to many dashboards: 2 s polling vs pushed deltas.
+
+Usage:
+    python -m bench.stats_bench [--dashboards 100] [--rooms 1000] [--users 5000] [--intervals 30]
+
+Simulates `intervals` 2-second ticks of a server with the given rooms and
+users, where `--changes` rooms see a message or a join in every tick.
+Before: every dashboard calls the old get_stats() (walks every room,
+resolves the host name, serializes) once per tick. After: LiveStats
+builds one snapshot per tick, and one delta is encoded per dashboard, as
+Socket.IO does for each recipient.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from live_stats import LiveStats, resolve_host_ip
+
+
+def make_state(rooms, users):
+    active_rooms = {
+        f'R{i:05d}': {'name': f'Room {i}', 'users': set(), 'message_count': 0, 'created_at': time.time()}
+        for i in range(rooms)
+    }
+    codes = list(active_rooms)
+    active_users = {}
+    for i in range(users):
+        sid = f'sid{i}'
+        active_users[sid] = {'username': f'User{i}', 'room': codes[i % rooms]}
+        active_rooms[codes[i % rooms]]['users'].add(sid)
+    network_stats = {key: 0 for key in ('total_connections', 'active_connections', 'total_messages',
+                                        'bytes_transferred', 'rooms_created', 'active_rooms')}
+    network_stats['server_start_time'] = time.time()
+    return active_rooms, active_users, network_stats
+
+
+def legacy_get_stats(active_rooms, active_users, network_stats):
+    """get_stats() before LiveStats."""
+    uptime = time.time() - network_stats['server_start_time']
+    stats = {
+        'server_uptime': f"{uptime:.2f} seconds",
+        'total_connections': network_stats['total_connections'],
+        'active_connections': network_stats['active_connections'],
+        'total_messages': network_stats['total_messages'],
+        'bytes_transferred': network_stats['bytes_transferred'],
+        'rooms_created': network_stats['rooms_created'],
+        'active_rooms': network_stats['active_rooms'],
+        'server_ip': socket.gethostbyname(socket.gethostname()),
+        'server_port': 5000,
+        'protocol': 'WebSocket over HTTP',
+        'encryption': 'AES-256-GCM',
+        'active_users': [user_data['username'] for user_data in active_users.values()],
+        'room_details': {
+            room_code: {
+                'name': room_data['name'],
+                'user_count': len(room_data['users']),
+                'message_count': room_data['message_count'],
+                'created_at': room_data['created_at']
+            } for room_code, room_data in active_rooms.items()
+        }
+    }
+    return json.dumps(stats)
+
+
+def churn(active_rooms, network_stats, changes, live=None):
+    for code in random.sample(list(active_rooms), changes):
+        active_rooms[code]['message_count'] += 1
+        network_stats['total_messages'] += 1
+        if live:
+            live.room_changed(code)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dashboards', type=int, default=100)
+    parser.add_argument('--rooms', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--changes', type=int, default=50)
+    parser.add_argument('--intervals', type=int, default=30)
+    args = parser.parse_args()
+
+    random.seed(1)
+    state = make_state(args.rooms, args.users)
+    start = time.process_time()
+    for _ in range(args.intervals):
+        churn(state[0], state[2], args.changes)
+        for _ in range(args.dashboards):
+            legacy_get_stats(*state)
+    before = (time.process_time() - start) / args.intervals
+
+    random.seed(1)
+    active_rooms, active_users, network_stats = make_state(args.rooms, args.users)
+    server_ip = resolve_host_ip()
+    clock = [0.0]
+
+    def totals():
+        return dict({k: v for k, v in network_stats.items() if k != 'server_start_time'},
+                    server_uptime=f"{clock[0]:.2f} seconds", server_ip=server_ip)
+
+    def describe(code):
+        room = active_rooms.get(code)
+        return room and {'name': room['name'], 'user_count': len(room['users']),
+                         'message_count': room['message_count'], 'created_at': room['created_at']}
+
+    live = LiveStats(totals, describe, lambda: [u['username'] for u in active_users.values()],
+                     interval=2.0, clock=lambda: clock[0])
+    for code in active_rooms:
+        live.room_changed(code)
+    live.next_delta()
+    start = time.process_time()
+    for _ in range(args.intervals):
+        clock[0] += 2.0
+        churn(active_rooms, network_stats, args.changes, live)
+        delta = live.next_delta()
+        for _ in range(args.dashboards):
+            json.dumps(delta)
+    after = (time.process_time() - start) / args.intervals
+
+    print(f"{args.dashboards} dashboards, {args.rooms} rooms, {args.users} users, "
+          f"{args.changes} room changes per 2 s tick")
+    print(f"{'mode':<22}{'CPU ms / tick':>14}{'CPU %':>8}")
+    for name, cost in (('poll /api/stats', before), ('push deltas', after)):
+        print(f"{name:<22}{cost * 1e3:>14.2f}{cost / 2.0 * 100:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Typing-indicator traffic in a busy room: per-event relay vs tick-coalesced sets.
+
+Usage:
+    python -m bench.typing_bench [--users 50] [--typers 10] [--seconds 60] [--keystroke-emitters 1]
+
+Simulates `seconds` of a `users`-member room on a virtual clock. `typers`
+members alternate typing bursts of 1-8 s (about 5 keystrokes/s) with
+pauses, running chat.js's logic: emit on start, every 1.5 s while typing
+continues, and on stop after 2 s idle. `keystroke-emitters` of them are
+misbehaving clients that emit on every keystroke. Before: handle_typing()
+relayed every event to the other members. After: TypingTracker, flushed
+every 250 ms, with one typing_users emit per changed room.
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typing_tracker import TypingTracker
+
+
+def typing_events(typers, keystroke_emitters, seconds, seed=1):
+    """Return (time, sid, is_typing) events in time order."""
+    rng = random.Random(seed)
+    events = []
+    for i in range(typers):
+        sid = f'sid{i}'
+        per_keystroke = i < keystroke_emitters
+        t = rng.uniform(0, 5)
+        while t < seconds:
+            burst_end = t + rng.uniform(1, 8)
+            last_emit = None
+            while t < burst_end and t < seconds:
+                if per_keystroke or last_emit is None or t - last_emit > 1.5:
+                    events.append((t, sid, True))
+                    last_emit = t
+                t += rng.expovariate(5)
+            events.append((t + 2.0, sid, False))
+            t += 2.0 + rng.uniform(2, 20)
+    events.sort()
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--typers', type=int, default=10)
+    parser.add_argument('--seconds', type=float, default=60.0)
+    parser.add_argument('--keystroke-emitters', type=int, default=1)
+    args = parser.parse_args()
+
+    events = typing_events(args.typers, args.keystroke_emitters, args.seconds)
+    incoming = len(events)
+    # Before: every event became one emit delivered to every other member.
+    before_emits = incoming
+    before_deliveries = incoming * (args.users - 1)
+
+    clock = [0.0]
+    tracker = TypingTracker(clock=lambda: clock[0])
+    after_emits = 0
+    next_flush = tracker.tick
+    for t, sid, is_typing in events + [(args.seconds, None, None)]:
+        while next_flush <= t:
+            clock[0] = next_flush
+            after_emits += len(tracker.flush())
+            next_flush += tracker.tick
+        clock[0] = t
+        if sid is not None:
+            tracker.update(sid, 'MAIN01', f'User{sid[3:]}', is_typing)
+    after_deliveries = after_emits * args.users
+
+    print(f"{args.users}-member room, {args.typers} typers ({args.keystroke_emitters} per-keystroke), "
+          f"{args.seconds:.0f} s, {incoming / args.seconds:.1f} typing events/s in")
+    print(f"{'mode':<22}{'emits/s':>10}{'deliveries/s':>15}")
+    for name, emits, deliveries in (('relay every event', before_emits, before_deliveries),
+                                    ('250 ms coalesced', after_emits, after_deliveries)):
+        print(f"{name:<22}{emits / args.seconds:>10.1f}{deliveries / args.seconds:>15.1f}")
+    print(f"rate-limited {tracker.stats['limited']}, expired {tracker.stats['expired']}")
+
+
+if __name__ == "__main__":
+    main()
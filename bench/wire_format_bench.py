@@ -0,0 +1,59 @@
+"""Bytes on the wire and CPU per message: Base64 text frames vs binary envelopes.
+
+Usage:
+    python -m bench.wire_format_bench [--count 2000]
+
+For each plaintext size, encrypts and frames messages the way client.py
+sends them, then unframes and decrypts them the way it receives them.
+CPU time is measured with time.process_time(), so it includes the ASCON
+rounds; the encode/decode column isolates the envelope step alone.
+"""
+import argparse
+import base64
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from encryption_utils import (encrypt_message, encrypt_message_binary, decrypt_wire_message,
+                              generate_shared_key)
+from framing import HEADER_SIZE, pack_frame
+
+SIZES = [16, 128, 1024, 4096]
+
+
+def cpu_per_message(fn, items):
+    start = time.process_time()
+    for item in items:
+        fn(item)
+    return (time.process_time() - start) / len(items) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=2000)
+    args = parser.parse_args()
+
+    key = generate_shared_key()
+    print(f"{'plain B':>8} {'format':<8}{'frame B':>9}{'overhead':>10}"
+          f"{'send us':>10}{'recv us':>10}{'envelope us':>13}")
+    for size in SIZES:
+        message = 'x' * size
+        count = max(50, args.count * 16 // max(size, 16))
+        envelope = encrypt_message_binary(key, message)
+        for name, encrypt, envelope_step in (
+            ('base64', encrypt_message, lambda: base64.b64decode(base64.b64encode(envelope[1:]))),
+            ('binary', encrypt_message_binary, lambda: bytes(memoryview(envelope)[1:])),
+        ):
+            frames = [pack_frame(encrypt(key, message)) for _ in range(count)]
+            send = cpu_per_message(lambda m: pack_frame(encrypt(key, m)), [message] * count)
+            recv = cpu_per_message(lambda f: decrypt_wire_message(key, memoryview(f)[HEADER_SIZE:]), frames)
+            step = cpu_per_message(lambda _: envelope_step(), range(count * 20))
+            frame_len = len(frames[0])
+            print(f"{size:>8} {name:<8}{frame_len:>9}{frame_len - size:>10}"
+                  f"{send:>10.1f}{recv:>10.1f}{step:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
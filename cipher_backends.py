@@ -0,0 +1,286 @@
+import ctypes
+import ctypes.util
+import hmac
+import os
+import struct
+import time
+
+KEY_SIZE = 16
+NONCE_SIZE = 16
+TAG_SIZE = 16
+
+# Ascon-128 v1.2 known-answer vectors: key = nonce = 00..0f, AD and plaintext
+# are 00 01 02 .. of the given lengths. The first is Count = 1 of the
+# official LWC KAT; every backend must reproduce all of them byte for byte.
+TEST_VECTORS = [
+    (0, 0, 'e355159f292911f794cb1432a0103a8a'),
+    (0, 1, 'bc18c3f4e39eca7222490d967c79bffc92'),
+    (0, 8, 'bc820dbdf7a4631c01a8807a44254b42ac6bb490da1e000a'),
+    (0, 33, 'bc820dbdf7a4631c5b29884ad69175c3389655ca8135c9e6e8fe7467276f8977'
+            '2e0173474f15f2e88b5f880e118e600442'),
+    (1, 0, '944df887cd4901614c5dedbc42fc0da0'),
+    (8, 8, '69ffee6f5505a489e897e5f141b2e4a2dad326085a79408a'),
+    (15, 7, '2e83cc36f088234c11cfc6d934d1970c550c6a4cee177b'),
+    (16, 64, '1ee34125fdba17443d01da8a0eefb04550ca93ce23a9daaf0d7bdd7eb61bc535'
+             'bc1cf0383cb43b17feaf476f3f03b49c1a0a2519c3f382f9dca8e176174c7eff'
+             '18b1019bb35d4fc306703708338cec8c'),
+]
+
+
+class CipherBackend:
+    """ASCON-128 AEAD implementation used by encryption_utils.
+
+    encrypt() returns ciphertext with the 16-byte tag appended; decrypt()
+    returns the plaintext, or None when the tag does not verify.
+    """
+
+    name = None
+
+    def encrypt(self, key, nonce, associated_data, plaintext):
+        raise NotImplementedError
+
+    def decrypt(self, key, nonce, associated_data, ciphertext):
+        raise NotImplementedError
+
+    def self_test(self):
+        """Check the backend against TEST_VECTORS; returns True when all match."""
+        key = nonce = bytes(range(16))
+        for ad_len, pt_len, expected_hex in TEST_VECTORS:
+            ad, pt, expected = bytes(range(ad_len)), bytes(range(pt_len)), bytes.fromhex(expected_hex)
+            if self.encrypt(key, nonce, ad, pt) != expected:
+                return False
+            if self.decrypt(key, nonce, ad, expected) != pt:
+                return False
+            tampered = bytes([expected[0] ^ 1]) + expected[1:]
+            if self.decrypt(key, nonce, ad, tampered) is not None:
+                return False
+        return True
+
+
+class ReferenceAsconBackend(CipherBackend):
+    """The pure-Python `ascon` package, kept as the reference implementation."""
+
+    name = 'ascon-reference'
+
+    def __init__(self):
+        import ascon
+        self._ascon = ascon
+
+    def encrypt(self, key, nonce, associated_data, plaintext):
+        return self._ascon.encrypt(key, nonce, associated_data, plaintext, variant="Ascon-128")
+
+    def decrypt(self, key, nonce, associated_data, ciphertext):
+        return self._ascon.decrypt(key, nonce, associated_data, ciphertext, variant="Ascon-128")
+
+
+MASK = 0xFFFFFFFFFFFFFFFF
+IV_128 = 0x80400C0600000000
+ROUNDS_12 = tuple(0xF0 - r * 0x0F for r in range(12))
+ROUNDS_6 = ROUNDS_12[6:]
+
+
+def _permute(x0, x1, x2, x3, x4, constants):
+    for c in constants:
+        x2 ^= c
+        x0 ^= x4
+        x4 ^= x3
+        x2 ^= x1
+        t0 = ~x0 & x1
+        t1 = ~x1 & x2
+        t2 = ~x2 & x3
+        t3 = ~x3 & x4
+        t4 = ~x4 & x0
+        x0 ^= t1
+        x1 ^= t2
+        x2 ^= t3
+        x3 ^= t4
+        x4 ^= t0
+        x1 ^= x0
+        x0 ^= x4
+        x3 ^= x2
+        x2 ^= MASK
+        x0 = (x0 ^ ((x0 >> 19) | (x0 << 45)) ^ ((x0 >> 28) | (x0 << 36))) & MASK
+        x1 = (x1 ^ ((x1 >> 61) | (x1 << 3)) ^ ((x1 >> 39) | (x1 << 25))) & MASK
+        x2 = (x2 ^ ((x2 >> 1) | (x2 << 63)) ^ ((x2 >> 6) | (x2 << 58))) & MASK
+        x3 = (x3 ^ ((x3 >> 10) | (x3 << 54)) ^ ((x3 >> 17) | (x3 << 47))) & MASK
+        x4 = (x4 ^ ((x4 >> 7) | (x4 << 57)) ^ ((x4 >> 41) | (x4 << 23))) & MASK
+    return x0, x1, x2, x3, x4
+
+
+def _pad(data):
+    return data + b'\x80' + b'\x00' * (7 - len(data) % 8)
+
+
+class InlinedAsconBackend(CipherBackend):
+    """Pure-Python ASCON-128 with the state held in locals and whole-message struct unpacking.
+
+    Same algorithm as the reference package, but without its per-byte list
+    conversions; typically several times faster.
+    """
+
+    name = 'ascon-inlined'
+
+    def _absorb_header(self, key, nonce, associated_data):
+        k0, k1 = struct.unpack('>QQ', key)
+        n0, n1 = struct.unpack('>QQ', nonce)
+        x0, x1, x2, x3, x4 = _permute(IV_128, k0, k1, n0, n1, ROUNDS_12)
+        x3 ^= k0
+        x4 ^= k1
+        if associated_data:
+            padded = _pad(associated_data)
+            for word in struct.unpack(f'>{len(padded) // 8}Q', padded):
+                x0, x1, x2, x3, x4 = _permute(x0 ^ word, x1, x2, x3, x4, ROUNDS_6)
+        return k0, k1, (x0, x1, x2, x3, x4 ^ 1)
+
+    @staticmethod
+    def _tag(k0, k1, x0, x1, x2, x3, x4):
+        x0, x1, x2, x3, x4 = _permute(x0, x1 ^ k0, x2 ^ k1, x3, x4, ROUNDS_12)
+        return struct.pack('>QQ', x3 ^ k0, x4 ^ k1)
+
+    def encrypt(self, key, nonce, associated_data, plaintext):
+        k0, k1, (x0, x1, x2, x3, x4) = self._absorb_header(key, nonce, associated_data)
+        padded = _pad(plaintext)
+        words = struct.unpack(f'>{len(padded) // 8}Q', padded)
+        out = []
+        for word in words[:-1]:
+            x0 ^= word
+            out.append(x0)
+            x0, x1, x2, x3, x4 = _permute(x0, x1, x2, x3, x4, ROUNDS_6)
+        x0 ^= words[-1]
+        out.append(x0)
+        ciphertext = struct.pack(f'>{len(out)}Q', *out)[:len(plaintext)]
+        return ciphertext + self._tag(k0, k1, x0, x1, x2, x3, x4)
+
+    def decrypt(self, key, nonce, associated_data, ciphertext):
+        if len(ciphertext) < TAG_SIZE:
+            return None
+        k0, k1, (x0, x1, x2, x3, x4) = self._absorb_header(key, nonce, associated_data)
+        body, tag = bytes(ciphertext[:-TAG_SIZE]), bytes(ciphertext[-TAG_SIZE:])
+        last_len = len(body) % 8
+        full = len(body) - last_len
+        out = []
+        for word in struct.unpack(f'>{full // 8}Q', body[:full]):
+            out.append(x0 ^ word)
+            x0, x1, x2, x3, x4 = _permute(word, x1, x2, x3, x4, ROUNDS_6)
+        last = int.from_bytes(body[full:] + b'\x00' * (8 - last_len), 'big')
+        out.append(last ^ x0)
+        x0 = last ^ (x0 & (MASK >> (last_len * 8))) ^ (0x80 << ((7 - last_len) * 8))
+        if not hmac.compare_digest(self._tag(k0, k1, x0, x1, x2, x3, x4), tag):
+            return None
+        return struct.pack(f'>{len(out)}Q', *out)[:len(body)]
+
+
+NATIVE_LIBRARY_NAMES = ['ascon', 'ascon128', 'ascon128v12', 'crypto_aead_ascon128v12']
+
+
+class NativeAsconBackend(CipherBackend):
+    """ctypes binding to a C ASCON-128 build exposing the SUPERCOP crypto_aead_* API.
+
+    The library is taken from $ASCON_NATIVE_LIB or found by name, e.g. a
+    shared build of https://github.com/ascon/ascon-c (ascon128v12).
+    """
+
+    name = 'ascon-native'
+
+    def __init__(self, path=None):
+        path = path or os.environ.get('ASCON_NATIVE_LIB') or self._find_library()
+        if not path:
+            raise OSError("no native ASCON library found")
+        lib = ctypes.CDLL(path)
+        ull, buf = ctypes.c_ulonglong, ctypes.c_char_p
+        self._encrypt = lib.crypto_aead_encrypt
+        self._encrypt.argtypes = [buf, ctypes.POINTER(ull), buf, ull, buf, ull, buf, buf, buf]
+        self._decrypt = lib.crypto_aead_decrypt
+        self._decrypt.argtypes = [buf, ctypes.POINTER(ull), buf, buf, ull, buf, ull, buf, buf]
+        self.path = path
+
+    @staticmethod
+    def _find_library():
+        for name in NATIVE_LIBRARY_NAMES:
+            path = ctypes.util.find_library(name)
+            if path:
+                return path
+        return None
+
+    def encrypt(self, key, nonce, associated_data, plaintext):
+        plaintext, associated_data = bytes(plaintext), bytes(associated_data)
+        out = ctypes.create_string_buffer(len(plaintext) + TAG_SIZE)
+        out_len = ctypes.c_ulonglong()
+        self._encrypt(out, ctypes.byref(out_len), plaintext, len(plaintext),
+                      associated_data, len(associated_data), None, bytes(nonce), bytes(key))
+        return out.raw[:out_len.value]
+
+    def decrypt(self, key, nonce, associated_data, ciphertext):
+        ciphertext, associated_data = bytes(ciphertext), bytes(associated_data)
+        if len(ciphertext) < TAG_SIZE:
+            return None
+        out = ctypes.create_string_buffer(max(1, len(ciphertext) - TAG_SIZE))
+        out_len = ctypes.c_ulonglong()
+        result = self._decrypt(out, ctypes.byref(out_len), None, ciphertext, len(ciphertext),
+                               associated_data, len(associated_data), bytes(nonce), bytes(key))
+        if result != 0:
+            return None
+        return out.raw[:out_len.value]
+
+
+# Fastest first.
+BACKEND_CLASSES = [NativeAsconBackend, InlinedAsconBackend, ReferenceAsconBackend]
+
+
+def available_backends():
+    """Instantiate every backend that loads and passes the known-answer tests."""
+    backends = []
+    for cls in BACKEND_CLASSES:
+        try:
+            backend = cls()
+        except (ImportError, OSError, AttributeError):
+            continue
+        if backend.self_test():
+            backends.append(backend)
+        else:
+            print(f"[!] Cipher backend {cls.name} failed its self-test and was skipped")
+    return backends
+
+
+def select_backend(name=None):
+    """Pick the fastest working backend, or the one named by `name`/$SECURETALK_CIPHER_BACKEND."""
+    name = name or os.environ.get('SECURETALK_CIPHER_BACKEND')
+    for cls in BACKEND_CLASSES:
+        if name and cls.name != name:
+            continue
+        try:
+            backend = cls()
+        except (ImportError, OSError, AttributeError):
+            continue
+        if backend.self_test():
+            return backend
+    raise RuntimeError(f"No usable ASCON backend{f' named {name}' if name else ''}")
+
+
+BENCH_SIZES = [16, 64, 256, 1024, 4096, 65536]
+
+
+def benchmark(backends=None, sizes=BENCH_SIZES, seconds=0.5):
+    """Print MB/s and messages/s for encrypt and decrypt per backend and payload size."""
+    backends = backends or available_backends()
+    key, nonce = os.urandom(KEY_SIZE), os.urandom(NONCE_SIZE)
+    print(f"{'backend':<18}{'bytes':>8}{'enc msg/s':>12}{'enc MB/s':>10}{'dec msg/s':>12}{'dec MB/s':>10}")
+    for backend in backends:
+        for size in sizes:
+            plaintext = os.urandom(size)
+            ciphertext = backend.encrypt(key, nonce, b"", plaintext)
+            rates = []
+            for fn, arg in ((backend.encrypt, plaintext), (backend.decrypt, ciphertext)):
+                count = 0
+                start = time.perf_counter()
+                deadline = start + seconds
+                while True:
+                    fn(key, nonce, b"", arg)
+                    count += 1
+                    now = time.perf_counter()
+                    if now >= deadline:
+                        break
+                rates.append(count / (now - start))
+            enc, dec = rates
+            print(f"{backend.name:<18}{size:>8}{enc:>12,.0f}{enc * size / 1e6:>10.2f}"
+                  f"{dec:>12,.0f}{dec * size / 1e6:>10.2f}")
@@ -1,33 +1,31 @@
 import socket
 import threading
-import struct
-from encryption_utils import encrypt_message, decrypt_message, generate_shared_key
+from framing import (FrameReader, pack_frame, parse_control, control_payload, CONTROL_HELLO,
+                     CONTROL_HELLO_ACK, WIRE_BASE64, WIRE_BINARY)
+from encryption_utils import (encrypt_message, encrypt_message_binary, decrypt_wire_message,
+                              generate_shared_key)
 
 shared_key = generate_shared_key()
 print("[*] Using shared ASCON-AEAD128 key for this session.")
 
-def recvall(sock, n):
-    """Receive exactly n bytes."""
-    data = b''
-    while len(data) < n:
-        packet = sock.recv(n - len(data))
-        if not packet:
-            return None
-        data += packet
-    return data
+# Stays Base64 until the server acknowledges our HELLO, so an older relay
+# that just forwards everything never hands binary frames to older clients.
+wire_format = WIRE_BASE64
 
 def receive_messages(sock):
+    global wire_format
+    reader = FrameReader(sock)
     while True:
         try:
-            raw_len = recvall(sock, 4)
-            if not raw_len:
-                break
-            msg_len = struct.unpack('>I', raw_len)[0]
-
-            encrypted_msg = recvall(sock, msg_len)
-            if encrypted_msg:
+            encrypted_msg = reader.read_frame()
+            if encrypted_msg is not None:
+                control = parse_control(encrypted_msg)
+                if control is not None:
+                    if control[0] == CONTROL_HELLO_ACK:
+                        wire_format = control[1]
+                    continue
                 try:
-                    decrypted_msg = decrypt_message(shared_key, encrypted_msg)
+                    decrypted_msg = decrypt_wire_message(shared_key, encrypted_msg)
                     print(f"\nFriend: {decrypted_msg}")
                 except Exception as e:
                     print(f"\n[!] Failed to decrypt message: {e}")
@@ -40,7 +38,7 @@ def receive_messages(sock):
 
 def send_message(sock, encrypted_msg):
     """Send message with length prefix."""
-    sock.sendall(struct.pack('>I', len(encrypted_msg)) + encrypted_msg)
+    sock.sendall(pack_frame(encrypted_msg))
 
 def main():
     client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -49,6 +47,7 @@ def main():
     print("Type messages below (type 'exit' to quit):\n")
 
     threading.Thread(target=receive_messages, args=(client,), daemon=True).start()
+    send_message(client, control_payload(CONTROL_HELLO))
 
     while True:
         msg = input("")
@@ -57,7 +56,10 @@ def main():
             print("[*] Disconnected.")
             break
 
-        encrypted_msg = encrypt_message(shared_key, msg)
+        if wire_format >= WIRE_BINARY:
+            encrypted_msg = encrypt_message_binary(shared_key, msg)
+        else:
+            encrypted_msg = encrypt_message(shared_key, msg)
         send_message(client, encrypted_msg)
         print(f"You: {msg}")
 
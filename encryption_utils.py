@@ -1,7 +1,26 @@
-import ascon
 import os
+import sys
 import base64
 import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from cipher_backends import select_backend, available_backends, benchmark, BENCH_SIZES
+from framing import WIRE_BINARY, wire_version
+from key_manager import KEY_ID_SIZE
+
+NONCE_SIZE = 16
+BATCH_CHUNK_SIZE = 256
+
+# Chosen once, on first use: the fastest ASCON-128 implementation that passes the
+# known-answer tests. Set SECURETALK_CIPHER_BACKEND to force a specific one.
+_cipher = None
+
+def get_cipher():
+    """The selected backend; probing for a native library is slow, so it happens on first call."""
+    global _cipher
+    if _cipher is None:
+        _cipher = select_backend()
+    return _cipher
 
 def generate_key():
     """Generate a 128-bit ASCON key (16 bytes)."""
@@ -11,36 +30,51 @@ def generate_shared_key(password="SecureTalkDemo2024"):
     """Generate a shared 128-bit key from a password for all clients."""
     return hashlib.sha256(password.encode()).digest()[:16]
 
-def encrypt_message(key, plaintext):
+def encrypt_message(key, plaintext, key_id=None):
     """
     Encrypt a message using ASCON-AEAD128.
     Returns Base64 encoded bytes containing: nonce + ciphertext (with embedded tag).
+    With a key_id (see key_manager.KeyManager.room_key()), the id is prepended
+    and authenticated as associated data: key_id + nonce + ciphertext.
     """
     nonce = os.urandom(16)
     
     if isinstance(plaintext, str):
         plaintext = plaintext.encode()
 
-    ciphertext = ascon.encrypt(key, nonce, b"", plaintext, variant="Ascon-128")
+    if key_id is None:
+        return base64.b64encode(nonce + get_cipher().encrypt(key, nonce, b"", plaintext))
+
+    ciphertext = get_cipher().encrypt(key, nonce, key_id, plaintext)
     
-    msg_bytes = nonce + ciphertext
+    msg_bytes = key_id + nonce + ciphertext
     return base64.b64encode(msg_bytes)
 
 def decrypt_message(key, b64_encoded_msg):
     """
     Decrypt a Base64 encoded ASCON-AEAD128 message.
     Expected format: nonce (16 bytes) + ciphertext (with embedded tag).
+    `key` may also be a key_manager.KeyManager, in which case the message
+    must carry a key id and the key is looked up from it.
     """
     try:
         msg_bytes = base64.b64decode(b64_encoded_msg)
         
+        associated_data = b""
+        if hasattr(key, 'key_for_id'):
+            associated_data = msg_bytes[:KEY_ID_SIZE]
+            msg_bytes = msg_bytes[KEY_ID_SIZE:]
+            key = key.key_for_id(associated_data)
+            if key is None:
+                raise ValueError("Unknown key id")
+
         if len(msg_bytes) < 32:
             raise ValueError("Message too short - corrupted data")
         
         nonce = msg_bytes[:16]
         ciphertext = msg_bytes[16:]
         
-        plaintext = ascon.decrypt(key, nonce, b"", ciphertext, variant="Ascon-128")
+        plaintext = get_cipher().decrypt(key, nonce, associated_data, ciphertext)
         
         if plaintext is None:
             raise ValueError("Decryption failed: Authentication failed")
@@ -51,3 +85,126 @@ def decrypt_message(key, b64_encoded_msg):
         raise ValueError(f"Decryption failed: {e}")
     except Exception as e:
         raise ValueError(f"Decryption failed: {e}")
+
+
+def encrypt_message_binary(key, plaintext):
+    """
+    Encrypt a message into the raw binary envelope (WIRE_BINARY).
+    Returns bytes: version byte + nonce (16 bytes) + ciphertext (with embedded tag).
+    """
+    nonce = os.urandom(NONCE_SIZE)
+
+    if isinstance(plaintext, str):
+        plaintext = plaintext.encode()
+
+    return bytes((WIRE_BINARY,)) + nonce + get_cipher().encrypt(key, nonce, b"", plaintext)
+
+def decrypt_message_binary(key, envelope):
+    """
+    Decrypt a raw binary envelope produced by encrypt_message_binary().
+    """
+    if len(envelope) < 1 + NONCE_SIZE + 16:
+        raise ValueError("Decryption failed: Message too short - corrupted data")
+    if envelope[0] != WIRE_BINARY:
+        raise ValueError(f"Decryption failed: Unsupported envelope version {envelope[0]}")
+
+    plaintext = get_cipher().decrypt(key, envelope[1:1 + NONCE_SIZE], b"", envelope[1 + NONCE_SIZE:])
+    if plaintext is None:
+        raise ValueError("Decryption failed: Authentication failed")
+    try:
+        return bytes(plaintext).decode()
+    except UnicodeDecodeError as e:
+        raise ValueError(f"Decryption failed: {e}")
+
+def decrypt_wire_message(key, payload):
+    """Decrypt a payload in either wire format."""
+    if wire_version(payload) == WIRE_BINARY:
+        return decrypt_message_binary(key, payload)
+    return decrypt_message(key, bytes(payload))
+
+
+def _encrypt_chunk(key, nonces, plaintexts):
+    cipher = get_cipher()
+    out = []
+    for i, plaintext in enumerate(plaintexts):
+        nonce = nonces[i * NONCE_SIZE:(i + 1) * NONCE_SIZE]
+        out.append(base64.b64encode(nonce + cipher.encrypt(key, nonce, b"", plaintext)))
+    return out
+
+def _decrypt_chunk(key, blobs):
+    cipher = get_cipher()
+    out = []
+    for blob in blobs:
+        try:
+            msg_bytes = base64.b64decode(blob)
+            if len(msg_bytes) < 32:
+                raise ValueError("Message too short - corrupted data")
+            plaintext = cipher.decrypt(key, msg_bytes[:NONCE_SIZE], b"", msg_bytes[NONCE_SIZE:])
+            if plaintext is None:
+                raise ValueError("Decryption failed: Authentication failed")
+            out.append(plaintext.decode())
+        except Exception as e:
+            out.append(ValueError(f"Decryption failed: {e}"))
+    return out
+
+def _run_chunks(fn, key, chunks, executor, workers):
+    if executor is None and not workers:
+        return [item for chunk in chunks for item in fn(key, *chunk)]
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(fn, key, *chunk) for chunk in chunks]
+        return [item for future in futures for item in future.result()]
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+def encrypt_many(key, plaintexts, executor=None, workers=None, chunk_size=BATCH_CHUNK_SIZE):
+    """
+    Encrypt a batch of messages; same output format as encrypt_message().
+    All nonces come from a single os.urandom() call. Pass an existing
+    `executor` or a `workers` count to spread chunks over processes.
+    Results are returned in input order.
+    """
+    plaintexts = [p.encode() if isinstance(p, str) else p for p in plaintexts]
+    nonces = os.urandom(NONCE_SIZE * len(plaintexts))
+    chunks = [
+        (nonces[i * NONCE_SIZE:(i + chunk_size) * NONCE_SIZE], plaintexts[i:i + chunk_size])
+        for i in range(0, len(plaintexts), chunk_size)
+    ]
+    return _run_chunks(_encrypt_chunk, key, chunks, executor, workers)
+
+def decrypt_many(key, b64_encoded_msgs, executor=None, workers=None, chunk_size=BATCH_CHUNK_SIZE):
+    """
+    Decrypt a batch of messages produced by encrypt_message()/encrypt_many().
+    Returns a list in input order; an item that fails to decode or
+    authenticate is returned as a ValueError instead of aborting the batch.
+    """
+    b64_encoded_msgs = list(b64_encoded_msgs)
+    chunks = [
+        (b64_encoded_msgs[i:i + chunk_size],)
+        for i in range(0, len(b64_encoded_msgs), chunk_size)
+    ]
+    return _run_chunks(_decrypt_chunk, key, chunks, executor, workers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m encryption_utils",
+                                     description="SecureTalk ASCON backend tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="report MB/s and messages/s per backend and payload size")
+    bench.add_argument("--sizes", type=int, nargs="+", default=BENCH_SIZES, help="payload sizes in bytes")
+    bench.add_argument("--seconds", type=float, default=0.5, help="time spent per measurement")
+    bench.add_argument("--backend", action="append", help="only benchmark the named backend(s)")
+    args = parser.parse_args(argv)
+
+    backends = available_backends()
+    if args.backend:
+        backends = [b for b in backends if b.name in args.backend]
+    print(f"[*] Selected backend: {get_cipher().name}")
+    print(f"[*] Available backends: {', '.join(b.name for b in backends) or 'none'}")
+    benchmark(backends, args.sizes, args.seconds)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+import time
+from collections import deque
+
+DEFAULT_HIGH_WATERMARK = 192
+DEFAULT_LOW_WATERMARK = 64
+DEFAULT_QUEUE_LIMIT = 256
+
+OK = 'ok'
+CONGESTED = 'congested'
+EVICT = 'evict'
+
+
+class RateLimiter:
+    """Token buckets by key: each key may spend `rate` tokens/s with bursts of `burst`.
+
+    Buckets are created on first use and dropped with forget(); a bucket
+    that has refilled completely carries no state worth keeping, so
+    prune() discards those to bound memory.
+    """
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._buckets = {}
+        self.stats = {'allowed': 0, 'limited': 0}
+
+    def allow(self, key, cost=1):
+        now = self._clock()
+        tokens, last = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < cost:
+            self._buckets[key] = (tokens, now)
+            self.stats['limited'] += 1
+            return False
+        self._buckets[key] = (tokens - cost, now)
+        self.stats['allowed'] += 1
+        return True
+
+    def forget(self, key):
+        self._buckets.pop(key, None)
+
+    def prune(self):
+        now = self._clock()
+        full = [key for key, (tokens, last) in self._buckets.items()
+                if tokens + (now - last) * self.rate >= self.burst]
+        for key in full:
+            del self._buckets[key]
+        return len(full)
+
+
+class SlowConsumerPolicy:
+    """High/low watermark states for consumers whose queue depth is measured elsewhere.
+
+    state(key, depth) reports OK, CONGESTED once depth reaches `high` and
+    until it falls back to `low`, and EVICT once it reaches `limit`. While
+    a consumer is congested the caller should stop sending it anything it
+    can do without (typing, stats); EVICT means disconnect it.
+    """
+
+    def __init__(self, high=DEFAULT_HIGH_WATERMARK, low=DEFAULT_LOW_WATERMARK, limit=DEFAULT_QUEUE_LIMIT):
+        if not low <= high <= limit:
+            raise ValueError("watermarks must satisfy low <= high <= limit")
+        self.high = high
+        self.low = low
+        self.limit = limit
+        self.congested = set()
+
+    def state(self, key, depth):
+        if depth >= self.limit:
+            self.congested.discard(key)
+            return EVICT
+        if key in self.congested:
+            if depth <= self.low:
+                self.congested.discard(key)
+                return OK
+            return CONGESTED
+        if depth >= self.high:
+            self.congested.add(key)
+            return CONGESTED
+        return OK
+
+    def forget(self, key):
+        self.congested.discard(key)
+
+
+class OutboundQueue:
+    """Bounded per-consumer frame queue with high/low watermarks.
+
+    put() takes a frame and whether it may be dropped. Once the queue
+    reaches `high` it is congested until drained to `low`: queued droppable
+    frames are discarded and new ones refused, while messages still queue.
+    A message arriving with `limit` frames already queued is refused and
+    put() returns False, telling the caller to evict the consumer.
+    """
+
+    __slots__ = ('high', 'low', 'limit', 'congested', 'dropped', '_frames')
+
+    def __init__(self, high=DEFAULT_HIGH_WATERMARK, low=DEFAULT_LOW_WATERMARK, limit=DEFAULT_QUEUE_LIMIT):
+        if not low <= high <= limit:
+            raise ValueError("watermarks must satisfy low <= high <= limit")
+        self.high = high
+        self.low = low
+        self.limit = limit
+        self.congested = False
+        self.dropped = 0
+        self._frames = deque()
+
+    def put(self, frame, droppable=False):
+        """Queue a frame; returns False when the consumer is too far behind to keep."""
+        frames = self._frames
+        if self.congested and droppable:
+            self.dropped += 1
+            return True
+        if len(frames) >= self.limit:
+            return False
+        frames.append((frame, droppable))
+        if not self.congested and len(frames) >= self.high:
+            self.congested = True
+            kept = deque(item for item in frames if not item[1])
+            self.dropped += len(frames) - len(kept)
+            self._frames = kept
+        return True
+
+    def take(self, count=64):
+        """Remove and return up to `count` queued frames, oldest first."""
+        frames = self._frames
+        taken = [frames.popleft()[0] for _ in range(min(count, len(frames)))]
+        if self.congested and len(frames) <= self.low:
+            self.congested = False
+        return taken
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __bool__(self):
+        return bool(self._frames)
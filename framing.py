@@ -0,0 +1,130 @@
+import base64
+import socket
+import struct
+
+HEADER = struct.Struct('>I')
+HEADER_SIZE = HEADER.size
+DEFAULT_MAX_FRAME_SIZE = 4 * 1024 * 1024
+DEFAULT_BUFFER_SIZE = 64 * 1024
+HAS_SENDMSG = hasattr(socket.socket, 'sendmsg')
+
+# Payload wire formats. Version 0 is the original Base64(nonce + ciphertext)
+# text; version 1 is a raw envelope: version byte + nonce + ciphertext+tag.
+# Base64 text never starts with byte 0x00 or 0x01, so the first byte tells
+# them apart, and 0x00 marks control frames used for negotiation.
+WIRE_BASE64 = 0
+WIRE_BINARY = 1
+MAX_WIRE_VERSION = WIRE_BINARY
+CONTROL = 0x00
+CONTROL_HELLO = 0x01
+CONTROL_HELLO_ACK = 0x02
+
+
+class FrameTooLarge(ValueError):
+    """Raised when a length header announces more than the allowed frame size."""
+
+
+def pack_frame(payload):
+    """Prefix a payload with its 4-byte big-endian length."""
+    return HEADER.pack(len(payload)) + payload
+
+
+def wire_version(payload):
+    """Return the wire format of a message payload."""
+    return WIRE_BINARY if len(payload) and payload[0] == WIRE_BINARY else WIRE_BASE64
+
+
+def binary_to_base64(envelope):
+    """Re-encode a binary envelope as the legacy Base64 format without decrypting it."""
+    return base64.b64encode(envelope[1:])
+
+
+def control_payload(op, version=MAX_WIRE_VERSION):
+    """Build a control payload; HELLO advertises the highest wire version a peer speaks."""
+    return bytes((CONTROL, op, version))
+
+
+def parse_control(payload):
+    """Return (op, version) for a control payload, or None for an ordinary message."""
+    if len(payload) != 3 or payload[0] != CONTROL:
+        return None
+    return payload[1], payload[2]
+
+
+class FrameReader:
+    """Buffered reader for 4-byte length-prefixed frames.
+
+    Bytes are received with recv_into() straight into one preallocated
+    bytearray, every complete frame already in the buffer is handed out
+    before the socket is read again, and frames are returned as memoryview
+    slices of that buffer instead of copies. A returned frame is only valid
+    until the next call to read_frame(); call bytes() on it to keep it.
+    """
+
+    def __init__(self, sock, max_frame_size=DEFAULT_MAX_FRAME_SIZE, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.sock = sock
+        self.max_frame_size = max_frame_size
+        self._buf = bytearray(buffer_size)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+
+    def read_frame(self):
+        """Return the next frame as a memoryview, or None once the peer has closed."""
+        while True:
+            frame = self._next_buffered_frame()
+            if frame is not None:
+                return frame
+            if not self._fill():
+                return None
+
+    def __iter__(self):
+        while True:
+            frame = self.read_frame()
+            if frame is None:
+                return
+            yield frame
+
+    def _next_buffered_frame(self):
+        available = self._end - self._start
+        if available < HEADER_SIZE:
+            return None
+        frame_len = HEADER.unpack_from(self._buf, self._start)[0]
+        if frame_len > self.max_frame_size:
+            raise FrameTooLarge(f"Frame of {frame_len} bytes exceeds limit of {self.max_frame_size}")
+        if available < HEADER_SIZE + frame_len:
+            self._reserve(HEADER_SIZE + frame_len)
+            return None
+        begin = self._start + HEADER_SIZE
+        self._start = begin + frame_len
+        return self._view[begin:self._start]
+
+    def _reserve(self, needed):
+        """Make room for a partial frame of `needed` bytes starting at _start."""
+        if needed > len(self._buf):
+            new_buf = bytearray(needed)
+            new_buf[:self._end - self._start] = self._view[self._start:self._end]
+            self._buf = new_buf
+            self._view = memoryview(new_buf)
+            self._end -= self._start
+            self._start = 0
+        elif self._start + needed > len(self._buf):
+            self._compact()
+
+    def _compact(self):
+        pending = self._end - self._start
+        if pending:
+            self._view[:pending] = self._view[self._start:self._end]
+        self._start = 0
+        self._end = pending
+
+    def _fill(self):
+        if self._start == self._end:
+            self._start = self._end = 0
+        elif self._end == len(self._buf):
+            self._compact()
+        received = self.sock.recv_into(self._view[self._end:])
+        if not received:
+            return False
+        self._end += received
+        return True
@@ -0,0 +1,170 @@
+import hashlib
+import hmac
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+KEY_SIZE = 16
+KEY_ID_SIZE = 8
+DEFAULT_MAX_KEYS = 4096
+DEFAULT_TTL = 3600.0
+
+# scrypt cost for turning a password into the master secret; paid once per process.
+SCRYPT_PARAMS = {'n': 2 ** 14, 'r': 8, 'p': 1}
+MASTER_SALT = b'SecureTalk master key v1'
+
+
+def hkdf(ikm, salt, info, length=KEY_SIZE):
+    """HKDF-SHA256 (RFC 5869) extract-and-expand."""
+    prk = hmac.new(salt or b'\x00' * 32, ikm, hashlib.sha256).digest()
+    out, block, counter = b'', b'', 1
+    while len(out) < length:
+        block = hmac.new(prk, block + info + bytes((counter,)), hashlib.sha256).digest()
+        out += block
+        counter += 1
+    return out[:length]
+
+
+def derive_master_key(password, salt=MASTER_SALT):
+    """Stretch a password into a 32-byte master secret with scrypt."""
+    if isinstance(password, str):
+        password = password.encode()
+    return hashlib.scrypt(password, salt=salt, dklen=32, **SCRYPT_PARAMS)
+
+
+def room_tag(room):
+    """4-byte tag identifying a room inside a key id."""
+    return hashlib.sha256(room.encode()).digest()[:4]
+
+
+class _CachedKey:
+    __slots__ = ('room', 'generation', 'key_id', 'key', 'expires')
+
+    def __init__(self, room, generation, key_id, key, expires):
+        self.room = room
+        self.generation = generation
+        self.key_id = key_id
+        self.key = key
+        self.expires = expires
+
+
+class KeyManager:
+    """Per-room ASCON keys derived with HKDF from one master secret.
+
+    A key id is the room tag plus a 4-byte generation, so a receiver that
+    misses the cache can re-derive the key from the id and the room alone.
+    Derived keys live in an LRU of at most `max_keys` entries that expire
+    `ttl` seconds after derivation. rotate() moves a room to the next
+    generation; messages under older generations still decrypt.
+
+    from_password(..., lazy=True) postpones the scrypt stretch until the
+    first key is needed or warm() is called, keeping it off the startup path.
+    """
+
+    def __init__(self, master_key, max_keys=DEFAULT_MAX_KEYS, ttl=DEFAULT_TTL, clock=time.monotonic):
+        self._master = master_key
+        self._password = None
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._by_id = OrderedDict()
+        self._current = {}
+        self._rooms = {}
+        self.stats = {'derivations': 0, 'hits': 0, 'evictions': 0, 'rotations': 0}
+
+    @classmethod
+    def from_password(cls, password, lazy=False, **kwargs):
+        if not lazy:
+            return cls(derive_master_key(password), **kwargs)
+        manager = cls(None, **kwargs)
+        manager._password = password
+        return manager
+
+    def warm(self):
+        """Derive a lazily created manager's master secret now."""
+        with self._lock:
+            self._master_key()
+
+    def _master_key(self):
+        if self._master is None:
+            self._master = derive_master_key(self._password)
+            self._password = None
+        return self._master
+
+    def _derive(self, room, generation):
+        key_id = room_tag(room) + struct.pack('>I', generation)
+        key = hkdf(self._master_key(), room_tag(room), b'SecureTalk room key ' + room.encode() + key_id)
+        self.stats['derivations'] += 1
+        return _CachedKey(room, generation, key_id, key, self._clock() + self.ttl)
+
+    def _lookup(self, key_id, now):
+        entry = self._by_id.get(key_id)
+        if entry is None:
+            return None
+        if entry.expires <= now:
+            del self._by_id[key_id]
+            self.stats['evictions'] += 1
+            return None
+        self._by_id.move_to_end(key_id)
+        self.stats['hits'] += 1
+        return entry
+
+    def _store(self, entry):
+        self._by_id[entry.key_id] = entry
+        self._rooms[room_tag(entry.room)] = entry.room
+        while len(self._by_id) > self.max_keys:
+            self._by_id.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def room_key(self, room):
+        """Return (key_id, key) for encrypting new messages in `room`."""
+        with self._lock:
+            generation = self._current.get(room, 0)
+            key_id = room_tag(room) + struct.pack('>I', generation)
+            entry = self._lookup(key_id, self._clock())
+            if entry is None:
+                entry = self._derive(room, generation)
+                self._store(entry)
+            return entry.key_id, entry.key
+
+    def key_for_id(self, key_id, room=None):
+        """Return the key for a received key id, or None if it cannot be resolved.
+
+        Cache hits are O(1). On a miss the key is re-derived when the room is
+        given or was seen before by this manager.
+        """
+        key_id = bytes(key_id)
+        with self._lock:
+            entry = self._lookup(key_id, self._clock())
+            if entry is not None:
+                return entry.key
+            if len(key_id) != KEY_ID_SIZE:
+                return None
+            room = room or self._rooms.get(key_id[:4])
+            if room is None or room_tag(room) != key_id[:4]:
+                return None
+            entry = self._derive(room, struct.unpack('>I', key_id[4:])[0])
+            self._store(entry)
+            return entry.key
+
+    def rotate(self, room):
+        """Start a new key generation for `room`; returns its key id."""
+        with self._lock:
+            self._current[room] = self._current.get(room, 0) + 1
+            self.stats['rotations'] += 1
+        return self.room_key(room)[0]
+
+    def evict_expired(self):
+        """Drop every cached key whose TTL has passed; returns how many were dropped."""
+        now = self._clock()
+        with self._lock:
+            expired = [key_id for key_id, entry in self._by_id.items() if entry.expires <= now]
+            for key_id in expired:
+                del self._by_id[key_id]
+            self.stats['evictions'] += len(expired)
+        return len(expired)
+
+    def __len__(self):
+        return len(self._by_id)
@@ -0,0 +1,108 @@
+import json
+import socket
+import time
+
+DEFAULT_INTERVAL = 2.0
+
+
+def resolve_host_ip():
+    """Resolve this host's IP once; falls back to loopback when the hostname does not resolve."""
+    try:
+        return socket.gethostbyname(socket.gethostname())
+    except OSError:
+        return '127.0.0.1'
+
+
+class LiveStats:
+    """Incrementally maintained server statistics with rate-limited snapshots and deltas.
+
+    Handlers call room_changed() / users_changed() when membership or
+    message counts move; only those rooms are re-described at the next
+    snapshot. A snapshot is built at most once per `interval` no matter how
+    many dashboards or /api/stats requests ask for it, and next_delta()
+    returns just the fields that changed since the previous push.
+
+    `collect_totals()` returns the scalar counters, `describe_room(code)`
+    one room's details (None once the room is gone) and `list_users()` the
+    active usernames.
+    """
+
+    def __init__(self, collect_totals, describe_room, list_users, interval=DEFAULT_INTERVAL,
+                 clock=time.monotonic):
+        self.interval = interval
+        self._collect_totals = collect_totals
+        self._describe_room = describe_room
+        self._list_users = list_users
+        self._clock = clock
+        self._rooms = {}
+        self._dirty_rooms = set()
+        self._changed_rooms = set()
+        self._users = []
+        self._users_dirty = True
+        self._users_changed = True
+        self._snapshot = None
+        self._snapshot_json = None
+        self._taken_at = None
+        self._pushed_totals = {}
+        self.subscribers = 0
+        self.stats = {'snapshots': 0, 'room_updates': 0, 'deltas': 0}
+
+    def room_changed(self, room_code):
+        self._dirty_rooms.add(room_code)
+
+    def users_changed(self):
+        self._users_dirty = True
+
+    def _refresh(self):
+        for room_code in self._dirty_rooms:
+            details = self._describe_room(room_code)
+            if details is None:
+                self._rooms.pop(room_code, None)
+            else:
+                self._rooms[room_code] = details
+            self.stats['room_updates'] += 1
+        self._changed_rooms |= self._dirty_rooms
+        self._dirty_rooms = set()
+        if self._users_dirty:
+            self._users = self._list_users()
+            self._users_dirty = False
+            self._users_changed = True
+        self._snapshot = dict(self._collect_totals(), active_users=self._users, room_details=self._rooms)
+        self._snapshot_json = None
+        self._taken_at = self._clock()
+        self.stats['snapshots'] += 1
+
+    def snapshot(self):
+        """Return the current snapshot, rebuilding it at most once per interval."""
+        if self._taken_at is None or self._clock() - self._taken_at >= self.interval:
+            self._refresh()
+        return self._snapshot
+
+    def snapshot_json(self):
+        """The snapshot serialized once and reused until it is rebuilt."""
+        snapshot = self.snapshot()
+        if self._snapshot_json is None:
+            self._snapshot_json = json.dumps(snapshot)
+        return self._snapshot_json
+
+    def next_delta(self):
+        """Fields changed since the previous call, or None when nothing changed.
+
+        Rooms that disappeared are reported with a None value.
+        """
+        snapshot = self.snapshot()
+        delta = {
+            key: value for key, value in snapshot.items()
+            if key not in ('active_users', 'room_details') and self._pushed_totals.get(key) != value
+        }
+        self._pushed_totals.update(delta)
+        if self._changed_rooms:
+            delta['room_details'] = {code: self._rooms.get(code) for code in self._changed_rooms}
+            self._changed_rooms = set()
+        if self._users_changed:
+            delta['active_users'] = self._users
+            self._users_changed = False
+        if not delta:
+            return None
+        self.stats['deltas'] += 1
+        return delta
@@ -0,0 +1,170 @@
+import math
+import re
+import zlib
+from collections import defaultdict
+from smart_replies import DEFAULT_MAX_SUGGESTIONS, ReplyProvider
+
+# Hashed feature space; collisions are rare at this size for a few hundred example phrases.
+FEATURE_BITS = 18
+DEFAULT_MIN_SCORE = 0.35
+
+# intent: (example messages, suggested replies)
+INTENTS = {
+    'greeting': (
+        ['hi', 'hello', 'hey', 'hey there', 'hi everyone', 'hello all', 'yo', 'hiya', 'sup', "what's up"],
+        ['Hey! 👋', 'Hi there!', "Hello! How's it going?"]),
+    'good_morning': (
+        ['good morning', 'morning', 'gm', 'good morning everyone', 'morning all'],
+        ['Good morning! ☀️', 'Morning! How did you sleep?', 'Good morning to you too!']),
+    'good_night': (
+        ['good night', 'night', 'gn', 'going to sleep', 'time for bed', 'nighty night'],
+        ['Good night! 🌙', 'Sleep well!', 'Night, talk tomorrow!']),
+    'farewell': (
+        ['bye', 'goodbye', 'see you later', 'see ya', 'talk later', 'catch you later', 'gotta go', 'later'],
+        ['Bye! Take care.', 'See you later!', 'Talk soon 👋']),
+    'how_are_you': (
+        ['how are you', 'how are you doing', "how's it going", 'how is everyone', "how's your day",
+         'you doing ok', 'how have you been'],
+        ["I'm good, thanks! You?", 'Doing well, how about you?', 'Pretty great today 😊']),
+    'thanks': (
+        ['thanks', 'thank you', 'thanks a lot', 'thank you so much', 'thx', 'ty', 'much appreciated',
+         'thanks for the help'],
+        ["You're welcome!", 'Anytime! 🙂', 'Happy to help!']),
+    'apology': (
+        ['sorry', 'my bad', 'sorry about that', 'apologies', 'i apologize', 'oops sorry'],
+        ['No worries!', "It's all good.", "Don't worry about it 🙂"]),
+    'agreement': (
+        ['yes', 'yeah', 'sure', 'ok', 'okay', 'sounds good', 'agreed', 'i agree', 'exactly', 'makes sense'],
+        ['Great!', 'Perfect 👍', 'Awesome, let’s do it.']),
+    'disagreement': (
+        ['no', 'nope', "i don't think so", 'not really', 'i disagree', "that's not right"],
+        ['Fair enough.', 'Why not?', "Okay, what do you suggest?"]),
+    'laughter': (
+        ['lol', 'haha', 'hahaha', 'lmao', 'that is hilarious', "that's funny", 'rofl', '😂'],
+        ['😂😂', 'Haha right?', "That's hilarious!"]),
+    'congratulations': (
+        ['i got the job', 'we won', 'i passed the exam', 'i got promoted', 'we shipped it', 'finally done',
+         'i finished the project'],
+        ['Congratulations! 🎉', "That's amazing news!", 'Well deserved!']),
+    'sympathy': (
+        ["i'm sad", 'feeling down', 'bad day', 'i failed the exam', 'i lost my job', "i'm not feeling well",
+         'i am sick', "i'm so tired"],
+        ["Sorry to hear that. I'm here for you.", 'Hope things get better soon ❤️', 'Want to talk about it?']),
+    'meeting_time': (
+        ['what time is the meeting', 'when is the meeting', 'when do we meet', 'what time should we meet',
+         'is the call still on', 'when is the call'],
+        ["Let me check and get back to you.", 'I think it’s at 3 pm?', 'Does 10 am work for you?']),
+    'plan_confirm': (
+        ['are we still on for tonight', 'are we meeting today', 'still on for tomorrow', 'are you coming',
+         'will you be there', 'you joining us'],
+        ["Yes, I'll be there!", 'Still on 👍', 'Running a bit late, but coming!']),
+    'status_update': (
+        ['any updates', 'any news', "what's the status", 'how is it going with the project', 'progress update',
+         'is it done yet', 'any progress'],
+        ['Almost done, will update soon.', 'Nothing new yet.', "I'll send an update shortly."]),
+    'help_request': (
+        ['can you help me', 'i need help', 'can someone help', 'could you help me with something',
+         'need a hand', 'help please'],
+        ['Sure, what do you need?', 'Happy to help!', "What's up?"]),
+    'brb': (
+        ['brb', 'be right back', 'one sec', 'give me a minute', 'hold on', 'just a moment'],
+        ['Sure, take your time.', 'No problem!', '👍']),
+    'compliment': (
+        ['nice work', 'great job', 'well done', 'good job', 'awesome work', 'that looks great', 'amazing'],
+        ['Thank you! 😊', 'Thanks, appreciate it!', 'Glad you like it!']),
+    'food': (
+        ["let's get lunch", 'want to grab lunch', 'anyone hungry', 'dinner tonight', 'coffee break',
+         'want to get coffee', "what's for lunch"],
+        ["I'm in! 🍕", 'Sounds good, where?', 'Sure, give me 10 minutes.']),
+    'opinion': (
+        ['what do you think', 'thoughts', 'any thoughts', 'what is your opinion', 'do you like it',
+         'what do you guys think'],
+        ['Looks good to me!', 'I like it 👍', 'Let me think about it.']),
+    'excitement': (
+        ["i'm so excited", "can't wait", 'this is awesome', 'so hyped', 'yay', 'woohoo'],
+        ['Me too! 🎉', 'Same here!', "It's going to be great!"]),
+    'question_where': (
+        ['where are you', 'where is everyone', 'where are we meeting', 'where should we go', 'which room'],
+        ["I'm on my way.", 'Just around the corner!', 'Let me share the location.']),
+}
+
+GENERIC_REPLIES = ['Got it!', 'Tell me more?', 'Interesting 🤔']
+
+
+def _tokens(text):
+    return re.findall(r"[a-z0-9']+|[^\sa-z0-9']", text.lower())
+
+
+def _features(text):
+    """Hashed word unigrams, word bigrams and character trigrams of `text`."""
+    words = _tokens(text)
+    grams = [f'w:{w}' for w in words]
+    grams += [f'b:{a} {b}' for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f' {word} '
+        grams += [f'c:{padded[i:i + 3]}' for i in range(len(padded) - 2)]
+    counts = defaultdict(int)
+    mask = (1 << FEATURE_BITS) - 1
+    for gram in grams:
+        counts[zlib.crc32(gram.encode()) & mask] += 1
+    return counts
+
+
+class LocalReplyEngine(ReplyProvider):
+    """Offline suggestions from an intent table, matched by hashed n-gram similarity.
+
+    Every intent example becomes a TF-IDF weighted, L2-normalized sparse
+    vector of hashed n-grams, indexed by feature. A message is scored by
+    accumulating dot products through that inverted index, so the cost
+    grows with the message length and the postings it touches, not with
+    the size of the table. An intent scores as its nearest example.
+    """
+
+    name = 'local'
+
+    def __init__(self, intents=INTENTS, min_score=DEFAULT_MIN_SCORE, generic_replies=GENERIC_REPLIES):
+        self.min_score = min_score
+        self.generic_replies = generic_replies
+        self.replies = {intent: replies for intent, (_, replies) in intents.items()}
+        examples = [(intent, _features(example)) for intent, (samples, _) in intents.items() for example in samples]
+
+        document_frequency = defaultdict(int)
+        for _, features in examples:
+            for feature in features:
+                document_frequency[feature] += 1
+        total = len(examples)
+        self._idf = {feature: math.log((1 + total) / (1 + df)) + 1 for feature, df in document_frequency.items()}
+
+        self._example_intents = []
+        self._postings = defaultdict(list)
+        for example_id, (intent, features) in enumerate(examples):
+            self._example_intents.append(intent)
+            for feature, weight in self._normalize(features).items():
+                self._postings[feature].append((example_id, weight))
+
+    def _normalize(self, features):
+        weighted = {feature: count * self._idf.get(feature, 0.0) for feature, count in features.items()}
+        norm = math.sqrt(sum(w * w for w in weighted.values()))
+        return {feature: w / norm for feature, w in weighted.items() if w} if norm else {}
+
+    def classify(self, message):
+        """Return (intent, cosine score) of the nearest example, or (None, 0.0)."""
+        scores = defaultdict(float)
+        for feature, weight in self._normalize(_features(message)).items():
+            for example_id, example_weight in self._postings.get(feature, ()):
+                scores[example_id] += weight * example_weight
+        if not scores:
+            return None, 0.0
+        example_id = max(scores, key=scores.get)
+        return self._example_intents[example_id], scores[example_id]
+
+    def match(self, message, max_suggestions=DEFAULT_MAX_SUGGESTIONS):
+        """Replies for a confidently recognized intent, otherwise None."""
+        intent, score = self.classify(message)
+        if intent is None or score < self.min_score:
+            return None
+        return self.replies[intent][:max_suggestions]
+
+    def suggest(self, message, max_suggestions=DEFAULT_MAX_SUGGESTIONS):
+        """Replies for the recognized intent, falling back to generic replies."""
+        return self.match(message, max_suggestions) or self.generic_replies[:max_suggestions]
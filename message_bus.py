@@ -0,0 +1,334 @@
+import json
+import os
+import queue
+import socket
+import threading
+from collections import defaultdict
+from framing import FrameReader, pack_frame
+import wire_json
+
+
+class MessageBus:
+    """Pub/sub channels plus shared counters and hashes for coordinating worker processes.
+
+    Messages are str. listen() is a blocking generator meant to run on its
+    own thread or green thread. The counter and hash operations mirror the
+    Redis commands of the same name, so a Redis server can back the bus.
+    """
+
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    def listen(self, channel):
+        raise NotImplementedError
+
+    def incr(self, key, delta=1):
+        """Add `delta` to a counter and return its new value."""
+        raise NotImplementedError
+
+    def get_many(self, keys):
+        """Return the current values of several counters; missing ones are 0."""
+        raise NotImplementedError
+
+    def hset(self, key, field, value):
+        raise NotImplementedError
+
+    def hget(self, key, field):
+        raise NotImplementedError
+
+    def hgetall(self, key):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class _BusState:
+    """Channel subscribers, counters and hashes shared by LocalBus and BusBroker."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(list)
+        self.counters = defaultdict(int)
+        self.hashes = defaultdict(dict)
+
+    def subscribe(self, channel, deliver):
+        with self.lock:
+            self.subscribers[channel].append(deliver)
+
+    def unsubscribe(self, channel, deliver):
+        with self.lock:
+            if deliver in self.subscribers[channel]:
+                self.subscribers[channel].remove(deliver)
+
+    def publish(self, channel, message):
+        with self.lock:
+            targets = list(self.subscribers[channel])
+        for deliver in targets:
+            deliver(message)
+        return len(targets)
+
+    def incr(self, key, delta):
+        with self.lock:
+            self.counters[key] += delta
+            return self.counters[key]
+
+    def get_many(self, keys):
+        with self.lock:
+            return [self.counters.get(key, 0) for key in keys]
+
+    def hset(self, key, field, value):
+        with self.lock:
+            self.hashes[key][field] = value
+
+    def hget(self, key, field):
+        with self.lock:
+            return self.hashes.get(key, {}).get(field)
+
+    def hgetall(self, key):
+        with self.lock:
+            return dict(self.hashes.get(key, {}))
+
+
+class LocalBus(MessageBus):
+    """In-process bus; stands in for Redis or the Unix-socket broker in tests and benchmarks."""
+
+    def __init__(self):
+        self._state = _BusState()
+
+    def publish(self, channel, message):
+        self._state.publish(channel, message)
+
+    def listen(self, channel):
+        inbox = queue.Queue()
+        self._state.subscribe(channel, inbox.put)
+        try:
+            while True:
+                message = inbox.get()
+                if message is None:
+                    return
+                yield message
+        finally:
+            self._state.unsubscribe(channel, inbox.put)
+
+    def incr(self, key, delta=1):
+        return self._state.incr(key, delta)
+
+    def get_many(self, keys):
+        return self._state.get_many(keys)
+
+    def hset(self, key, field, value):
+        self._state.hset(key, field, value)
+
+    def hget(self, key, field):
+        return self._state.hget(key, field)
+
+    def hgetall(self, key):
+        return self._state.hgetall(key)
+
+    def close(self):
+        with self._state.lock:
+            channels = {channel: list(targets) for channel, targets in self._state.subscribers.items()}
+        for targets in channels.values():
+            for deliver in targets:
+                deliver(None)
+
+
+class BusBroker:
+    """Unix-socket server holding the bus state for UnixSocketBus clients.
+
+    Requests and replies are JSON objects in the 4-byte length-prefixed
+    frames from framing.py. A connection that sends "sub" becomes a
+    subscriber and only receives published messages from then on.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._state = _BusState()
+        if os.path.exists(path):
+            os.unlink(path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(path)
+        self._server.listen()
+        self._running = True
+
+    def serve_forever(self):
+        while self._running:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='bus-broker', daemon=True).start()
+        return self
+
+    def _handle(self, conn):
+        reader = FrameReader(conn)
+        send_lock = threading.Lock()
+        subscriptions = []
+
+        def deliver(message):
+            try:
+                with send_lock:
+                    conn.sendall(pack_frame(message.encode()))
+            except OSError:
+                pass
+
+        try:
+            for frame in reader:
+                request = json.loads(bytes(frame))
+                op = request['op']
+                if op == 'sub':
+                    self._state.subscribe(request['ch'], deliver)
+                    subscriptions.append(request['ch'])
+                    continue
+                if op == 'pub':
+                    reply = self._state.publish(request['ch'], request['msg'])
+                elif op == 'incr':
+                    reply = self._state.incr(request['key'], request['delta'])
+                elif op == 'get':
+                    reply = self._state.get_many(request['keys'])
+                elif op == 'hset':
+                    reply = self._state.hset(request['key'], request['field'], request['value'])
+                elif op == 'hget':
+                    reply = self._state.hget(request['key'], request['field'])
+                elif op == 'hgetall':
+                    reply = self._state.hgetall(request['key'])
+                else:
+                    reply = None
+                with send_lock:
+                    conn.sendall(pack_frame(json.dumps(reply).encode()))
+        except (OSError, ValueError, KeyError):
+            pass
+        finally:
+            for channel in subscriptions:
+                self._state.unsubscribe(channel, deliver)
+            conn.close()
+
+    def close(self):
+        self._running = False
+        self._server.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class UnixSocketBus(MessageBus):
+    """Client of a BusBroker; one request socket shared under a lock, one socket per listen()."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._sock = self._connect()
+        self._reader = FrameReader(self._sock)
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        return sock
+
+    def _call(self, **request):
+        with self._lock:
+            self._sock.sendall(pack_frame(json.dumps(request).encode()))
+            frame = self._reader.read_frame()
+            if frame is None:
+                raise ConnectionError("Message bus broker closed the connection")
+            return json.loads(bytes(frame))
+
+    def publish(self, channel, message):
+        self._call(op='pub', ch=channel, msg=message)
+
+    def listen(self, channel):
+        sock = self._connect()
+        try:
+            sock.sendall(pack_frame(json.dumps({'op': 'sub', 'ch': channel}).encode()))
+            for frame in FrameReader(sock):
+                yield bytes(frame).decode()
+        finally:
+            sock.close()
+
+    def incr(self, key, delta=1):
+        return self._call(op='incr', key=key, delta=delta)
+
+    def get_many(self, keys):
+        return self._call(op='get', keys=list(keys))
+
+    def hset(self, key, field, value):
+        self._call(op='hset', key=key, field=field, value=value)
+
+    def hget(self, key, field):
+        return self._call(op='hget', key=key, field=field)
+
+    def hgetall(self, key):
+        return self._call(op='hgetall', key=key)
+
+    def close(self):
+        self._sock.close()
+
+
+class RedisBus(MessageBus):
+    """The same operations on a Redis server; needs the optional `redis` package."""
+
+    def __init__(self, url):
+        import redis
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+
+    def publish(self, channel, message):
+        self._redis.publish(channel, message)
+
+    def listen(self, channel):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(channel)
+        try:
+            for item in pubsub.listen():
+                if item['type'] == 'message':
+                    yield item['data']
+        finally:
+            pubsub.close()
+
+    def incr(self, key, delta=1):
+        return self._redis.incrby(key, delta)
+
+    def get_many(self, keys):
+        return [int(value or 0) for value in self._redis.mget(list(keys))]
+
+    def hset(self, key, field, value):
+        self._redis.hset(key, field, value)
+
+    def hget(self, key, field):
+        return self._redis.hget(key, field)
+
+    def hgetall(self, key):
+        return self._redis.hgetall(key)
+
+    def close(self):
+        self._redis.close()
+
+
+def connect_bus(url):
+    """Open a bus from a URL: local://, unix:///path/to/socket or redis://host:port/db."""
+    if url.startswith('local://'):
+        return LocalBus()
+    if url.startswith('unix://'):
+        return UnixSocketBus(url[len('unix://'):])
+    if url.startswith(('redis://', 'rediss://')):
+        return RedisBus(url)
+    raise ValueError(f"Unsupported message bus URL: {url}")
+
+
+def socketio_manager(bus, channel='securetalk-socketio'):
+    """Build a python-socketio client manager that relays emits between workers over `bus`."""
+    import socketio
+
+    class BusManager(socketio.PubSubManager):
+        name = 'securetalk-bus'
+
+        def _publish(self, data):
+            # Emits may carry pre-serialized wire_json.RawJSON packets.
+            bus.publish(self.channel, wire_json.dumps(data))
+
+        def _listen(self):
+            yield from bus.listen(self.channel)
+
+    return BusManager(channel=channel)
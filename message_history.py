@@ -0,0 +1,162 @@
+import sys
+from collections import deque
+from itertools import islice
+
+DEFAULT_DEPTH = 50
+DEFAULT_MAX_BYTES = 256 * 1024
+
+
+class PacketRecord:
+    """One stored chat message, kept as the serialized packet that was broadcast for it.
+
+    `packet` is a wire_json.RawJSON; replay splices its text into the
+    history emit, so a message is serialized once for fan-out, storage and
+    every later replay.
+    """
+
+    __slots__ = ('username', 'timestamp', 'packet', 'size', 'seq')
+
+    def __init__(self, username, timestamp, packet, seq=None):
+        self.username = sys.intern(username)
+        self.timestamp = timestamp
+        self.packet = packet
+        self.size = len(packet)
+        self.seq = seq
+
+    def to_wire(self):
+        return self.packet
+
+
+class RoomHistory:
+    """Most recent messages of one room in a bounded deque.
+
+    Appending is O(1); once `depth` records or `max_bytes` of payload are
+    held, the oldest records are evicted from the left. Replay walks the
+    deque from the newest end, so a page costs O(offset + limit) and never
+    copies the whole history.
+
+    Records may carry per-room sequence numbers. `next_seq` is the number
+    the next message gets and `epoch` names the numbering, so a client
+    that reconnects with the last seq it saw can be sent only what came
+    after it; None means the room's messages are not sequenced.
+    """
+
+    __slots__ = ('records', 'max_bytes', 'bytes', 'next_seq', 'epoch')
+
+    def __init__(self, depth=DEFAULT_DEPTH, max_bytes=DEFAULT_MAX_BYTES, next_seq=0, epoch=None):
+        self.records = deque(maxlen=depth)
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.next_seq = next_seq
+        self.epoch = epoch
+
+    def append(self, record):
+        records = self.records
+        if record.seq is not None and record.seq >= self.next_seq:
+            self.next_seq = record.seq + 1
+        if len(records) == records.maxlen:
+            self.bytes -= records[0].size
+        records.append(record)
+        self.bytes += record.size
+        while self.bytes > self.max_bytes and len(records) > 1:
+            self.bytes -= records.popleft().size
+        return record
+
+    def page(self, limit=None, offset=0):
+        """Return up to `limit` records, oldest first, ending `offset` records before the newest."""
+        if limit is None:
+            limit = len(self.records)
+        if offset >= len(self.records) or limit <= 0:
+            return []
+        newest_first = list(islice(reversed(self.records), offset, offset + limit))
+        newest_first.reverse()
+        return newest_first
+
+    def since(self, seq):
+        """Return the records numbered `seq` and later, oldest first.
+
+        Returns None when they are not all still held (evicted, or never
+        stored here) or `seq` is ahead of `next_seq`; the caller then has
+        to fall back to a full replay.
+        """
+        missing = self.next_seq - seq
+        if missing < 0:
+            return None
+        records = self.records
+        if missing > len(records) or (missing and records[-missing].seq != seq):
+            return None
+        return self.page(missing)
+
+    @property
+    def first_seq(self):
+        """Sequence number of the oldest record held, or next_seq when empty."""
+        return self.records[0].seq if self.records else self.next_seq
+
+    def __len__(self):
+        return len(self.records)
+
+    def __bool__(self):
+        return bool(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+
+def int_field(data, name, default=None):
+    """A client-supplied number as an int, or `default` when it is missing or not a number."""
+    try:
+        return int(data[name])
+    except (KeyError, TypeError, ValueError, OverflowError):
+        return default
+
+
+def sync_reply(history, data, read_log=None):
+    """The message_history payload for a client joining or resyncing with `data`.
+
+    A client that sends the `epoch` and the first `since_seq` it has not
+    seen gets only the messages from there on ('delta'), or, when some of
+    them are gone, what is still held plus how many were lost ('gap').
+    Without a matching epoch it gets a page of the full history ('full').
+    `read_log(since_seq)` may supply records `history` no longer holds,
+    or return None when it cannot either.
+    """
+    reply = {'epoch': history.epoch, 'next_seq': history.next_seq}
+    # A since_seq that is not a number gets the full history, like an unknown epoch.
+    since_seq = int_field(data, 'since_seq')
+    # Clients of the log-only API send since_seq without an epoch.
+    if (since_seq is not None and 0 <= since_seq <= history.next_seq and history.epoch is not None
+            and data.get('epoch', history.epoch) == history.epoch):
+        records = history.since(since_seq)
+        if records is None and read_log:
+            records = read_log(since_seq)
+        if records is not None:
+            reply.update(sync='delta', messages=[record.to_wire() for record in records])
+        else:
+            reply.update(sync='gap', missed=history.first_seq - since_seq,
+                         messages=[record.to_wire() for record in history])
+        return reply
+    reply.update(sync='full', total=len(history), messages=[record.to_wire() for record in history.page(
+        int_field(data, 'history_limit'), max(0, int_field(data, 'history_offset', 0))
+    )])
+    return reply
+
+
+class TrafficRecord:
+    """Per-message entry of network_stats['message_history']."""
+
+    __slots__ = ('timestamp', 'username', 'room', 'size_bytes')
+
+    def __init__(self, timestamp, username, room, size_bytes):
+        self.timestamp = timestamp
+        self.username = sys.intern(username)
+        self.room = room
+        self.size_bytes = size_bytes
+
+    def to_dict(self):
+        return {
+            'timestamp': self.timestamp,
+            'username': self.username,
+            'room': self.room,
+            'size_bytes': self.size_bytes,
+            'encrypted': True
+        }
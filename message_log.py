@@ -0,0 +1,405 @@
+import bisect
+import json
+import mmap
+import os
+import re
+import shutil
+import struct
+import time
+import zlib
+
+from native_threads import original
+
+# Record: crc32 of everything after it, payload length, seq, timestamp,
+# username length; then the username and the encrypted payload.
+RECORD = struct.Struct('>IIQdH')
+RECORD_BODY = struct.Struct('>IQdH')
+INDEX_ENTRY = struct.Struct('>QQ')
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+DEFAULT_INDEX_INTERVAL = 64
+DEFAULT_FSYNC_INTERVAL = 0.05
+DEFAULT_FSYNC_BATCH = 1024
+ROOMS_FILE = 'rooms.jsonl'
+TOMBSTONE_SUFFIX = '.deleted'
+SAFE_NAME = re.compile(r'[A-Za-z0-9_-]+')
+
+
+class LogRecord:
+    __slots__ = ('seq', 'timestamp', 'username', 'payload')
+
+    def __init__(self, seq, timestamp, username, payload):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.username = username
+        self.payload = payload
+
+
+def _room_dirname(room):
+    return room if SAFE_NAME.fullmatch(room) else 'x-' + room.encode().hex()
+
+
+class _Segment:
+    __slots__ = ('base_seq', 'path', 'index_path', 'index_seqs', 'index_offsets', 'size')
+
+    def __init__(self, directory, base_seq):
+        self.base_seq = base_seq
+        self.path = os.path.join(directory, f'{base_seq:020d}.log')
+        self.index_path = os.path.join(directory, f'{base_seq:020d}.idx')
+        self.index_seqs = []
+        self.index_offsets = []
+        self.size = 0
+
+    def load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, 'rb') as f:
+            data = f.read()
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        for seq, offset in INDEX_ENTRY.iter_unpack(data[:usable]):
+            self.index_seqs.append(seq)
+            self.index_offsets.append(offset)
+
+    def offset_for(self, seq):
+        """Byte offset of the last indexed record at or before `seq`."""
+        i = bisect.bisect_right(self.index_seqs, seq) - 1
+        return self.index_offsets[i] if i >= 0 else 0
+
+
+def _scan(buf, offset, end):
+    """Yield (end offset, LogRecord) for every intact record in buf[offset:end]."""
+    while offset + RECORD.size <= end:
+        crc, length, seq, timestamp, name_len = RECORD.unpack_from(buf, offset)
+        body_end = offset + RECORD.size + name_len + length
+        if body_end > end or zlib.crc32(buf[offset + 4:body_end]) != crc:
+            return
+        name_start = offset + RECORD.size
+        username = bytes(buf[name_start:name_start + name_len]).decode()
+        payload = bytes(buf[name_start + name_len:body_end])
+        yield body_end, LogRecord(seq, timestamp, username, payload)
+        offset = body_end
+
+
+class RoomLog:
+    """Segmented append-only log of one room's encrypted messages.
+
+    Segments are named after the first sequence number they hold and roll
+    over once they reach `segment_bytes`. Every `index_interval`-th record
+    gets an entry in the segment's sparse .idx file, so a read seeks with
+    two binary searches and scans at most one index interval of records
+    through a memory map.
+    """
+
+    def __init__(self, directory, segment_bytes, index_interval):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.index_interval = index_interval
+        self.segments = []
+        self.next_seq = 0
+        self.dirty = False
+        self._log = None
+        self._index = None
+        self._since_index = 0
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    def _recover(self):
+        bases = sorted(int(name[:-4]) for name in os.listdir(self.directory) if name.endswith('.log'))
+        for base in bases:
+            segment = _Segment(self.directory, base)
+            segment.load_index()
+            segment.size = os.path.getsize(segment.path)
+            self.segments.append(segment)
+        if not self.segments:
+            self._open_segment(0)
+            return
+
+        # Only the active segment can have a torn tail; cut it after the last
+        # intact record and drop index entries that point past that.
+        segment = self.segments[-1]
+        start = segment.index_offsets[-1] if segment.index_offsets else 0
+        valid_end = start
+        next_seq = segment.index_seqs[-1] if segment.index_seqs else segment.base_seq
+        if segment.size > start:
+            with open(segment.path, 'rb') as f:
+                f.seek(start)
+                data = f.read()
+            for end, record in _scan(data, 0, len(data)):
+                valid_end = start + end
+                next_seq = record.seq + 1
+        if valid_end < segment.size:
+            with open(segment.path, 'r+b') as f:
+                f.truncate(valid_end)
+            segment.size = valid_end
+        while segment.index_offsets and segment.index_offsets[-1] >= valid_end:
+            segment.index_seqs.pop()
+            segment.index_offsets.pop()
+        with open(segment.index_path, 'wb') as f:
+            f.write(b''.join(INDEX_ENTRY.pack(seq, offset)
+                             for seq, offset in zip(segment.index_seqs, segment.index_offsets)))
+        self.next_seq = next_seq
+        self._log = open(segment.path, 'ab')
+        self._index = open(segment.index_path, 'ab')
+        self._since_index = next_seq - segment.index_seqs[-1] if segment.index_seqs else 0
+
+    def _open_segment(self, base_seq):
+        segment = _Segment(self.directory, base_seq)
+        self.segments.append(segment)
+        self._log = open(segment.path, 'ab')
+        self._index = open(segment.index_path, 'ab')
+        self._since_index = 0
+
+    def _roll(self):
+        self.sync()
+        self._log.close()
+        self._index.close()
+        self._open_segment(self.next_seq)
+
+    def append(self, timestamp, username, payload):
+        segment = self.segments[-1]
+        name = username.encode()
+        body = RECORD_BODY.pack(len(payload), self.next_seq, timestamp, len(name)) + name + payload
+        record = struct.pack('>I', zlib.crc32(body)) + body
+        if self._since_index % self.index_interval == 0:
+            segment.index_seqs.append(self.next_seq)
+            segment.index_offsets.append(segment.size)
+            self._index.write(INDEX_ENTRY.pack(self.next_seq, segment.size))
+        self._log.write(record)
+        segment.size += len(record)
+        self._since_index += 1
+        seq = self.next_seq
+        self.next_seq += 1
+        self.dirty = True
+        if segment.size >= self.segment_bytes:
+            self._roll()
+        return seq
+
+    def flush(self):
+        self._log.flush()
+        self._index.flush()
+
+    def sync(self):
+        self.flush()
+        os.fsync(self._log.fileno())
+        os.fsync(self._index.fileno())
+        self.dirty = False
+
+    def sync_fds(self):
+        """Flush and return duplicates of the segment and index fds, to be fsynced and closed by the caller.
+
+        The duplicates stay valid if the segment rolls or the log is closed
+        meanwhile, so the fsync can happen without holding the log's lock.
+        """
+        self.flush()
+        self.dirty = False
+        return os.dup(self._log.fileno()), os.dup(self._index.fileno())
+
+    @property
+    def first_seq(self):
+        return self.segments[0].base_seq
+
+    def read(self, start_seq, limit):
+        """Return up to `limit` records with seq >= start_seq, oldest first."""
+        start_seq = max(start_seq, self.first_seq)
+        if limit <= 0 or start_seq >= self.next_seq:
+            return []
+        self.flush()
+        bases = [segment.base_seq for segment in self.segments]
+        out = []
+        for segment in self.segments[max(0, bisect.bisect_right(bases, start_seq) - 1):]:
+            if not segment.size:
+                continue
+            with open(segment.path, 'rb') as f, mmap.mmap(f.fileno(), segment.size, access=mmap.ACCESS_READ) as buf:
+                for _, record in _scan(buf, segment.offset_for(start_seq), segment.size):
+                    if record.seq < start_seq:
+                        continue
+                    out.append(record)
+                    if len(out) == limit:
+                        return out
+        return out
+
+    def close(self):
+        if self._log:
+            self.sync()
+            self._log.close()
+            self._index.close()
+            self._log = self._index = None
+
+
+class MessageLog:
+    """Durable per-room storage for already-encrypted messages.
+
+    append() only writes into buffered segment files; a background thread
+    fsyncs every room with new records each `fsync_interval` seconds, or
+    sooner once `fsync_batch` records are pending, so many messages share
+    one fsync (group commit). Pass durable=True to append() to wait for
+    the commit covering that message.
+
+    User-created room definitions are kept in an append-only rooms.jsonl
+    next to the room directories.
+
+    The flusher and its lock are real OS threading objects even under
+    eventlet, so an fsync never runs on the hub.
+    """
+
+    def __init__(self, directory, segment_bytes=DEFAULT_SEGMENT_BYTES,
+                 index_interval=DEFAULT_INDEX_INTERVAL, fsync_interval=DEFAULT_FSYNC_INTERVAL,
+                 fsync_batch=DEFAULT_FSYNC_BATCH):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.index_interval = index_interval
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = fsync_batch
+        self.rooms = {}
+        self.stats = {'appends': 0, 'commits': 0, 'fsyncs': 0}
+        threading = original('threading')
+        self._lock = threading.Lock()
+        self._commit_ready = threading.Condition(self._lock)
+        self._pending = 0
+        self._committed = 0
+        self._appended = 0
+        self._closed = False
+        os.makedirs(directory, exist_ok=True)
+        self._rooms_file = open(os.path.join(directory, ROOMS_FILE), 'a')
+        self._flusher = threading.Thread(target=self._flush_loop, name='message-log-flusher', daemon=True)
+        self._flusher.start()
+
+    def _room(self, room, create=True):
+        log = self.rooms.get(room)
+        if log is None:
+            path = os.path.join(self.directory, _room_dirname(room))
+            if not create and not os.path.isdir(path):
+                return None
+            log = self.rooms[room] = RoomLog(path, self.segment_bytes, self.index_interval)
+        return log
+
+    def append(self, room, username, payload, timestamp=None, durable=False):
+        """Append one encrypted payload; returns its sequence number within the room."""
+        with self._lock:
+            seq = self._room(room).append(timestamp or time.time(), username, bytes(payload))
+            self._appended += 1
+            self._pending += 1
+            self.stats['appends'] += 1
+            ticket = self._appended
+            if self._pending >= self.fsync_batch:
+                self._commit_ready.notify_all()
+            if durable:
+                while self._committed < ticket and not self._closed:
+                    self._commit_ready.notify_all()
+                    self._commit_ready.wait()
+        return seq
+
+    def _commit_locked(self):
+        """Fsync every room with new records. Called with the lock held; it is
+        released around the fsyncs so appends do not wait for the disk."""
+        ticket = self._appended
+        fds = [fd for log in self.rooms.values() if log.dirty for fd in log.sync_fds()]
+        self._pending = 0
+        self._lock.release()
+        try:
+            for fd in fds:
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+        finally:
+            self._lock.acquire()
+        self._committed = max(self._committed, ticket)
+        self.stats['fsyncs'] += len(fds) // 2
+        self.stats['commits'] += 1
+        self._commit_ready.notify_all()
+
+    def _flush_loop(self):
+        with self._lock:
+            while not self._closed:
+                self._commit_ready.wait(self.fsync_interval)
+                if self._pending:
+                    self._commit_locked()
+
+    def next_seq(self, room):
+        with self._lock:
+            log = self._room(room, create=False)
+            return log.next_seq if log else 0
+
+    def read_last(self, room, count):
+        """Return the last `count` records of a room, oldest first."""
+        with self._lock:
+            log = self._room(room, create=False)
+            if log is None:
+                return []
+            return log.read(log.next_seq - count, count)
+
+    def read_since(self, room, seq, limit=1000):
+        """Return up to `limit` records with sequence numbers >= seq, oldest first."""
+        with self._lock:
+            log = self._room(room, create=False)
+            return log.read(seq, limit) if log else []
+
+    def delete_room(self, room):
+        """Tombstone a room's log; compact() removes its files."""
+        with self._lock:
+            log = self.rooms.pop(room, None)
+            if log:
+                log.close()
+            path = os.path.join(self.directory, _room_dirname(room))
+            if os.path.isdir(path):
+                os.rename(path, f'{path}.{time.time_ns()}{TOMBSTONE_SUFFIX}')
+            self._rooms_file.write(json.dumps({'op': 'delete', 'code': room}) + '\n')
+            self._rooms_file.flush()
+
+    def compact(self):
+        """Delete tombstoned room logs and rewrite rooms.jsonl; returns how many logs were removed."""
+        removed = 0
+        for name in os.listdir(self.directory):
+            if name.endswith(TOMBSTONE_SUFFIX):
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+                removed += 1
+        with self._lock:
+            rooms = self._load_rooms_locked()
+            path = os.path.join(self.directory, ROOMS_FILE)
+            with open(path + '.tmp', 'w') as f:
+                for code, info in rooms.items():
+                    f.write(json.dumps({'op': 'put', 'code': code, 'room': info}) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self._rooms_file.close()
+            os.replace(path + '.tmp', path)
+            self._rooms_file = open(path, 'a')
+        return removed
+
+    def save_room(self, code, info):
+        with self._lock:
+            self._rooms_file.write(json.dumps({'op': 'put', 'code': code, 'room': info}) + '\n')
+            self._rooms_file.flush()
+            os.fsync(self._rooms_file.fileno())
+
+    def _load_rooms_locked(self):
+        rooms = {}
+        self._rooms_file.flush()
+        with open(os.path.join(self.directory, ROOMS_FILE)) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get('op') == 'put':
+                    rooms[entry['code']] = entry['room']
+                else:
+                    rooms.pop(entry.get('code'), None)
+        return rooms
+
+    def load_rooms(self):
+        """Return the saved room definitions, code -> room info."""
+        with self._lock:
+            return self._load_rooms_locked()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._commit_locked()
+            self._closed = True
+            self._commit_ready.notify_all()
+            for log in self.rooms.values():
+                log.close()
+            self._rooms_file.close()
+        self._flusher.join()
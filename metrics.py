@@ -0,0 +1,211 @@
+import sys
+import time
+import traceback
+from bisect import bisect_left
+from collections import Counter
+from time import perf_counter
+
+from native_threads import original
+
+# Upper bounds in seconds, 10 us to 10 s; observations above the last one land in +Inf.
+DEFAULT_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2,
+                   2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+RATE_WINDOWS = (10, 60)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; observe() is one bisect and two additions."""
+
+    __slots__ = ('bounds', 'counts', 'count', 'sum')
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimate a quantile by linear interpolation inside its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.bounds[i - 1] if i else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+
+class SlidingCounter:
+    """Event counts in one-second slots over the last `slots` seconds."""
+
+    __slots__ = ('slots', 'counts', 'last_second')
+
+    def __init__(self, slots=max(RATE_WINDOWS)):
+        self.slots = slots
+        self.counts = [0] * slots
+        self.last_second = 0
+
+    def _advance(self, second):
+        gap = second - self.last_second
+        if gap >= self.slots:
+            self.counts = [0] * self.slots
+        else:
+            for s in range(self.last_second + 1, second + 1):
+                self.counts[s % self.slots] = 0
+        self.last_second = second
+
+    def add(self, now, n=1):
+        second = int(now)
+        if second != self.last_second:
+            self._advance(second)
+        self.counts[second % self.slots] += n
+
+    def rate(self, now, window):
+        """Average events per second over the last `window` seconds."""
+        second = int(now)
+        if second != self.last_second:
+            self._advance(second)
+        window = min(window, self.slots)
+        return sum(self.counts[(second - i) % self.slots] for i in range(window)) / window
+
+
+class SamplingProfiler:
+    """Samples every thread's stack at a fixed interval and counts collapsed stacks.
+
+    The result of dump() is in the "collapsed" format flamegraph tools read:
+    one line per unique stack, frames joined by ';', followed by its count.
+
+    The sampler is a real OS thread even under eventlet. A green sampler
+    would only run while every handler is idle, and would see no thread
+    but its own. From outside the hub, the hub thread's frame is whichever
+    greenlet is running, so busy handlers show up as they use the CPU.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = Counter()
+        self._thread = None
+        self._running = False
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self.samples.clear()
+        self._thread = original('threading').Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        me = original('threading').get_ident()
+        sleep = original('time').sleep
+        while self._running:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = ';'.join(f'{f.name} ({f.filename.rsplit("/", 1)[-1]}:{f.lineno})'
+                                 for f in traceback.extract_stack(frame))
+                self.samples[stack] += 1
+            sleep(self.interval)
+
+    def dump(self):
+        return '\n'.join(f'{stack} {count}' for stack, count in self.samples.most_common())
+
+
+class Metrics:
+    """Per-stage latency histograms, per-room message rates and a sampling profiler.
+
+    Time a stage with `t = metrics.since('stage', t)`: it records the time
+    elapsed since `t` and returns the current time for the next stage, so
+    a handler pays one perf_counter() call and one bisect per stage.
+    """
+
+    def __init__(self, enabled=True, clock=time.monotonic):
+        self.enabled = enabled
+        self.histograms = {}
+        self.room_rates = {}
+        self.profiler = SamplingProfiler()
+        self._clock = clock
+
+    def histogram(self, stage):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = Histogram()
+        return histogram
+
+    def observe(self, stage, seconds):
+        if self.enabled:
+            self.histogram(stage).observe(seconds)
+
+    def since(self, stage, start):
+        now = perf_counter()
+        if self.enabled:
+            self.histogram(stage).observe(now - start)
+        return now
+
+    def room_message(self, room_code):
+        if not self.enabled:
+            return
+        counter = self.room_rates.get(room_code)
+        if counter is None:
+            counter = self.room_rates[room_code] = SlidingCounter()
+        counter.add(self._clock())
+
+    def forget_room(self, room_code):
+        self.room_rates.pop(room_code, None)
+
+    def summary(self):
+        """{stage: {'count', 'p50', 'p95', 'p99'}} with latencies in milliseconds."""
+        return {
+            stage: dict(count=h.count, **{f'p{int(q * 100)}': h.quantile(q) * 1e3 for q in QUANTILES})
+            for stage, h in self.histograms.items()
+        }
+
+    def render_prometheus(self, gauges=None, prefix='securetalk'):
+        """Render everything in the Prometheus text exposition format."""
+        lines = []
+        for name, value in (gauges or {}).items():
+            lines.append(f'# TYPE {prefix}_{name} gauge')
+            lines.append(f'{prefix}_{name} {value}')
+
+        lines.append(f'# TYPE {prefix}_stage_seconds histogram')
+        for stage, h in self.histograms.items():
+            cumulative = 0
+            for bound, n in zip(h.bounds + (float('inf'),), h.counts):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {h.sum}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {h.count}')
+
+        lines.append(f'# TYPE {prefix}_stage_quantile_seconds gauge')
+        for stage, h in self.histograms.items():
+            for q in QUANTILES:
+                lines.append(f'{prefix}_stage_quantile_seconds{{stage="{stage}",quantile="{q}"}} {h.quantile(q)}')
+
+        now = self._clock()
+        lines.append(f'# TYPE {prefix}_room_messages_per_second gauge')
+        for room_code, counter in self.room_rates.items():
+            for window in RATE_WINDOWS:
+                lines.append(f'{prefix}_room_messages_per_second{{room="{room_code}",window="{window}s"}} '
+                             f'{counter.rate(now, window)}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,20 @@
+import importlib
+import sys
+
+# eventlet's name for the patch that replaces each module.
+_PATCHES = {'threading': 'thread', '_thread': 'thread', 'time': 'time'}
+
+
+def original(name):
+    """Standard library module `name` as it was before eventlet monkey patching.
+
+    eventlet.monkey_patch() turns threads into green threads that only run
+    when the hub yields. Workers that must really run alongside the hub,
+    such as MessageLog's fsync loop and SamplingProfiler, take threading
+    and time from here. Without eventlet this is a plain import.
+    """
+    if 'eventlet' in sys.modules:
+        from eventlet import patcher
+        if patcher.is_monkey_patched(_PATCHES.get(name, name)):
+            return patcher.original(name)
+    return importlib.import_module(name)
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import random
+import string
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+
+CODE_ALPHABET = string.ascii_uppercase + string.digits
+CODE_LENGTH = 6
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+SNAPSHOT_CACHE_SIZE = 256
+
+
+class RoomPage:
+    """One serialized page of the public room directory."""
+
+    __slots__ = ('body', 'etag', 'version', 'built_at')
+
+    def __init__(self, body, version, built_at):
+        self.body = body
+        self.etag = hashlib.blake2b(body.encode(), digest_size=8).hexdigest()
+        self.version = version
+        self.built_at = built_at
+
+
+class RoomRegistry:
+    """Room definitions by code, with a sorted index of the public ones.
+
+    Reads work like the plain dict it replaces (`in`, `[]`, get(), len()).
+    Writes go through put()/update(), which keep the public index sorted
+    by (lower-cased name, code), so listing a page or a name-prefix search
+    is a bisect plus `limit` steps rather than a scan of every room.
+
+    page() returns a RoomPage whose JSON body and ETag are built once and
+    reused until the directory changes: put() of a new or different room,
+    or touch() when a room's membership moves. `user_counts(codes)` returns
+    the current member counts for a page's codes; with `max_age` set, a
+    page is also rebuilt once it is that many seconds old, for counts that
+    change without a local touch().
+    """
+
+    def __init__(self, user_counts, max_age=None, clock=time.monotonic):
+        self._rooms = {}
+        self._keys = {}
+        self._index = []
+        self._user_counts = user_counts
+        self._max_age = max_age
+        self._clock = clock
+        self._pages = OrderedDict()
+        self.version = 0
+        self.stats = {'hits': 0, 'builds': 0}
+
+    def __contains__(self, code):
+        return code in self._rooms
+
+    def __getitem__(self, code):
+        return self._rooms[code]
+
+    def __len__(self):
+        return len(self._rooms)
+
+    def __iter__(self):
+        return iter(self._rooms)
+
+    def get(self, code, default=None):
+        return self._rooms.get(code, default)
+
+    def items(self):
+        return self._rooms.items()
+
+    def put(self, code, info):
+        """Add or replace a room; returns its info."""
+        if self._rooms.get(code) == info:
+            return self._rooms[code]
+        self._rooms[code] = info
+        old_key = self._keys.pop(code, None)
+        if old_key is not None:
+            del self._index[bisect_left(self._index, old_key)]
+        if info.get('isPublic', True):
+            key = self._keys[code] = (str(info.get('name', '')).lower(), code)
+            insort(self._index, key)
+        self.version += 1
+        return info
+
+    def update(self, rooms):
+        for code, info in dict(rooms).items():
+            self.put(code, info)
+
+    def touch(self, code):
+        """Note that a public room's member count changed."""
+        if code in self._keys:
+            self.version += 1
+
+    def new_code(self, taken=None):
+        """Pick an unused room code; `taken(code)` can also check rooms held elsewhere."""
+        while True:
+            code = ''.join(random.choices(CODE_ALPHABET, k=CODE_LENGTH))
+            if code not in self._rooms and not (taken and taken(code)):
+                return code
+
+    def page(self, limit=DEFAULT_PAGE_SIZE, cursor=None, prefix=''):
+        """Up to `limit` public rooms whose name starts with `prefix`, after `cursor`.
+
+        The body is {"rooms": [...], "next": cursor or null, "total": public
+        rooms}; pass `next` back as `cursor` for the following page.
+        """
+        limit = max(1, min(MAX_PAGE_SIZE, limit))
+        prefix = prefix.lower()
+        cache_key = (limit, cursor, prefix)
+        now = self._clock()
+        page = self._pages.get(cache_key)
+        if page is not None and page.version == self.version and (
+                self._max_age is None or now - page.built_at < self._max_age):
+            self._pages.move_to_end(cache_key)
+            self.stats['hits'] += 1
+            return page
+
+        keys = self._page_keys(limit + 1, cursor, prefix)
+        more = len(keys) > limit
+        keys = keys[:limit]
+        codes = [code for _, code in keys]
+        rooms = []
+        for code, users in zip(codes, self._user_counts(codes)):
+            info = self._rooms[code]
+            rooms.append({
+                'code': code,
+                'name': info['name'],
+                'description': info.get('description', ''),
+                'maxUsers': info.get('maxUsers', 50),
+                'currentUsers': users,
+                'isPublic': True
+            })
+        body = json.dumps({
+            'rooms': rooms,
+            'next': _encode_cursor(keys[-1]) if more else None,
+            'total': len(self._index)
+        })
+        page = self._pages[cache_key] = RoomPage(body, self.version, now)
+        self._pages.move_to_end(cache_key)
+        if len(self._pages) > SNAPSHOT_CACHE_SIZE:
+            self._pages.popitem(last=False)
+        self.stats['builds'] += 1
+        return page
+
+    def _page_keys(self, count, cursor, prefix):
+        after = _decode_cursor(cursor)
+        if after is not None:
+            start = bisect_right(self._index, after)
+        else:
+            start = bisect_left(self._index, (prefix,))
+        keys = []
+        for key in self._index[start:start + count]:
+            if not key[0].startswith(prefix):
+                break
+            keys.append(key)
+        return keys
+
+
+def _encode_cursor(key):
+    return f'{key[1]}:{key[0]}'
+
+
+def _decode_cursor(cursor):
+    """Cursors are "CODE:lower-cased name"; anything else starts from the beginning."""
+    if not cursor or ':' not in cursor:
+        return None
+    code, name = cursor.split(':', 1)
+    return (name, code)
@@ -0,0 +1,58 @@
+import time
+
+DEFAULT_INTERVAL = 1.0
+
+
+class RoomStatsScheduler:
+    """Dirty-flag batching of per-room `room_stats` updates.
+
+    Handlers call mark() whenever a room's user or message count moves.
+    take() hands the current stats to a handler that is about to emit to
+    the room anyway, so they ride along on that packet; flush() returns the
+    rooms still dirty whose last update went out at least `interval`
+    seconds ago. Either way a room's stats are described once per send,
+    not once per event.
+
+    `describe(room)` returns the room's stats dict, or None once it is gone.
+    """
+
+    def __init__(self, describe, interval=DEFAULT_INTERVAL, clock=time.monotonic):
+        self.interval = interval
+        self._describe = describe
+        self._clock = clock
+        self._dirty = set()
+        self._sent_at = {}
+        self.stats = {'marked': 0, 'piggybacked': 0, 'flushed': 0}
+
+    def mark(self, room_code):
+        self._dirty.add(room_code)
+        self.stats['marked'] += 1
+
+    def take(self, room_code):
+        """Stats for `room_code` if it is dirty, clearing the flag; None otherwise."""
+        if room_code not in self._dirty:
+            return None
+        self._dirty.discard(room_code)
+        self._sent_at[room_code] = self._clock()
+        self.stats['piggybacked'] += 1
+        return self._describe(room_code)
+
+    def flush(self):
+        """Return {room: stats} for dirty rooms whose last update is at least `interval` old."""
+        now = self._clock()
+        due = [room for room in self._dirty if now - self._sent_at.get(room, float('-inf')) >= self.interval]
+        updates = {}
+        for room_code in due:
+            self._dirty.discard(room_code)
+            stats = self._describe(room_code)
+            if stats is None:
+                self._sent_at.pop(room_code, None)
+                continue
+            self._sent_at[room_code] = now
+            updates[room_code] = stats
+        self.stats['flushed'] += len(updates)
+        return updates
+
+    def forget(self, room_code):
+        self._dirty.discard(room_code)
+        self._sent_at.pop(room_code, None)
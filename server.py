@@ -1,58 +1,325 @@
+import argparse
+import selectors
 import socket
 import threading
-import struct
+from collections import deque
+from framing import (FrameReader, FrameTooLarge, DEFAULT_MAX_FRAME_SIZE,
+                     HAS_SENDMSG, pack_frame, wire_version, binary_to_base64,
+                     parse_control, control_payload, CONTROL_HELLO, CONTROL_HELLO_ACK,
+                     WIRE_BINARY, MAX_WIRE_VERSION)
+from flow_control import OutboundQueue, RateLimiter
 
-clients = []
+DEFAULT_QUEUE_SIZE = 256
+HAS_DONTWAIT = hasattr(socket, 'MSG_DONTWAIT')
+MSG_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0)
 
-def recvall(sock, n):
-    """Receive exactly n bytes."""
-    data = b''
-    while len(data) < n:
-        packet = sock.recv(n - len(data))
-        if not packet:
-            return None
-        data += packet
-    return data
+clients = frozenset()
+binary_clients = frozenset()
+writers = {}
+clients_lock = threading.Lock()
+send_lock = threading.Lock()
+limiter = None
+stats = {
+    'connections': 0,
+    'messages_relayed': 0,
+    'rate_limited': 0,
+    'slow_consumers_evicted': 0,
+    # Payload copies made by the relay: one per frame encoding, shared by every recipient and queue.
+    'frames_copied': 0
+}
 
-def handle_client(conn, addr):
+class ClientWriter:
+    """Outbound path of one client: direct non-blocking sends, queued once it falls behind.
+
+    While the client keeps up, put() writes straight to its socket without
+    blocking. Whatever the socket will not take goes into a bounded
+    OutboundQueue, which the shared BacklogPump drains in order, so a slow
+    reader delays nobody but itself. Once its queue hits the limit put()
+    returns False and the client is evicted. Without MSG_DONTWAIT, put()
+    falls back to blocking sends.
+
+    Callers of put() hold send_lock, one lock for all clients, so a
+    broadcast takes it once rather than once per recipient.
+    """
+
+    def __init__(self, conn, queue_size=DEFAULT_QUEUE_SIZE):
+        self.conn = conn
+        self.queue = OutboundQueue(high=queue_size * 3 // 4, low=queue_size // 4, limit=queue_size)
+        self.pending = deque()
+        self.draining = False
+        self.closed = False
+
+    def put(self, frame):
+        """Send or queue one frame; returns False when the client is too far behind to keep.
+
+        `frame` must be bytes the caller will not change: a client that is
+        behind queues a reference to it, not a copy.
+        """
+        if not HAS_DONTWAIT:
+            try:
+                self.conn.sendall(frame)
+            except OSError:
+                return False
+            return True
+        if self.closed:
+            return True
+        if not self.draining:
+            try:
+                sent = self.conn.send(frame, MSG_DONTWAIT)
+            except BlockingIOError:
+                sent = 0
+            except OSError:
+                return False
+            if sent == len(frame):
+                return True
+            if sent:
+                frame = memoryview(frame)[sent:]
+        if not self.queue.put(frame):
+            return False
+        if not self.draining:
+            self.draining = True
+            backlog_pump.add(self)
+        return True
+
+    def close(self):
+        self.closed = True
+
+    def flush(self):
+        """Send what the socket takes without blocking; returns True once the backlog is gone."""
+        if self.closed:
+            return True
+        pending = self.pending
+        if not pending:
+            with send_lock:
+                frames = self.queue.take()
+                if not frames:
+                    self.draining = False
+                    return True
+            pending.extend(memoryview(frame) for frame in frames)
+        try:
+            if HAS_SENDMSG:
+                sent = self.conn.sendmsg(pending, (), MSG_DONTWAIT)
+            else:
+                sent = self.conn.send(pending[0], MSG_DONTWAIT)
+        except BlockingIOError:
+            return False
+        except OSError:
+            evict(self.conn)
+            return True
+        while sent and sent >= pending[0].nbytes:
+            sent -= pending.popleft().nbytes
+        if sent:
+            pending[0] = pending[0][sent:]
+        return False
+
+class BacklogPump:
+    """One thread that drains the queues of every client that fell behind.
+
+    Writers are handed over with add() and watched for writability with a
+    selector until their backlog is sent. remove_clients() calls discard()
+    before a socket is closed, so a later connection reusing its fd can be
+    registered.
+    """
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.incoming = []
+        self.lock = threading.Lock()
+        self.thread = None
+        self._wake_recv, self._wake_send = socket.socketpair()
+        self._wake_recv.setblocking(False)
+        self.selector.register(self._wake_recv, selectors.EVENT_READ)
+
+    def add(self, writer):
+        with self.lock:
+            self.incoming.append(writer)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        try:
+            self._wake_send.send(b'\0', MSG_DONTWAIT)
+        except BlockingIOError:
+            pass
+
+    def discard(self, writer):
+        """Stop watching a writer's socket."""
+        with self.lock:
+            try:
+                self.selector.unregister(writer.conn)
+            except (KeyError, ValueError):
+                pass  # not registered: its backlog was drained or never started
+
+    def _run(self):
+        while True:
+            for key, _ in self.selector.select():
+                if key.fileobj is self._wake_recv:
+                    try:
+                        while self._wake_recv.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    failed = []
+                    with self.lock:
+                        incoming, self.incoming = self.incoming, []
+                        for writer in incoming:
+                            if writer.closed:
+                                continue
+                            try:
+                                self.selector.register(writer.conn, selectors.EVENT_WRITE, writer)
+                            except (KeyError, ValueError, OSError) as e:
+                                failed.append((writer, e))
+                    for writer, error in failed:
+                        # A backlog that can never drain would leave the client waiting forever.
+                        print(f"[!] Dropping a client whose backlog cannot be sent: {error!r}")
+                        evict(writer.conn)
+                    continue
+                if key.data.flush():
+                    self.discard(key.data)
+
+backlog_pump = BacklogPump()
+
+def add_client(conn, queue_size=DEFAULT_QUEUE_SIZE):
+    global clients
+    writer = ClientWriter(conn, queue_size)
+    with clients_lock:
+        writers[conn] = writer
+        clients = clients | {conn}
+        stats['connections'] += 1
+    return writer
+
+def remove_clients(*conns):
+    global clients, binary_clients
+    with clients_lock:
+        clients = clients.difference(conns)
+        binary_clients = binary_clients.difference(conns)
+        for conn in conns:
+            writer = writers.pop(conn, None)
+            if writer:
+                writer.close()
+                backlog_pump.discard(writer)
+
+def evict(conn):
+    """Drop a client; shutting the socket down also ends its reader thread."""
+    remove_clients(conn)
+    try:
+        conn.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+def negotiate(conn, writer, version):
+    """Answer a client's HELLO and remember whether it reads binary envelopes."""
+    global binary_clients
+    version = min(version, MAX_WIRE_VERSION)
+    if version >= WIRE_BINARY:
+        with clients_lock:
+            binary_clients = binary_clients | {conn}
+    with send_lock:
+        writer.put(pack_frame(control_payload(CONTROL_HELLO_ACK, version)))
+
+def broadcast(payload, exclude=None):
+    """Relay one payload to every connected client except `exclude`.
+
+    Each encoding of the message is framed once, as the only copy of the
+    payload, and that bytes object is shared by every recipient's send and
+    queue, so a message costs O(1) copies regardless of room size.
+    `clients` is an immutable snapshot replaced under clients_lock, so
+    iterating it never races with joins and leaves. Frames go to each
+    client's ClientWriter; a client whose queue is full is evicted.
+
+    A binary envelope is re-encoded as Base64 once for clients that never
+    negotiated the binary format, so old and new clients can share a relay.
+    """
+    frame = pack_frame(payload)
+    frames = {True: frame, False: frame}
+    if wire_version(payload) == WIRE_BINARY:
+        legacy = binary_to_base64(payload)
+        frames[False] = pack_frame(legacy)
+    stats['frames_copied'] += 1 if frames[False] is frame else 2
+    binary = binary_clients
+    stats['messages_relayed'] += 1
+    slow = []
+    with send_lock:
+        for client in clients:
+            if client is exclude:
+                continue
+            writer = writers.get(client)
+            if writer is not None and not writer.put(frames[client in binary]):
+                slow.append(client)
+    for client in slow:
+        stats['slow_consumers_evicted'] += 1
+        evict(client)
+
+def handle_client(conn, addr, max_frame_size=DEFAULT_MAX_FRAME_SIZE, queue_size=DEFAULT_QUEUE_SIZE):
     print(f"[+] New connection from {addr}")
-    clients.append(conn)
+    writer = add_client(conn, queue_size)
+    reader = FrameReader(conn, max_frame_size)
 
     while True:
         try:
-            raw_len = recvall(conn, 4)
-            if not raw_len:
+            msg = reader.read_frame()
+            if msg is None:
                 break
-            msg_len = struct.unpack('>I', raw_len)[0]
 
-            msg = recvall(conn, msg_len)
-            if not msg:
-                break
+            control = parse_control(msg)
+            if control is not None:
+                if control[0] == CONTROL_HELLO:
+                    negotiate(conn, writer, control[1])
+                continue
 
-            for client in clients:
-                if client != conn:
-                    try:
-                        client.send(struct.pack('>I', len(msg)) + msg)
-                    except:
-                        clients.remove(client)
+            if limiter and not limiter.allow(conn):
+                stats['rate_limited'] += 1
+                continue
+            broadcast(msg, exclude=conn)
 
+        except FrameTooLarge as e:
+            print(f"[!] Dropping {addr}: {e}")
+            break
         except:
             break
 
     print(f"[-] Connection closed: {addr}")
-    clients.remove(conn)
+    remove_clients(conn)
+    if limiter:
+        limiter.forget(conn)
     conn.close()
 
-def start_server():
+def start_server(host='localhost', port=9999, max_frame_size=DEFAULT_MAX_FRAME_SIZE,
+                 queue_size=DEFAULT_QUEUE_SIZE, rate=None, burst=None):
+    global limiter
+    if rate:
+        limiter = RateLimiter(rate, burst or max(1, int(rate)))
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.bind(('localhost', 9999))
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, port))
     server.listen()
-    print("[*] SecureTalk Server started on port 9999...")
+    print(f"[*] SecureTalk Server started on port {port}...")
 
     while True:
         conn, addr = server.accept()
-        thread = threading.Thread(target=handle_client, args=(conn, addr))
+        thread = threading.Thread(target=handle_client, args=(conn, addr, max_frame_size, queue_size))
         thread.start()
 
+def main():
+    parser = argparse.ArgumentParser(description="SecureTalk terminal relay server")
+    parser.add_argument('--mode', choices=['threaded', 'async'], default='threaded',
+                        help="threaded: one thread per connection, async: single asyncio event loop")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=9999)
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="per-client outbound queue depth; a client that falls this far behind is dropped")
+    parser.add_argument('--max-frame-size', type=int, default=DEFAULT_MAX_FRAME_SIZE,
+                        help="largest accepted frame in bytes; bigger length headers drop the connection")
+    parser.add_argument('--rate', type=float, default=0,
+                        help="messages/s each connection may send (0 = unlimited); excess is dropped")
+    parser.add_argument('--burst', type=int, default=None,
+                        help="token-bucket burst for --rate (default: one second's worth)")
+    args = parser.parse_args()
+
+    if args.mode == 'async':
+        from async_server import start_async_server
+        start_async_server(args.host, args.port, args.queue_size, args.max_frame_size, args.rate, args.burst)
+    else:
+        start_server(args.host, args.port, args.max_frame_size, args.queue_size, args.rate, args.burst)
+
 if __name__ == "__main__":
-    start_server()
+    main()
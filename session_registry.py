@@ -0,0 +1,128 @@
+import sys
+import time
+
+
+class Session:
+    """One connected client.
+
+    The display name is derived from the connection number on demand
+    rather than stored, and `room` is an interned room code shared by
+    every member of that room.
+    """
+
+    __slots__ = ('handle', 'sid', 'number', 'room', 'join_time')
+
+    def __init__(self, handle, sid, number, join_time):
+        self.handle = handle
+        self.sid = sid
+        self.number = number
+        self.room = None
+        self.join_time = join_time
+
+    @property
+    def username(self):
+        return f'User{self.number}'
+
+
+class SessionRegistry:
+    """Connected sessions by sid, and room membership indexed both ways.
+
+    Each session gets a small integer handle, reused after it leaves;
+    a room's members are a set of handles and each session holds its
+    room code, so join, leave and member counts are O(1) and moving a
+    session never scans a room. Rooms exist while they have members.
+    """
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._by_sid = {}
+        self._sessions = []
+        self._free = []
+        self._members = {}
+
+    def __contains__(self, sid):
+        return sid in self._by_sid
+
+    def __len__(self):
+        return len(self._by_sid)
+
+    def __iter__(self):
+        return iter(self._by_sid)
+
+    def get(self, sid):
+        return self._by_sid.get(sid)
+
+    def add(self, sid, number):
+        """Register a new connection; returns its Session."""
+        if sid in self._by_sid:
+            self.remove(sid)
+        handle = self._free.pop() if self._free else len(self._sessions)
+        session = Session(handle, sid, number, self._clock())
+        if handle == len(self._sessions):
+            self._sessions.append(session)
+        else:
+            self._sessions[handle] = session
+        self._by_sid[sid] = session
+        return session
+
+    def remove(self, sid):
+        """Forget a connection, leaving its room; returns the Session or None."""
+        session = self._by_sid.pop(sid, None)
+        if session is None:
+            return None
+        self._leave(session)
+        self._sessions[session.handle] = None
+        self._free.append(session.handle)
+        return session
+
+    def join(self, sid, room_code):
+        """Move a session into `room_code`; returns the room it left, if any."""
+        session = self._by_sid[sid]
+        left = self._leave(session)
+        room_code = sys.intern(room_code)
+        members = self._members.get(room_code)
+        if members is None:
+            members = self._members[room_code] = set()
+        members.add(session.handle)
+        session.room = room_code
+        return left
+
+    def leave(self, sid):
+        """Take a session out of its room; returns that room, or None if it was in none."""
+        session = self._by_sid.get(sid)
+        return self._leave(session) if session is not None else None
+
+    def _leave(self, session):
+        room_code = session.room
+        if room_code is None:
+            return None
+        members = self._members[room_code]
+        members.discard(session.handle)
+        if not members:
+            del self._members[room_code]
+        session.room = None
+        return room_code
+
+    def room_of(self, sid):
+        session = self._by_sid.get(sid)
+        return session.room if session is not None else None
+
+    def count(self, room_code):
+        members = self._members.get(room_code)
+        return len(members) if members else 0
+
+    def members(self, room_code):
+        """Sids of a room's members."""
+        sessions = self._sessions
+        return [sessions[handle].sid for handle in self._members.get(room_code, ())]
+
+    def usernames(self, room_code=None):
+        """Display names of a room's members, or of every session."""
+        if room_code is None:
+            return [session.username for session in self._by_sid.values()]
+        sessions = self._sessions
+        return [sessions[handle].username for handle in self._members.get(room_code, ())]
+
+    def rooms(self):
+        """Codes of the rooms that currently have members."""
+        return self._members.keys()
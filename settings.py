@@ -0,0 +1,71 @@
+import importlib.util
+import os
+
+ENV_FILE = '.env'
+
+
+def load_env_file(path=ENV_FILE):
+    """Load `path` into os.environ with python-dotenv; returns whether it was loaded.
+
+    dotenv is only imported when the file exists, so a deployment that sets
+    its environment directly does not pay for it.
+    """
+    if not os.path.isfile(path):
+        return False
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return False
+    return load_dotenv(path)
+
+
+def module_available(name):
+    """Whether `name` can be imported, without importing it."""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class Settings:
+    """Web server configuration, resolved from the environment once at startup.
+
+    Each attribute is one SECURETALK_* variable (or PORT, GEMINI_API_KEY)
+    with its default; the server reads these instead of os.environ.
+    """
+
+    def __init__(self, environ=None):
+        env = os.environ if environ is None else environ
+        self.port = int(env.get('PORT', 5000))
+        self.log_level = env.get('SECURETALK_LOG_LEVEL', 'INFO')
+        self.log_format = env.get('SECURETALK_LOG_FORMAT', 'text')
+        self.log_plaintext = env.get('SECURETALK_LOG_PLAINTEXT') == '1'
+        self.bus_url = env.get('SECURETALK_BUS')
+        self.key_password = env.get('SECURETALK_KEY_PASSWORD', 'SecureTalkDemo2024')
+        self.key_ttl = float(env.get('SECURETALK_KEY_TTL', 3600))
+        self.metrics_enabled = env.get('SECURETALK_METRICS', '1') != '0'
+        self.history_depth = int(env.get('SECURETALK_HISTORY_DEPTH', 50))
+        self.history_max_bytes = int(env.get('SECURETALK_HISTORY_MAX_BYTES', 256 * 1024))
+        self.e2e_max_ciphertext = int(env.get('SECURETALK_E2E_MAX_CIPHERTEXT', 64 * 1024))
+        self.rooms_max_age = float(env.get('SECURETALK_ROOMS_MAX_AGE', 1.0))
+        self.log_dir = env.get('SECURETALK_LOG_DIR')
+        self.log_fsync_interval = float(env.get('SECURETALK_LOG_FSYNC_INTERVAL', 0.05))
+        self.room_stats_interval = float(env.get('SECURETALK_ROOM_STATS_INTERVAL', 1.0))
+        self.stats_interval = float(env.get('SECURETALK_STATS_INTERVAL', 2.0))
+        self.gemini_api_key = env.get('GEMINI_API_KEY', '')
+        self.smart_reply_provider = env.get('SECURETALK_SMART_REPLY_PROVIDER')
+        self.stub_latency = float(env.get('SECURETALK_STUB_LATENCY', 0))
+        self.local_replies = env.get('SECURETALK_LOCAL_REPLIES', 'first')
+        self.smart_reply_workers = int(env.get('SECURETALK_SMART_REPLY_WORKERS', 4))
+        self.smart_reply_timeout = float(env.get('SECURETALK_SMART_REPLY_TIMEOUT', 5.0))
+        self.send_rate = float(env.get('SECURETALK_SEND_RATE', 0))
+        self.send_burst = float(env.get('SECURETALK_SEND_BURST', 10))
+        self.room_rate = float(env.get('SECURETALK_ROOM_RATE', 50))
+        self.room_burst = float(env.get('SECURETALK_ROOM_BURST', 100))
+        self.queue_high = int(env.get('SECURETALK_QUEUE_HIGH', 192))
+        self.queue_low = int(env.get('SECURETALK_QUEUE_LOW', 64))
+        self.queue_limit = int(env.get('SECURETALK_QUEUE_LIMIT', 256))
+        self.consumer_check_interval = float(env.get('SECURETALK_CONSUMER_CHECK_INTERVAL', 1.0))
+        self.batch_window_ms = float(env.get('SECURETALK_BATCH_WINDOW_MS', 0))
+        self.batch_max = int(env.get('SECURETALK_BATCH_MAX', 32))
+        self.typing_tick = float(env.get('SECURETALK_TYPING_TICK', 0.25))
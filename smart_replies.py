@@ -0,0 +1,290 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from metrics import Histogram
+
+DEFAULT_MAX_SUGGESTIONS = 3
+
+PROMPT = """You are a helpful chat assistant. Given the following message, generate {max_suggestions} short, natural, and contextually appropriate reply suggestions. Each reply should be casual, friendly, and conversational.
+
+Message: "{message}"
+
+Requirements:
+- Keep replies SHORT (max 8-10 words each)
+- Make them sound natural and human-like
+- Match the tone and context of the message
+- Be relevant and helpful
+- Use emojis sparingly when appropriate
+- Provide diverse response options (e.g., one agreeing, one questioning, one supportive)
+
+Return ONLY the {max_suggestions} reply suggestions, one per line, without numbering or bullet points."""
+
+
+def normalize(message):
+    """Cache key for a message: lowercased, whitespace collapsed, trailing punctuation dropped."""
+    return re.sub(r'\s+', ' ', message.lower()).strip().rstrip('.!?,;: ')
+
+
+class ReplyProvider:
+    """Source of smart-reply suggestions; suggest() may block and may raise."""
+
+    name = 'provider'
+
+    def suggest(self, message, max_suggestions=DEFAULT_MAX_SUGGESTIONS):
+        raise NotImplementedError
+
+
+class GeminiProvider(ReplyProvider):
+    """Suggestions from a google.generativeai GenerativeModel.
+
+    google.generativeai is a large import, so it is loaded and configured
+    on the first suggest() or an explicit load() rather than at startup.
+    """
+
+    name = 'gemini'
+
+    def __init__(self, api_key, model_name='gemini-2.0-flash'):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Import and configure the Gemini client if that has not happened yet; returns the model."""
+        with self._lock:
+            if self.model is None:
+                import google.generativeai as genai
+                # The REST transport goes through the (patched) socket module; gRPC would block the hub.
+                genai.configure(api_key=self.api_key, transport='rest')
+                self.model = genai.GenerativeModel(self.model_name)
+        return self.model
+
+    def suggest(self, message, max_suggestions=DEFAULT_MAX_SUGGESTIONS):
+        response = (self.model or self.load()).generate_content(PROMPT.format(message=message, max_suggestions=max_suggestions))
+        if not response or not response.text:
+            return []
+        suggestions = []
+        for line in response.text.strip().split('\n'):
+            line = line.strip()
+            if not line or line.startswith(('*', '-', '1.', '2.', '3.')):
+                continue
+            line = re.sub(r'^\d+[\.)]\s*', '', line)
+            line = re.sub(r'^[-*•]\s*', '', line)
+            if line:
+                suggestions.append(line)
+        return suggestions[:max_suggestions]
+
+
+class StubProvider(ReplyProvider):
+    """Canned replies after a fixed delay; stands in for Gemini in tests and benchmarks."""
+
+    name = 'stub'
+    REPLIES = ['Sounds good!', 'Tell me more?', 'Thanks for sharing 🙂', 'Got it.', 'Interesting!']
+
+    def __init__(self, latency=0.0, fail=False):
+        self.latency = latency
+        self.fail = fail
+        self.calls = 0
+
+    def suggest(self, message, max_suggestions=DEFAULT_MAX_SUGGESTIONS):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError("stub provider failure")
+        start = len(message) % len(self.REPLIES)
+        return [self.REPLIES[(start + i) % len(self.REPLIES)] for i in range(max_suggestions)]
+
+
+class ReplyCache:
+    """LRU of at most `max_entries` suggestion lists, each valid for `ttl` seconds."""
+
+    def __init__(self, max_entries=1024, ttl=600.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, suggestions = entry
+            if expires <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return suggestions
+
+    def put(self, key, suggestions):
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, suggestions)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CircuitBreaker:
+    """Stops calling a failing provider for `reset_timeout` seconds.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    allow() refuses calls; once the timeout passes it lets one trial call
+    through (half-open), which closes it again on success.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return self.state == self.CLOSED
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = self._clock()
+
+
+class SmartReplyService:
+    """Cached, coalesced and time-bounded access to a ReplyProvider.
+
+    Requests are keyed on normalize(message). A cache hit returns at once;
+    identical requests already in flight share one provider call; new
+    calls run on a pool of `workers` threads with at most `max_pending`
+    outstanding, and callers stop waiting after `timeout` seconds. A call
+    that fails or outlives the timeout counts against the circuit breaker.
+
+    An optional `local` engine (see local_replies.py) answers on the
+    calling thread: with `local_first` it serves every message it
+    recognizes before the provider is consulted, and it always stands in
+    when there is no provider or the provider gives no answer. suggest()
+    returns None only when neither could produce suggestions.
+    """
+
+    def __init__(self, provider, max_suggestions=DEFAULT_MAX_SUGGESTIONS, workers=4, max_pending=32,
+                 timeout=5.0, cache=None, breaker=None, local=None, local_first=True, clock=time.monotonic):
+        self.provider = provider
+        self.local = local
+        self.local_first = local_first
+        self.max_suggestions = max_suggestions
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.cache = cache or ReplyCache(clock=clock)
+        self.breaker = breaker or CircuitBreaker(clock=clock)
+        self.latency = Histogram()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix='smart-reply')
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'local': 0, 'hits': 0, 'misses': 0, 'coalesced': 0, 'timeouts': 0,
+                      'errors': 0, 'rejected': 0, 'fallbacks': 0}
+
+    def _call(self, key, message):
+        # A call that outlives the timeout is counted as a failure by the caller that
+        # gave up on it, while the provider may still hang, so it is not counted again here.
+        start = time.perf_counter()
+        try:
+            suggestions = self.provider.suggest(message, self.max_suggestions)
+        except Exception:
+            if time.perf_counter() - start <= self.timeout:
+                self.breaker.record_failure()
+            raise
+        if time.perf_counter() - start <= self.timeout:
+            self.breaker.record_success()
+        self.cache.put(key, suggestions)
+        return suggestions
+
+    def _finished(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def suggest(self, message):
+        start = time.perf_counter()
+        try:
+            return self._suggest(message)
+        finally:
+            self.latency.observe(time.perf_counter() - start)
+
+    def _fallback(self, message):
+        if self.local is None:
+            return None
+        self.stats['fallbacks'] += 1
+        return self.local.suggest(message, self.max_suggestions)
+
+    def _suggest(self, message):
+        self.stats['requests'] += 1
+        key = normalize(message)
+        if not key:
+            return []
+        if self.local is not None and self.local_first:
+            suggestions = self.local.match(message, self.max_suggestions)
+            if suggestions is not None:
+                self.stats['local'] += 1
+                return suggestions
+        if self.provider is None:
+            return self._fallback(message)
+        suggestions = self.cache.get(key)
+        if suggestions is not None:
+            self.stats['hits'] += 1
+            return suggestions
+        self.stats['misses'] += 1
+
+        with self._lock:
+            future = self._inflight.get(key)
+            submitted = future is None
+            if not submitted:
+                self.stats['coalesced'] += 1
+            elif len(self._inflight) >= self.max_pending or not self.breaker.allow():
+                self.stats['rejected'] += 1
+                return self._fallback(message)
+            else:
+                future = self._inflight[key] = self._pool.submit(self._call, key, message)
+        if submitted:
+            # Registered outside the lock: it runs right here if the call already finished.
+            future.add_done_callback(lambda f: self._finished(key, f))
+        suggestions = None
+        try:
+            suggestions = future.result(self.timeout)
+        except FutureTimeout:
+            self.stats['timeouts'] += 1
+            if submitted:
+                self.breaker.record_failure()
+        except Exception:
+            self.stats['errors'] += 1
+        return suggestions or self._fallback(message)
+
+    def report(self):
+        """Share of requests answered without a provider call, and latency percentiles in milliseconds."""
+        requests = self.stats['requests']
+        answered = self.stats['hits'] + self.stats['local']
+        return dict(self.stats, hit_rate=answered / requests if requests else 0.0,
+                    breaker=self.breaker.state,
+                    p50_ms=self.latency.quantile(0.5) * 1e3, p99_ms=self.latency.quantile(0.99) * 1e3)
+
+    def close(self):
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,86 @@
+"""Where a server's startup time goes: per-module import times and initialization phases.
+
+Usage:
+    python web_chat_server.py --profile-startup [--top 25]
+
+Imports the module in a fresh interpreter under `python -X importtime`
+and reports the slowest imports, cumulative and self, in ms. Modules that
+time their own initialization with StartupTimer also report each phase.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+PHASE_PREFIX = 'startup phase: '
+PHASES_ENV = 'SECURETALK_STARTUP_PHASES'
+
+
+class StartupTimer:
+    """Wall time of named initialization phases, written to stderr for --profile-startup.
+
+    mark(name) closes the phase that began at the previous mark (or at
+    construction). Nothing is printed unless $SECURETALK_STARTUP_PHASES is 1.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.enabled = os.environ.get(PHASES_ENV) == '1'
+        self._clock = clock
+        self._last = clock()
+        self.phases = []
+
+    def mark(self, name):
+        now = self._clock()
+        self.phases.append((name, now - self._last))
+        if self.enabled:
+            print(f'{PHASE_PREFIX}{name} {(now - self._last) * 1e6:.0f}', file=sys.stderr)
+        self._last = now
+
+
+def profile(module, cwd=None):
+    """Import `module` in a child interpreter; returns (imports, phases, wall seconds).
+
+    imports is a list of (cumulative us, self us, depth, name) and phases a
+    list of (name, us), both in the order the child reported them.
+    """
+    env = dict(os.environ, **{PHASES_ENV: '1'})
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=cwd, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+    imports, phases = [], []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            imports.append((int(cumulative), int(own), len(indent) // 2, name))
+        elif line.startswith(PHASE_PREFIX):
+            name, micros = line[len(PHASE_PREFIX):].rsplit(' ', 1)
+            phases.append((name, int(micros)))
+    return imports, phases, wall
+
+
+def main(module, argv=None):
+    parser = argparse.ArgumentParser(description=f"Report where {module} spends its startup time")
+    parser.add_argument('--profile-startup', action='store_true')
+    parser.add_argument('--top', type=int, default=25, help="how many of the slowest imports to list")
+    args, _ = parser.parse_known_args(argv)
+
+    imports, phases, wall = profile(module, cwd=os.path.dirname(os.path.abspath(sys.argv[0])) or None)
+    print(f"{module}: {wall * 1e3:.0f} ms to start an interpreter and import it")
+    print(f"\nslowest imports by cumulative time\n{'cumulative ms':>14}{'self ms':>10}  module")
+    for cumulative, own, depth, name in sorted(imports, reverse=True)[:args.top]:
+        print(f"{cumulative / 1e3:>14.1f}{own / 1e3:>10.1f}  {'  ' * depth}{name}")
+    print(f"\nslowest imports by self time\n{'self ms':>14}  module")
+    for cumulative, own, depth, name in sorted(imports, key=lambda item: -item[1])[:args.top]:
+        print(f"{own / 1e3:>14.1f}  {name}")
+    if phases:
+        print(f"\n{module} initialization\n{'ms':>14}  phase")
+        for name, micros in phases:
+            print(f"{micros / 1e3:>14.1f}  {name}")
+    return 0
@@ -1,14 +1,26 @@
 class SecureTalkClient {
     constructor() {
-        this.socket = io();
+        this.socket = io({ transports: socketTransports });
         this.username = 'Connecting...';
         this.isTyping = false;
         this.typingTimeout = null;
+        this.lastTypingEmit = 0;
+        this.typingBySource = {};
         this.sharedKey = null;
         this.currentRoom = roomCode || 'default';
         this.currentRoomName = roomName || 'General Chat';
         this.hasJoinedRoom = false;
         this.historyLoaded = false;
+        // Per-room message numbering: the epoch names it, lastSeq is the newest message seen
+        // with nothing missing before it, and pendingSeqs holds numbers that arrived early.
+        this.epoch = null;
+        this.lastSeq = null;
+        this.pendingSeqs = new Set();
+        this.gapTimer = null;
+        // End-to-end mode: a passphrase in the URL fragment (#key=...) never reaches the server.
+        this.e2ePassphrase = new URLSearchParams(window.location.hash.slice(1)).get('key');
+        this.e2eKey = this.e2ePassphrase ? this.deriveE2EKey(this.e2ePassphrase) : null;
+        this.inbound = Promise.resolve();
         
         this.initializeElements();
         this.setupEventListeners();
@@ -93,10 +105,7 @@ class SecureTalkClient {
             this.hasJoinedRoom = true;
         });
         
-        this.socket.on('room_stats', (data) => {
-            const count = data.user_count;
-            this.userCountDisplay.textContent = `${count} user${count !== 1 ? 's' : ''} in room`;
-        });
+        this.socket.on('room_stats', (data) => this.updateRoomStats(data));
         
         this.socket.on('user_count', (data) => {
             const count = data.count;
@@ -104,36 +113,46 @@ class SecureTalkClient {
         });
         
         this.socket.on('message_history', (data) => {
-            console.log('Received message history:', data.messages.length, 'messages');
-            this.loadMessageHistory(data.messages);
+            console.log('Received message history:', data.sync || 'full', data.messages.length, 'messages');
+            this.applyHistory(data);
         });
         
         this.socket.on('receive_message', (data) => {
-            this.receiveMessage(data);
-            try {
-                const sender = data.username || '';
-                if (sender && sender !== this.username) {
-                    const messageText = data.message || data.encrypted_message || '';
-                    if (messageText && messageText.trim()) {
-                        this.fetchSmartReplies(messageText);
-                    }
-                }
-            } catch (e) {
-            }
+            if (data.room_stats) this.updateRoomStats(data.room_stats);
+            if (this.trackSeq(data.seq)) this.handleIncoming(data, true);
+        });
+        
+        this.socket.on('receive_batch', (messages) => {
+            // Batched messages arrive in send order; our own were already shown via message_sent.
+            messages.forEach(data => {
+                if (data.room_stats) this.updateRoomStats(data.room_stats);
+            });
+            const others = messages.filter(data => this.trackSeq(data.seq) && data.username !== this.username);
+            others.forEach((data, i) => this.handleIncoming(data, i === others.length - 1));
         });
         
         this.socket.on('message_sent', (data) => {
-            this.addSentMessage(data.message, data.timestamp);
+            if (data.room_stats) this.updateRoomStats(data.room_stats);
+            this.trackSeq(data.seq);
+            this.enqueueInbound(async () => {
+                this.addSentMessage(await this.messageText(data), data.timestamp);
+            });
         });
         
-        this.socket.on('user_typing', (data) => {
-            this.showTypingIndicator(data.username, data.is_typing);
+        this.socket.on('typing_users', (data) => {
+            if (data.room && data.room !== this.currentRoom) return;
+            this.typingBySource[data.source] = data.users;
+            this.showTypingIndicator();
         });
         
         this.socket.on('error', (data) => {
             this.showToast(`Error: ${data.message}`, 'error');
         });
         
+        this.socket.on('rate_limited', (data) => {
+            this.showToast(`${data.message} - message not sent`, 'error');
+        });
+        
         this.socket.on('room_error', (data) => {
             this.showToast(`Room Error: ${data.error}`, 'error');
             console.error('Room error:', data);
@@ -152,27 +171,85 @@ class SecureTalkClient {
         
         this.historyLoaded = false;
         
+        // After a reconnect, ask only for what arrived while we were away.
+        const resume = this.lastSeq !== null ? { since_seq: this.lastSeq + 1, epoch: this.epoch } : {};
         this.socket.emit('join_room', {
             room: this.currentRoom,
-            room_name: this.currentRoomName
+            room_name: this.currentRoomName,
+            ...resume
         });
         console.log(`Joining room: ${this.currentRoom} (${this.currentRoomName})`);
     }
     
-    loadMessageHistory(messages) {
+    trackSeq(seq) {
+        // Returns false for a message already shown. A number past the next expected one
+        // means something is missing; unless it turns up shortly, ask the server for it.
+        if (typeof seq !== 'number' || this.lastSeq === null) return true;
+        if (seq <= this.lastSeq || this.pendingSeqs.has(seq)) return false;
+        if (seq === this.lastSeq + 1) {
+            this.lastSeq = seq;
+            while (this.pendingSeqs.delete(this.lastSeq + 1)) this.lastSeq++;
+        } else {
+            this.pendingSeqs.add(seq);
+        }
+        if (this.pendingSeqs.size && !this.gapTimer) {
+            this.gapTimer = setTimeout(() => {
+                this.gapTimer = null;
+                if (this.pendingSeqs.size) {
+                    this.socket.emit('sync_history', { since_seq: this.lastSeq + 1, epoch: this.epoch });
+                }
+            }, 1000);
+        }
+        return true;
+    }
+    
+    applyHistory(data) {
+        const resuming = this.lastSeq !== null;
+        const sameEpoch = resuming && data.epoch === this.epoch;
+        const messages = sameEpoch
+            ? data.messages.filter(msgData => msgData.seq > this.lastSeq && !this.pendingSeqs.has(msgData.seq))
+            : data.messages;
+        this.epoch = data.epoch === undefined ? null : data.epoch;
+        this.lastSeq = this.epoch !== null ? data.next_seq - 1 : null;
+        this.pendingSeqs.clear();
+        
+        if (!resuming) {
+            this.enqueueInbound(() => this.loadMessageHistory(messages));
+            return;
+        }
+        this.historyLoaded = true;
+        this.enqueueInbound(async () => {
+            if (data.sync === 'gap') {
+                this.addSystemMessage(`${data.missed} earlier message${data.missed !== 1 ? 's are' : ' is'} no longer available`);
+            } else if (!sameEpoch) {
+                this.addSystemMessage('The room was restarted; showing its current history');
+            }
+            const texts = await Promise.all(messages.map(msgData => this.messageText(msgData)));
+            messages.forEach((msgData, i) => {
+                if (msgData.username === this.username) {
+                    this.addSentMessage(texts[i], msgData.timestamp);
+                } else {
+                    this.addReceivedMessage(msgData.username, texts[i], msgData.timestamp);
+                }
+            });
+        });
+    }
+    
+    async loadMessageHistory(messages) {
         if (this.historyLoaded || this.chatMessages.querySelector('.history-indicator')) {
             console.log('History already loaded, skipping...');
             return;
         }
         
         this.historyLoaded = true;
-        
-        const welcomeMessage = this.chatMessages.querySelector('.welcome-message');
-        if (welcomeMessage) {
-            welcomeMessage.style.display = 'none';
-        }
+        const texts = await Promise.all(messages.map(msgData => this.messageText(msgData)));
         
         if (messages.length > 0) {
+            const welcomeMessage = this.chatMessages.querySelector('.welcome-message');
+            if (welcomeMessage) {
+                welcomeMessage.style.display = 'none';
+            }
+            
             const historyIndicator = document.createElement('div');
             historyIndicator.className = 'history-indicator';
             historyIndicator.innerHTML = `
@@ -183,28 +260,35 @@ class SecureTalkClient {
             this.chatMessages.appendChild(historyIndicator);
         }
         
-        messages.forEach(msgData => {
+        messages.forEach((msgData, i) => {
             if (msgData.username === this.username) {
-                this.addSentMessage(msgData.message, msgData.timestamp, true);
+                this.addSentMessage(texts[i], msgData.timestamp, true);
             } else {
-                this.addReceivedMessage(msgData.username, msgData.message, msgData.timestamp, true);
+                this.addReceivedMessage(msgData.username, texts[i], msgData.timestamp, true);
             }
         });
         
         this.scrollToBottom();
     }
     
-    sendMessage() {
+    async sendMessage() {
         const message = this.messageInput.value.trim();
         if (!message) return;
         
         this.messageInput.value = '';
         this.stopTyping();
         
-        this.socket.emit('send_message', {
-            message: message,
-            timestamp: new Date().toLocaleTimeString()
-        });
+        const timestamp = new Date().toLocaleTimeString();
+        if (this.e2eKey) {
+            try {
+                this.socket.emit('send_message', { ciphertext: await this.encryptE2E(message), timestamp });
+            } catch (error) {
+                console.error('End-to-end encryption failed:', error);
+                this.showToast('Could not encrypt message', 'error');
+            }
+        } else {
+            this.socket.emit('send_message', { message, timestamp });
+        }
         
         this.sendButton.disabled = true;
         setTimeout(() => {
@@ -213,15 +297,76 @@ class SecureTalkClient {
         }, 500);
     }
     
-    receiveMessage(data) {
+    async receiveMessage(data) {
         try {
             console.log('Received message data:', data);
             
-            const message = data.message || data.encrypted_message || '[No message content]';
+            const message = await this.messageText(data);
             this.addReceivedMessage(data.username, message, data.timestamp);
+            return message;
         } catch (error) {
             console.error('Failed to process message:', error);
             this.addReceivedMessage(data.username, '[Message processing failed]', data.timestamp);
+            return '';
+        }
+    }
+
+    handleIncoming(data, suggest) {
+        this.enqueueInbound(async () => {
+            const messageText = await this.receiveMessage(data);
+            // Smart replies would send the plaintext to the server, so E2E rooms go without.
+            const sender = data.username || '';
+            if (suggest && !data.ciphertext && sender && sender !== this.username && messageText && messageText.trim()) {
+                this.fetchSmartReplies(messageText);
+            }
+        });
+    }
+
+    enqueueInbound(handler) {
+        // Decryption is asynchronous; chaining keeps messages in arrival order.
+        this.inbound = this.inbound.then(handler).catch(error => console.error('Inbound handler failed:', error));
+    }
+
+    async deriveE2EKey(passphrase) {
+        const encoder = new TextEncoder();
+        const material = await crypto.subtle.importKey('raw', encoder.encode(passphrase), 'PBKDF2', false, ['deriveKey']);
+        return crypto.subtle.deriveKey(
+            { name: 'PBKDF2', salt: encoder.encode(`SecureTalk e2e ${this.currentRoom}`), iterations: 100000, hash: 'SHA-256' },
+            material,
+            { name: 'AES-GCM', length: 256 },
+            false,
+            ['encrypt', 'decrypt']
+        );
+    }
+
+    async encryptE2E(text) {
+        const iv = crypto.getRandomValues(new Uint8Array(12));
+        const sealed = new Uint8Array(await crypto.subtle.encrypt(
+            { name: 'AES-GCM', iv }, await this.e2eKey, new TextEncoder().encode(text)
+        ));
+        const packet = new Uint8Array(iv.length + sealed.length);
+        packet.set(iv);
+        packet.set(sealed, iv.length);
+        let binary = '';
+        packet.forEach(byte => { binary += String.fromCharCode(byte); });
+        return btoa(binary);
+    }
+
+    async messageText(data) {
+        if (!data.ciphertext) {
+            return data.message || data.encrypted_message || '[No message content]';
+        }
+        if (!this.e2eKey) {
+            return '[End-to-end encrypted message]';
+        }
+        try {
+            const packet = Uint8Array.from(atob(data.ciphertext), c => c.charCodeAt(0));
+            const plain = await crypto.subtle.decrypt(
+                { name: 'AES-GCM', iv: packet.subarray(0, 12) }, await this.e2eKey, packet.subarray(12)
+            );
+            return new TextDecoder().decode(plain);
+        } catch (error) {
+            return '[Could not decrypt message]';
         }
     }
 
@@ -344,8 +489,11 @@ class SecureTalkClient {
     }
     
     handleTyping() {
-        if (!this.isTyping) {
+        // The server drops typers it has not heard from for 3 s, so refresh while typing continues.
+        const now = Date.now();
+        if (!this.isTyping || now - this.lastTypingEmit > 1500) {
             this.isTyping = true;
+            this.lastTypingEmit = now;
             this.socket.emit('typing', { is_typing: true });
         }
         
@@ -370,11 +518,24 @@ class SecureTalkClient {
         }
     }
     
-    showTypingIndicator(username, isTyping) {
+    updateRoomStats(data) {
+        const count = data.user_count;
+        this.userCountDisplay.textContent = `${count} user${count !== 1 ? 's' : ''} in room`;
+    }
+    
+    showTypingIndicator() {
         const typingText = this.typingIndicator.querySelector('.typing-text');
-        
-        if (isTyping) {
-            typingText.textContent = `${username} is typing...`;
+        const typers = [...new Set(Object.values(this.typingBySource).flat())]
+            .filter(name => name !== this.username);
+        
+        if (typers.length) {
+            if (typers.length === 1) {
+                typingText.textContent = `${typers[0]} is typing...`;
+            } else if (typers.length === 2) {
+                typingText.textContent = `${typers[0]} and ${typers[1]} are typing...`;
+            } else {
+                typingText.textContent = `${typers.length} people are typing...`;
+            }
             this.typingIndicator.style.display = 'flex';
             this.scrollToBottom();
         } else {
@@ -0,0 +1,175 @@
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+
+TEXT = 'text'
+JSON = 'json'
+
+
+def log_event(logger, level, event, **fields):
+    """Log `event` with structured fields, doing nothing when `level` is disabled.
+
+    A field given as a zero-argument callable is only called once the level
+    check has passed, so expensive debug payloads cost nothing in production.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    for name, value in fields.items():
+        if callable(value):
+            fields[name] = value()
+    logger.log(level, event, extra={'fields': fields})
+
+
+class StructuredFormatter(logging.Formatter):
+    """One line per record: JSON objects, or `[LEVEL] event key=value ...` text."""
+
+    def __init__(self, style=TEXT):
+        super().__init__()
+        self.style = style
+
+    def format(self, record):
+        fields = getattr(record, 'fields', {})
+        if self.style == JSON:
+            entry = {'ts': round(record.created, 3), 'level': record.levelname,
+                     'logger': record.name, 'event': record.getMessage()}
+            entry.update(fields)
+            if record.exc_text:
+                entry['exc'] = record.exc_text
+            return json.dumps(entry, default=str)
+        line = f"[{record.levelname}] {record.getMessage()}"
+        if fields:
+            line += ' ' + ' '.join(f'{name}={value}' for name, value in fields.items())
+        if record.exc_text:
+            line += '\n' + record.exc_text
+        return line
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records with their message merged but the event text and fields kept apart.
+
+    The stock QueueHandler formats the whole record, traceback included,
+    into `msg` before enqueueing, which would fold tracebacks into the
+    JSON `event`; here the traceback travels separately in `exc_text`.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per (logger, event): at most `rate` records/s with bursts of `burst`.
+
+    Dropped records are counted and the next record let through for the
+    same event carries the count in a `suppressed` field.
+    """
+
+    def __init__(self, rate=50.0, burst=100, clock=time.monotonic):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._buckets = {}
+        self.dropped = 0
+
+    def filter(self, record):
+        key = (record.name, record.msg)
+        now = self._clock()
+        tokens, last, suppressed = self._buckets.get(key, (self.burst, now, 0))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now, suppressed + 1)
+            self.dropped += 1
+            return False
+        if suppressed:
+            record.fields = dict(getattr(record, 'fields', {}), suppressed=suppressed)
+        self._buckets[key] = (tokens - 1, now, 0)
+        return True
+
+
+class BatchingStreamHandler(logging.StreamHandler):
+    """Buffers formatted lines and writes them to the stream in one call.
+
+    The buffer is written once it holds `batch_size` lines or when
+    flush() is called; BatchingQueueListener flushes whenever its queue
+    runs dry for `flush_interval`.
+    """
+
+    def __init__(self, stream=None, batch_size=256):
+        super().__init__(stream or sys.stdout)
+        self.batch_size = batch_size
+        self._lines = []
+
+    def emit(self, record):
+        try:
+            self._lines.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self._lines) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self._lines:
+                self.stream.write('\n'.join(self._lines) + '\n')
+                self._lines = []
+            if hasattr(self.stream, 'flush'):
+                self.stream.flush()
+        finally:
+            self.release()
+
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """QueueListener that flushes its handlers whenever the queue stays empty for `flush_interval`."""
+
+    def __init__(self, log_queue, *handlers, flush_interval=0.2):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.flush_interval = flush_interval
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block, self.flush_interval)
+            except queue.Empty:
+                for handler in self.handlers:
+                    handler.flush()
+
+    def stop(self):
+        super().stop()
+        for handler in self.handlers:
+            handler.flush()
+
+
+def setup_logging(name='securetalk', level='INFO', style=TEXT, stream=None, rate=50.0, burst=100,
+                  batch_size=256, flush_interval=0.2):
+    """Route `name` and its children through a queue to a background writer thread.
+
+    The calling thread only enqueues the record; the listener thread
+    formats, batches and writes. A queue.Queue rather than SimpleQueue
+    keeps the listener cooperative when eventlet patches threading.
+    Returns the started listener; call stop() on it to drain the queue.
+    """
+    log_queue = queue.Queue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(rate, burst))
+    logger = logging.getLogger(name)
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    logger.handlers[:] = [queue_handler]
+    logger.propagate = False
+
+    writer = BatchingStreamHandler(stream, batch_size)
+    writer.setFormatter(StructuredFormatter(style))
+    listener = BatchingQueueListener(log_queue, writer, flush_interval=flush_interval)
+    listener.start()
+    return listener
@@ -0,0 +1,122 @@
+import json
+
+from message_history import PacketRecord, RoomHistory, sync_reply
+from wire_json import RawJSON
+
+EPOCH = 'test'
+
+
+def record(seq):
+    return PacketRecord('alice', '12:00:00', RawJSON.encode({'seq': seq}), seq)
+
+
+def filled_history(count, depth=10):
+    history = RoomHistory(depth, epoch=EPOCH)
+    for seq in range(count):
+        history.append(record(seq))
+    return history
+
+
+def seqs(records):
+    return [r.seq for r in records]
+
+
+def sent_seqs(reply):
+    return [json.loads(packet.text)['seq'] for packet in reply['messages']]
+
+
+def test_since_exact_match():
+    history = filled_history(8)
+    assert seqs(history.since(5)) == [5, 6, 7]
+    assert seqs(history.since(0)) == list(range(8))
+    assert history.since(8) == []
+
+
+def test_since_evicted():
+    history = filled_history(25)
+    assert history.first_seq == 15
+    assert history.since(14) is None
+    assert seqs(history.since(15)) == list(range(15, 25))
+
+
+def test_since_ahead_of_next_seq():
+    history = filled_history(5)
+    assert history.since(6) is None
+
+
+def test_since_seq_mismatch():
+    # A gap in the numbering: the record where since_seq should be holds another seq.
+    history = RoomHistory(10, epoch=EPOCH)
+    for seq in (0, 1, 2, 5, 6):
+        history.append(record(seq))
+    assert history.next_seq == 7
+    assert history.since(3) is None
+    assert seqs(history.since(5)) == [5, 6]
+
+
+def test_reply_delta():
+    reply = sync_reply(filled_history(8), {'epoch': EPOCH, 'since_seq': 6})
+    assert {k: v for k, v in reply.items() if k != 'messages'} == {'epoch': EPOCH, 'next_seq': 8, 'sync': 'delta'}
+    assert sent_seqs(reply) == [6, 7]
+
+
+def test_reply_delta_without_epoch():
+    reply = sync_reply(filled_history(8), {'since_seq': '6'})
+    assert reply['sync'] == 'delta'
+    assert sent_seqs(reply) == [6, 7]
+
+
+def test_reply_gap():
+    reply = sync_reply(filled_history(25), {'epoch': EPOCH, 'since_seq': 12})
+    assert reply['sync'] == 'gap'
+    assert reply['missed'] == 3
+    assert sent_seqs(reply) == list(range(15, 25))
+
+
+def test_reply_delta_from_log():
+    calls = []
+
+    def read_log(since_seq):
+        calls.append(since_seq)
+        return [record(seq) for seq in range(since_seq, 25)]
+
+    reply = sync_reply(filled_history(25), {'epoch': EPOCH, 'since_seq': 12}, read_log)
+    assert calls == [12]
+    assert reply['sync'] == 'delta'
+    assert sent_seqs(reply) == list(range(12, 25))
+
+
+def test_reply_gap_when_log_cannot_help():
+    reply = sync_reply(filled_history(25), {'epoch': EPOCH, 'since_seq': 12}, lambda since_seq: None)
+    assert reply['sync'] == 'gap'
+    assert reply['missed'] == 3
+
+
+def test_reply_does_not_read_log_for_held_records():
+    def read_log(since_seq):
+        raise AssertionError("the history holds these records")
+
+    assert sync_reply(filled_history(25), {'epoch': EPOCH, 'since_seq': 20}, read_log)['sync'] == 'delta'
+
+
+def test_reply_full():
+    history = filled_history(8)
+    for data in ({}, {'epoch': 'other', 'since_seq': 6}, {'epoch': EPOCH, 'since_seq': 9},
+                 {'epoch': EPOCH, 'since_seq': -1}, {'epoch': EPOCH, 'since_seq': 'abc'}):
+        reply = sync_reply(history, data)
+        assert reply['sync'] == 'full', data
+        assert reply['total'] == 8
+        assert sent_seqs(reply) == list(range(8))
+
+
+def test_reply_full_paged():
+    reply = sync_reply(filled_history(8), {'history_limit': 3, 'history_offset': 2})
+    assert sent_seqs(reply) == [3, 4, 5]
+
+
+def test_reply_full_for_unsequenced_room():
+    history = RoomHistory(10)
+    history.append(PacketRecord('alice', '12:00:00', RawJSON.encode({'seq': None})))
+    reply = sync_reply(history, {'since_seq': 0})
+    assert reply['sync'] == 'full'
+    assert reply['epoch'] is None
@@ -0,0 +1,98 @@
+import os
+
+from message_log import MessageLog
+
+ROOM = 'ROOM1'
+PAYLOAD_SIZE = 64
+
+
+def payload(i):
+    return i.to_bytes(4, 'big') * (PAYLOAD_SIZE // 4)
+
+
+def open_log(directory, **kwargs):
+    return MessageLog(str(directory), **kwargs)
+
+
+def write_messages(directory, count, **kwargs):
+    log = open_log(directory, **kwargs)
+    for i in range(count):
+        assert log.append(ROOM, f'user{i}', payload(i), timestamp=1000.0 + i) == i
+    log.close()
+
+
+def segments(directory):
+    return sorted(name for name in os.listdir(directory / ROOM) if name.endswith('.log'))
+
+
+def assert_records(records, first, count):
+    assert [record.seq for record in records] == list(range(first, first + count))
+    assert [record.payload for record in records] == [payload(i) for i in range(first, first + count)]
+    assert [record.username for record in records] == [f'user{i}' for i in range(first, first + count)]
+
+
+def test_next_seq_continues_after_restart(tmp_path):
+    write_messages(tmp_path, 10)
+    log = open_log(tmp_path)
+    try:
+        assert log.next_seq(ROOM) == 10
+        assert log.next_seq('NOROOM') == 0
+        assert log.append(ROOM, 'user10', payload(10)) == 10
+        assert_records(log.read_since(ROOM, 0), 0, 11)
+    finally:
+        log.close()
+
+
+def test_reopen_drops_a_truncated_last_record(tmp_path):
+    write_messages(tmp_path, 10)
+    path = tmp_path / ROOM / segments(tmp_path)[-1]
+    os.truncate(path, os.path.getsize(path) - 5)
+
+    log = open_log(tmp_path)
+    try:
+        assert log.next_seq(ROOM) == 9
+        assert_records(log.read_since(ROOM, 0), 0, 9)
+        assert log.append(ROOM, 'user9', payload(9)) == 9
+        assert_records(log.read_since(ROOM, 0), 0, 10)
+    finally:
+        log.close()
+
+
+def test_reopen_ignores_a_partial_record_header(tmp_path):
+    write_messages(tmp_path, 10, index_interval=4)
+    path = tmp_path / ROOM / segments(tmp_path)[-1]
+    size = os.path.getsize(path)
+    with open(path, 'ab') as f:
+        f.write(b'\x00\x01\x02')
+
+    log = open_log(tmp_path, index_interval=4)
+    try:
+        assert log.next_seq(ROOM) == 10
+        assert os.path.getsize(path) == size
+        assert log.append(ROOM, 'user10', payload(10)) == 10
+        assert_records(log.read_since(ROOM, 8), 8, 3)
+    finally:
+        log.close()
+
+
+def test_segments_roll_over_at_segment_bytes(tmp_path):
+    write_messages(tmp_path, 50, segment_bytes=1024)
+    names = segments(tmp_path)
+    assert len(names) > 1
+    bases = [int(name[:-4]) for name in names]
+    assert bases[0] == 0 and bases == sorted(set(bases))
+    for name in names[:-1]:
+        assert os.path.getsize(tmp_path / ROOM / name) >= 1024
+
+
+def test_read_since_spans_segments(tmp_path):
+    write_messages(tmp_path, 50, segment_bytes=1024, index_interval=4)
+    log = open_log(tmp_path, segment_bytes=1024, index_interval=4)
+    try:
+        assert log.next_seq(ROOM) == 50
+        assert_records(log.read_since(ROOM, 3, limit=40), 3, 40)
+        assert_records(log.read_since(ROOM, 45), 45, 5)
+        assert_records(log.read_last(ROOM, 20), 30, 20)
+        assert log.read_since(ROOM, 50) == []
+    finally:
+        log.close()
@@ -0,0 +1,23 @@
+import time
+
+from metrics import SamplingProfiler
+
+
+def busy_handler(seconds):
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += sum(range(100))
+    return total
+
+
+def test_profiler_samples_a_busy_handler():
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    try:
+        busy_handler(0.3)
+    finally:
+        profiler.stop()
+    dump = profiler.dump()
+    assert 'busy_handler (test_metrics.py:' in dump
+    assert all('_run (metrics.py:' not in line.split(';')[-1] for line in dump.splitlines())
@@ -0,0 +1,68 @@
+import socket
+import threading
+
+import server
+from framing import FrameReader, pack_frame
+
+FRAMES = 200
+FRAME_SIZE = 4096
+
+
+def payload(i):
+    return i.to_bytes(4, 'big') * (FRAME_SIZE // 4)
+
+
+def relay_frames(count=FRAMES):
+    """Broadcast `count` frames as handle_client() does: straight from a FrameReader's buffer."""
+    source, sink = socket.socketpair()
+    feeder = threading.Thread(target=lambda: source.sendall(b''.join(pack_frame(payload(i)) for i in range(count))))
+    feeder.start()
+    reader = FrameReader(sink)
+    for _ in range(count):
+        server.broadcast(reader.read_frame())
+    feeder.join()
+    source.close()
+    sink.close()
+
+
+def read_frames(sock, count=FRAMES):
+    sock.settimeout(5)
+    reader = FrameReader(sock)
+    return [bytes(reader.read_frame()) for _ in range(count)]
+
+
+def connect_slow_reader():
+    conn, peer = socket.socketpair()
+    server.add_client(conn, queue_size=FRAMES * 2)
+    return conn, peer
+
+
+def test_queued_frames_survive_reader_buffer_reuse():
+    conn, peer = connect_slow_reader()
+    try:
+        relay_frames()
+        assert server.writers[conn].draining, "the socket buffer should have filled up"
+        assert read_frames(peer) == [payload(i) for i in range(FRAMES)]
+    finally:
+        server.remove_clients(conn)
+        conn.close()
+        peer.close()
+
+
+def test_backlog_drains_on_a_reused_fd():
+    # The first client goes away with its backlog still queued; the next one
+    # usually gets its fd back and must still be watched by the pump.
+    conn, peer = connect_slow_reader()
+    relay_frames()
+    server.remove_clients(conn)
+    conn.close()
+    peer.close()
+
+    conn, peer = connect_slow_reader()
+    try:
+        relay_frames()
+        assert read_frames(peer) == [payload(i) for i in range(FRAMES)]
+    finally:
+        server.remove_clients(conn)
+        conn.close()
+        peer.close()
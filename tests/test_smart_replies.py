@@ -0,0 +1,33 @@
+import threading
+
+from smart_replies import CircuitBreaker, ReplyProvider, SmartReplyService
+
+
+class HangingProvider(ReplyProvider):
+    """Sleeps well past the service timeout on every call."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.calls = 0
+        self.release = threading.Event()
+
+    def suggest(self, message, max_suggestions=3):
+        self.calls += 1
+        self.release.wait(self.seconds)
+        return ['late']
+
+
+def test_hanging_provider_opens_the_breaker():
+    provider = HangingProvider(seconds=5)
+    service = SmartReplyService(provider, workers=8, timeout=0.05,
+                                breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60))
+    try:
+        for i in range(3):
+            assert service.suggest(f'question number {i}') is None
+        assert service.breaker.state == CircuitBreaker.OPEN
+        assert service.suggest('one more question') is None
+        assert provider.calls == 3
+        assert service.stats['timeouts'] == 3 and service.stats['rejected'] == 1
+    finally:
+        provider.release.set()
+        service.close()
@@ -0,0 +1,85 @@
+import time
+
+from flow_control import RateLimiter
+
+DEFAULT_TICK = 0.25
+DEFAULT_TTL = 3.0
+
+
+class TypingTracker:
+    """Per-room "who is typing" sets, published on a fixed tick only when they change.
+
+    update() records a session's typing state; each session may start or
+    refresh typing `rate` times/s with bursts of `burst`, and a typer that
+    sends nothing for `ttl` seconds is dropped. flush(), called every
+    `tick` seconds, returns {room: [usernames]} for just the rooms whose
+    set differs from the one last published.
+    """
+
+    def __init__(self, tick=DEFAULT_TICK, ttl=DEFAULT_TTL, rate=2.0, burst=5, clock=time.monotonic):
+        self.tick = tick
+        self.ttl = ttl
+        self.limiter = RateLimiter(rate, burst, clock)
+        self._clock = clock
+        self._typing = {}
+        self._sessions = {}
+        self._published = {}
+        self._dirty = set()
+        self.stats = {'updates': 0, 'limited': 0, 'expired': 0, 'flushes': 0}
+
+    def update(self, sid, room, username, is_typing):
+        """Record a typing event; returns False when the session is over its rate limit."""
+        now = self._clock()
+        # Only starts and refreshes are limited; a stop can only shrink the set.
+        if is_typing and not self.limiter.allow(sid):
+            self.stats['limited'] += 1
+            return False
+        self.stats['updates'] += 1
+        if is_typing:
+            previous = self._sessions.get(sid)
+            if previous is not None and previous != room:
+                self._stop(sid)
+            self._typing.setdefault(room, {})[sid] = (username, now + self.ttl)
+            self._sessions[sid] = room
+            self._dirty.add(room)
+        else:
+            self._stop(sid)
+        return True
+
+    def _stop(self, sid):
+        room = self._sessions.pop(sid, None)
+        if room is None:
+            return
+        typers = self._typing.get(room)
+        if typers is not None:
+            typers.pop(sid, None)
+            if not typers:
+                del self._typing[room]
+        self._dirty.add(room)
+
+    def remove(self, sid):
+        """Forget a session that left its room or disconnected."""
+        self._stop(sid)
+        self.limiter.forget(sid)
+
+    def flush(self):
+        """Expire stale typers and return the changed rooms' typing sets."""
+        now = self._clock()
+        for room, typers in list(self._typing.items()):
+            expired = [sid for sid, (_, expires) in typers.items() if expires <= now]
+            for sid in expired:
+                self._stop(sid)
+            self.stats['expired'] += len(expired)
+
+        changes = {}
+        for room in self._dirty:
+            users = sorted({username for username, _ in self._typing.get(room, {}).values()})
+            if users != self._published.get(room, []):
+                changes[room] = users
+                if users:
+                    self._published[room] = users
+                else:
+                    self._published.pop(room, None)
+        self._dirty = set()
+        self.stats['flushes'] += len(changes)
+        return changes
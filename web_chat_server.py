@@ -1,65 +1,125 @@
+# Flask-SocketIO serves on eventlet when it is installed. The standard library is
+# patched before anything else is imported, so no module keeps a reference to the
+# blocking threading, socket or time. After this, every threading.Thread in the
+# process is a green thread that only runs when the hub yields. That is intended for
+# the message bus clients, the smart-reply worker pool and the logging listener,
+# whose blocking calls then yield to other connections. Two workers must stay on
+# native OS threads, through native_threads.original():
+#   - MessageLog's group-commit flusher, whose fsync would otherwise stall the hub;
+#   - SamplingProfiler, which has to sample the hub thread from outside it.
+# Anything new that blocks in a system call or watches the hub belongs on that list.
+try:
+    import eventlet
+    eventlet.monkey_patch()
+except ImportError:
+    pass
+
+import os
+import sys
+
+# --profile-startup reports import and initialization times instead of serving.
+if __name__ == '__main__' and '--profile-startup' in sys.argv[1:]:
+    from startup_profile import main
+    sys.exit(main('web_chat_server', sys.argv[1:]))
+
+from startup_profile import StartupTimer
+startup = StartupTimer()
+
 from flask import Flask, render_template, request
 from flask_socketio import SocketIO, emit, join_room, leave_room
+import atexit
 import base64
 import json
+import logging
 import time
-import socket
-import os
 from datetime import datetime
-from encryption_utils import encrypt_message, decrypt_message, generate_shared_key
-import re
+from encryption_utils import encrypt_message, decrypt_message, get_cipher
+from key_manager import KeyManager
+from message_history import PacketRecord, RoomHistory, TrafficRecord, sync_reply
+from message_log import MessageLog
+from message_bus import connect_bus, socketio_manager
+from live_stats import LiveStats, resolve_host_ip
+from metrics import Metrics
+from structured_logging import log_event, setup_logging
+from smart_replies import GeminiProvider, SmartReplyService, StubProvider
+from local_replies import LocalReplyEngine
+from typing_tracker import TypingTracker
+from room_stats import RoomStatsScheduler
+from message_batcher import MessageBatcher
+from flow_control import EVICT, RateLimiter, SlowConsumerPolicy
+from room_registry import DEFAULT_PAGE_SIZE, RoomRegistry
+from session_registry import SessionRegistry
+from settings import ENV_FILE, Settings, load_env_file, module_available
+import wire_json
+from wire_json import RawJSON
+from collections import deque
+startup.mark('imports')
 
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-    print("[*] Environment variables loaded from .env file")
-except ImportError:
-    print("[!] python-dotenv not installed. Install with: pip install python-dotenv")
-    print("[!] Falling back to system environment variables")
+# Configuration is read once: a .env file, if there is one, then the environment.
+env_file_loaded = load_env_file()
+settings = Settings()
 
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
-    print("[!] Google Generative AI not installed. Using fallback suggestions.")
-    print("[!] Install with: pip install google-generativeai")
+# Runtime events go through a queue to a background writer; SECURETALK_LOG_LEVEL=DEBUG
+# adds per-message and room membership detail, SECURETALK_LOG_FORMAT=json emits JSON lines.
+log_listener = setup_logging(level=settings.log_level, style=settings.log_format)
+atexit.register(log_listener.stop)
+log = logging.getLogger('securetalk.web')
+if env_file_loaded:
+    log_event(log, logging.INFO, 'environment loaded', path=ENV_FILE)
+startup.mark('settings')
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'securetalk_secret_key_2024'
-socketio = SocketIO(app, cors_allowed_origins="*")
+cluster = connect_bus(settings.bus_url) if settings.bus_url else None
+socketio_options = {'client_manager': socketio_manager(cluster)} if cluster else {}
+socketio = SocketIO(app, cors_allowed_origins="*", json=wire_json, **socketio_options)
+startup.mark('socketio')
 
-GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY', '')
-if GEMINI_AVAILABLE and GEMINI_API_KEY:
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        gemini_model = genai.GenerativeModel('gemini-2.0-flash')
-        print("[*] Google Gemini AI initialized successfully!")
-    except Exception as e:
-        print(f"[!] Failed to initialize Gemini: {e}")
-        GEMINI_AVAILABLE = False
-elif GEMINI_AVAILABLE and not GEMINI_API_KEY:
-    print("[!] GEMINI_API_KEY not set in .env file. Using fallback suggestions.")
-    print("[!] Add 'GEMINI_API_KEY=your-key-here' to your .env file")
-    print("[!] Get your free API key from: https://makersuite.google.com/app/apikey")
-    GEMINI_AVAILABLE = False
-
-shared_key = generate_shared_key()
-print("[*] Web SecureTalk Server - Shared encryption key generated")
-
-active_users = {}
+# The scrypt master key, the cipher backend probe and the host lookup are slow and not
+# needed to accept a connection; warm_up() does them once the server is running.
+key_manager = KeyManager.from_password(settings.key_password, lazy=True, ttl=settings.key_ttl)
+_server_ip = None
+
+def server_ip():
+    global _server_ip
+    if _server_ip is None:
+        _server_ip = resolve_host_ip()
+    return _server_ip
+
+# Per-stage latency histograms and per-room rates, exported on /metrics.
+metrics = Metrics(enabled=settings.metrics_enabled)
+
+# End-to-end messages arrive already encrypted by the browser; the server only relays them.
+E2E_PREFIX = b'e2e:'
+
+# Connected sessions and who is in which room; active_rooms holds each occupied room's name and history.
+sessions = SessionRegistry()
 user_count = 0
 active_rooms = {}
-stored_rooms = {}
+
+def room_user_counts(codes):
+    if cluster:
+        return cluster.get_many([f'room:{code}:users' for code in codes])
+    return [sessions.count(code) for code in codes]
+
+# Other workers' joins don't touch() this registry, so with a cluster directory pages also expire.
+stored_rooms = RoomRegistry(room_user_counts, max_age=settings.rooms_max_age if cluster else None)
+rooms_synced_at = 0.0
 network_stats = {
     'total_connections': 0,
     'total_messages': 0,
     'bytes_transferred': 0,
     'server_start_time': time.time(),
     'active_connections': 0,
-    'message_history': [],
+    'message_history': deque(maxlen=100),
     'rooms_created': 0,
-    'active_rooms': 0
+    'active_rooms': 0,
+    'rate_limited_messages': 0,
+    'rate_limited_room_messages': 0,
+    'dropped_low_priority': 0,
+    'slow_consumers_evicted': 0,
+    'history_deltas': 0,
+    'history_gaps': 0
 }
 
 stored_rooms.update({
@@ -89,6 +149,127 @@ stored_rooms.update({
     }
 })
 
+# Optional durable storage: set SECURETALK_LOG_DIR to keep encrypted room
+# history and user-created rooms across restarts.
+message_log = None
+if settings.log_dir and cluster:
+    log_event(log, logging.WARNING, 'message log disabled', reason='SECURETALK_LOG_DIR needs a single worker')
+elif settings.log_dir:
+    message_log = MessageLog(settings.log_dir, fsync_interval=settings.log_fsync_interval)
+    # Commits what the last group commit missed and stops the flusher.
+    atexit.register(message_log.close)
+    stored_rooms.update(message_log.load_rooms())
+    log_event(log, logging.INFO, 'message log enabled', path=settings.log_dir, rooms=len(stored_rooms))
+startup.mark('storage')
+
+def shared_count(name, delta=1):
+    """Change a network_stats counter locally and, with workers, cluster-wide."""
+    network_stats[name] += delta
+    if cluster:
+        cluster.incr(f'stats:{name}', delta)
+
+def track_room_member(room_code, delta):
+    """Keep the cluster-wide member count of a room and the active room count."""
+    stored_rooms.touch(room_code)
+    if cluster:
+        users = cluster.incr(f'room:{room_code}:users', delta)
+        if users == (1 if delta > 0 else 0):
+            cluster.incr('stats:active_rooms', delta)
+
+def room_user_count(room_code):
+    if cluster:
+        return cluster.get_many([f'room:{room_code}:users'])[0]
+    return sessions.count(room_code)
+
+def room_message_count(room_code):
+    if cluster:
+        return cluster.get_many([f'room:{room_code}:messages'])[0]
+    return active_rooms.get(room_code, {}).get('message_count', 0)
+
+def find_room(room_code):
+    """Look a room up in stored_rooms, falling back to rooms other workers created."""
+    room = stored_rooms.get(room_code)
+    if room is None and cluster:
+        shared = cluster.hget('rooms', room_code)
+        if shared is not None:
+            room = stored_rooms.put(room_code, json.loads(shared))
+    return room
+
+# Messages are numbered per room so a reconnecting client can ask for just what it missed.
+# The durable log's numbers survive restarts; otherwise numbering restarts with each
+# active_rooms entry under a fresh epoch. Other workers' messages never reach this worker's
+# history, so with a cluster rooms are not numbered at all.
+LOG_EPOCH = 'log'
+
+def new_room_history(room_code):
+    depth, max_bytes = settings.history_depth, settings.history_max_bytes
+    if cluster:
+        return RoomHistory(depth, max_bytes)
+    if message_log:
+        return RoomHistory(depth, max_bytes, next_seq=message_log.next_seq(room_code), epoch=LOG_EPOCH)
+    return RoomHistory(depth, max_bytes, epoch=os.urandom(4).hex())
+
+def message_packet(username, room_code, timestamp, size, message=None, encrypted=None, ciphertext=None, seq=None):
+    """Serialize a chat message once; the same bytes serve fan-out, history and replay."""
+    if ciphertext is not None:
+        body = {'ciphertext': ciphertext}
+    else:
+        body = {'message': message, 'encrypted_message': encrypted.decode('utf-8')}
+    if seq is not None:
+        body['seq'] = seq
+    return RawJSON.encode({
+        'username': username,
+        **body,
+        'timestamp': timestamp,
+        'room': room_code,
+        'bytes_sent': size,
+        'packet_info': {
+            'size_bytes': size,
+            'protocol': 'WebSocket',
+            'encrypted': True,
+            'e2e': ciphertext is not None
+        }
+    })
+
+def history_from_log(room_code, records):
+    """Turn logged records back into PacketRecords for replay, decrypting server-encrypted ones."""
+    key_manager.room_key(room_code)
+    history = []
+    for record in records:
+        timestamp = datetime.fromtimestamp(record.timestamp).strftime('%H:%M:%S')
+        if record.payload.startswith(E2E_PREFIX):
+            ciphertext = record.payload[len(E2E_PREFIX):].decode('ascii')
+            packet = message_packet(record.username, room_code, timestamp, len(ciphertext),
+                                    ciphertext=ciphertext, seq=record.seq)
+        else:
+            start = time.perf_counter()
+            try:
+                message = decrypt_message(key_manager, record.payload)
+            except ValueError:
+                continue
+            metrics.since('decrypt', start)
+            packet = message_packet(record.username, room_code, timestamp, len(message.encode('utf-8')),
+                                    message=message, encrypted=record.payload, seq=record.seq)
+        history.append(PacketRecord(record.username, timestamp, packet, record.seq))
+    return history
+
+def history_reply(room_code, data):
+    """The message_history payload for a join or resync; see message_history.sync_reply()."""
+    history = active_rooms[room_code]['message_history']
+
+    def read_log(since_seq):
+        # Evicted from memory for size but still in the log.
+        if message_log and history.next_seq - since_seq <= settings.history_depth:
+            return history_from_log(room_code, message_log.read_since(room_code, since_seq, settings.history_depth))
+        return None
+
+    reply = sync_reply(history, data, read_log)
+    if reply['sync'] == 'delta':
+        shared_count('history_deltas')
+    elif reply['sync'] == 'gap':
+        shared_count('history_gaps')
+    return reply
+
 @app.route('/')
 def index():
     """Serve the main menu"""
@@ -99,7 +280,9 @@ def chat():
     """Serve the chat interface"""
     room = request.args.get('room', 'default')
     room_name = request.args.get('name', f'Room {room}')
-    return render_template('chat.html', room=room, room_name=room_name)
+    # Without sticky sessions, long-polling requests could land on another worker.
+    transports = ['websocket'] if cluster else ['polling', 'websocket']
+    return render_template('chat.html', room=room, room_name=room_name, socket_transports=transports)
 
 @app.route('/create-room')
 def create_room():
@@ -117,14 +300,11 @@ def create_room_api():
     try:
         data = request.get_json()
         
-        import random
-        import string
-        room_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+        room_code = stored_rooms.new_code(
+            taken=(lambda code: cluster.hget('rooms', code) is not None) if cluster else None
+        )
         
-        while room_code in stored_rooms:
-            room_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-        
-        stored_rooms[room_code] = {
+        stored_rooms.put(room_code, {
             'name': data.get('name', f'Room {room_code}'),
             'description': data.get('description', ''),
             'maxUsers': int(data.get('maxUsers', 10)),
@@ -132,9 +312,13 @@ def create_room_api():
             'isPublic': data.get('isPublic', True),
             'created_at': time.time(),
             'creator': data.get('creator', 'Anonymous')
-        }
+        })
+        if message_log:
+            message_log.save_room(room_code, stored_rooms[room_code])
+        if cluster:
+            cluster.hset('rooms', room_code, json.dumps(stored_rooms[room_code]))
         
-        network_stats['rooms_created'] += 1
+        shared_count('rooms_created')
         
         return json.dumps({
             'success': True,
@@ -147,32 +331,31 @@ def create_room_api():
 
 @app.route('/api/rooms')
 def get_rooms():
-    """API endpoint to get available rooms"""
-    public_rooms = {
-        code: {
-            'code': code,
-            'name': room['name'],
-            'description': room['description'],
-            'maxUsers': room['maxUsers'],
-            'currentUsers': len(active_rooms.get(code, {}).get('users', set())),
-            'isPublic': room.get('isPublic', True)
-        }
-        for code, room in stored_rooms.items()
-        if room.get('isPublic', True)
-    }
+    """API endpoint to page through public rooms: ?limit=&cursor=&q=<name prefix>"""
+    global rooms_synced_at
+    if cluster and time.monotonic() - rooms_synced_at >= settings.rooms_max_age:
+        rooms_synced_at = time.monotonic()
+        stored_rooms.update((code, json.loads(room)) for code, room in cluster.hgetall('rooms').items())
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        limit = DEFAULT_PAGE_SIZE
+    page = stored_rooms.page(limit, request.args.get('cursor'), request.args.get('q', ''))
     
-    for code, room_info in public_rooms.items():
-        print(f"[DEBUG API] Room {code}: {room_info['currentUsers']}/{room_info['maxUsers']} users")
+    log_event(log, logging.DEBUG, 'rooms listed', version=page.version, size=len(page.body))
     
-    return json.dumps(public_rooms)
+    response = app.response_class(page.body, mimetype='application/json')
+    response.set_etag(page.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 @app.route('/api/room/<room_code>')
 def get_room_info(room_code):
     """API endpoint to get specific room information"""
-    if room_code in stored_rooms:
+    if find_room(room_code) is not None:
         room_data = stored_rooms[room_code].copy()
         room_data['code'] = room_code
-        room_data['currentUsers'] = len(active_rooms.get(room_code, {}).get('users', set()))
+        room_data['currentUsers'] = room_user_count(room_code)
         return json.dumps(room_data)
     else:
         return json.dumps({'error': 'Room not found'}), 404
@@ -182,107 +365,182 @@ def network_stats_page():
     """Serve the network statistics dashboard"""
     return_room = request.args.get('return_room')
     return_name = request.args.get('return_name')
-    return render_template('network_stats.html', return_room=return_room, return_name=return_name)
+    transports = ['websocket'] if cluster else ['polling', 'websocket']
+    return render_template('network_stats.html', return_room=return_room, return_name=return_name,
+                           socket_transports=transports)
 
-@app.route('/api/stats')
-def get_stats():
-    """API endpoint for network statistics"""
-    current_time = time.time()
-    uptime = current_time - network_stats['server_start_time']
-    
-    stats = {
+STATS_COUNTERS = ['total_connections', 'active_connections', 'total_messages',
+                  'bytes_transferred', 'rooms_created', 'active_rooms', 'rate_limited_messages',
+                  'rate_limited_room_messages', 'dropped_low_priority', 'slow_consumers_evicted',
+                  'history_deltas', 'history_gaps']
+
+def collect_stats_totals():
+    uptime = time.time() - network_stats['server_start_time']
+    totals = {key: network_stats[key] for key in STATS_COUNTERS}
+    if cluster:
+        # Counters are cluster-wide; active_users and room_details list this worker's sessions.
+        totals.update(zip(STATS_COUNTERS, cluster.get_many([f'stats:{key}' for key in STATS_COUNTERS])))
+    totals.update({
         'server_uptime': f"{uptime:.2f} seconds",
-        'total_connections': network_stats['total_connections'],
-        'active_connections': network_stats['active_connections'],
-        'total_messages': network_stats['total_messages'],
-        'bytes_transferred': network_stats['bytes_transferred'],
-        'rooms_created': network_stats['rooms_created'],
-        'active_rooms': network_stats['active_rooms'],
-        'server_ip': socket.gethostbyname(socket.gethostname()),
+        'server_ip': server_ip(),
         'server_port': 5000,
         'protocol': 'WebSocket over HTTP',
-        'encryption': 'AES-256-GCM',
-        'active_users': [user_data['username'] for user_data in active_users.values()],
-        'room_details': {
-            room_code: {
-                'name': room_data['name'],
-                'user_count': len(room_data['users']),
-                'message_count': room_data['message_count'],
-                'created_at': room_data['created_at']
-            } for room_code, room_data in active_rooms.items()
-        }
-    }
-    return json.dumps(stats)
+        'encryption': 'AES-256-GCM'
+    })
+    return totals
 
+def describe_room(room_code):
+    room_data = active_rooms.get(room_code)
+    if room_data is None:
+        return None
+    return {
+        'name': room_data['name'],
+        'user_count': room_user_count(room_code),
+        'message_count': room_message_count(room_code),
+        'created_at': room_data['created_at']
+    }
 
-def generate_smart_replies_with_llm(message, max_suggestions=3):
-    """Generate smart replies using Google Gemini LLM"""
-    if not GEMINI_AVAILABLE or not GEMINI_API_KEY:
+def room_stats_payload(room_code):
+    if room_code not in active_rooms:
         return None
-    
-    try:
-        prompt = f"""You are a helpful chat assistant. Given the following message, generate {max_suggestions} short, natural, and contextually appropriate reply suggestions. Each reply should be casual, friendly, and conversational.
+    return {
+        'user_count': room_user_count(room_code),
+        'message_count': room_message_count(room_code)
+    }
 
-Message: "{message}"
+# room_stats updates ride along on message emits, or go out at most once per interval per room.
+room_stats = RoomStatsScheduler(room_stats_payload,
+                                interval=settings.room_stats_interval)
+room_stats_flusher_started = False
 
-Requirements:
-- Keep replies SHORT (max 8-10 words each)
-- Make them sound natural and human-like
-- Match the tone and context of the message
-- Be relevant and helpful
-- Use emojis sparingly when appropriate
-- Provide diverse response options (e.g., one agreeing, one questioning, one supportive)
+def flush_room_stats():
+    """Send the room_stats of rooms that changed without a message to carry them."""
+    while True:
+        socketio.sleep(room_stats.interval / 4)
+        for room_code, stats in room_stats.flush().items():
+            emit_droppable('room_stats', stats, room_code)
 
-Return ONLY the {max_suggestions} reply suggestions, one per line, without numbering or bullet points."""
+live_stats = LiveStats(
+    collect_stats_totals, describe_room,
+    sessions.usernames,
+    interval=settings.stats_interval
+)
+stats_pusher_started = False
 
-        response = gemini_model.generate_content(prompt)
-        
-        if response and response.text:
-            suggestions = [
-                line.strip() 
-                for line in response.text.strip().split('\n') 
-                if line.strip() and not line.strip().startswith(('*', '-', '1.', '2.', '3.'))
-            ]
-            
-            cleaned_suggestions = []
-            for s in suggestions:
-                s = re.sub(r'^\d+[\.)]\s*', '', s)
-                s = re.sub(r'^[-*•]\s*', '', s)
-                if s:
-                    cleaned_suggestions.append(s)
-            
-            return cleaned_suggestions[:max_suggestions]
-    
-    except Exception as e:
-        print(f"[!] Gemini API error: {e}")
-        return None
-    
-    return None
+def refresh_cluster_rooms():
+    """Other workers change shared room counts without local events."""
+    if cluster:
+        for room_code in active_rooms:
+            live_stats.room_changed(room_code)
+
+@app.route('/api/stats')
+def get_stats():
+    """API endpoint for network statistics"""
+    refresh_cluster_rooms()
+    return live_stats.snapshot_json()
+
+def push_stats():
+    """Push stats deltas to every dashboard on /stats, one snapshot per interval."""
+    while True:
+        socketio.sleep(live_stats.interval)
+        if not live_stats.subscribers:
+            continue
+        refresh_cluster_rooms()
+        delta = live_stats.next_delta()
+        if delta:
+            socketio.emit('stats_delta', delta, namespace='/stats')
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition of counters, stage latencies and room rates"""
+    totals = collect_stats_totals()
+    gauges = {key: totals[key] for key in STATS_COUNTERS}
+    gauges['active_users'] = len(sessions)
+    if smart_reply_service:
+        report = smart_reply_service.report()
+        gauges.update({f'smart_reply_{key}': report[key]
+                       for key in ('requests', 'local', 'hits', 'coalesced', 'timeouts', 'errors', 'rejected',
+                                   'fallbacks', 'hit_rate')})
+        gauges['smart_reply_breaker_open'] = int(report['breaker'] != 'closed')
+    return metrics.render_prometheus(gauges), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+@app.route('/metrics/profile', methods=['GET', 'POST'])
+def profile_endpoint():
+    """Toggle the sampling profiler: ?action=start, ?action=stop or no action for the samples so far"""
+    action = request.args.get('action')
+    if action == 'start':
+        metrics.profiler.start()
+        return json.dumps({'profiling': True})
+    if action == 'stop':
+        metrics.profiler.stop()
+    return metrics.profiler.dump(), 200, {'Content-Type': 'text/plain'}
+
+@socketio.on('connect', namespace='/stats')
+def on_stats_connect():
+    """Send a new dashboard the full snapshot; deltas follow from push_stats()."""
+    global stats_pusher_started
+    live_stats.subscribers += 1
+    if not stats_pusher_started:
+        stats_pusher_started = True
+        socketio.start_background_task(push_stats)
+    emit('stats_snapshot', live_stats.snapshot())
+
+@socketio.on('disconnect', namespace='/stats')
+def on_stats_disconnect():
+    live_stats.subscribers -= 1
+
+
+# SECURETALK_SMART_REPLY_PROVIDER=stub serves canned replies without Gemini, for tests and benchmarks.
+if settings.smart_reply_provider == 'stub':
+    smart_reply_provider = StubProvider(latency=settings.stub_latency)
+elif settings.gemini_api_key and module_available('google.generativeai'):
+    # google.generativeai is imported by the first suggestion, not at startup.
+    smart_reply_provider = GeminiProvider(settings.gemini_api_key)
+else:
+    smart_reply_provider = None
+    log_event(log, logging.INFO, 'gemini smart replies off',
+              reason='google-generativeai not installed' if settings.gemini_api_key else 'GEMINI_API_KEY not set')
+# The offline engine answers recognized messages before the provider ("first"), only
+# when the provider cannot ("fallback"), or not at all ("off").
+local_reply_engine = LocalReplyEngine() if settings.local_replies != 'off' else None
+smart_reply_service = SmartReplyService(
+    smart_reply_provider,
+    workers=settings.smart_reply_workers,
+    timeout=settings.smart_reply_timeout,
+    local=local_reply_engine,
+    local_first=settings.local_replies == 'first'
+) if smart_reply_provider or local_reply_engine else None
 
 
 @app.route('/api/smart-replies', methods=['POST'])
 def smart_replies_api():
-    """API endpoint returning AI-powered smart-reply suggestions using Google Gemini LLM.
-    Requires GEMINI_API_KEY to be set in .env file."""
+    """API endpoint returning smart-reply suggestions from the local engine and/or Google Gemini LLM.
+    Gemini requires GEMINI_API_KEY to be set in .env file."""
     try:
         data = request.get_json() or {}
         message = data.get('message', '')
         
-        if not GEMINI_AVAILABLE or not GEMINI_API_KEY:
+        if smart_reply_service is None:
             return json.dumps({
                 'suggestions': [],
                 'ai_powered': False,
                 'error': 'AI not configured. Please set GEMINI_API_KEY in .env file.'
             })
         
-        suggestions = generate_smart_replies_with_llm(message)
+        start = time.perf_counter()
+        suggestions = smart_reply_service.suggest(message)
+        metrics.since('smart_reply', start)
         
-        if not suggestions:
-            suggestions = []
+        if suggestions is None:
+            return json.dumps({
+                'suggestions': [],
+                'ai_powered': smart_reply_provider is not None,
+                'error': 'Smart replies are temporarily unavailable.'
+            })
         
         return json.dumps({
             'suggestions': suggestions,
-            'ai_powered': True
+            'ai_powered': smart_reply_provider is not None
         })
     except Exception as e:
         return json.dumps({
@@ -291,23 +549,73 @@ def smart_replies_api():
             'error': str(e)
         }), 500
 
+# Flow control. Each room may carry SECURETALK_ROOM_RATE messages/s (bursts of
+# SECURETALK_ROOM_BURST); setting SECURETALK_SEND_RATE (bursts of SECURETALK_SEND_BURST) also
+# limits each connection, which is off by default. A rate of 0 turns that limit off. Every SECURETALK_CONSUMER_CHECK_INTERVAL seconds the
+# engine.io send queue of each session is measured: from SECURETALK_QUEUE_HIGH packets until it
+# is back to SECURETALK_QUEUE_LOW the session gets no typing or room_stats updates, and at
+# SECURETALK_QUEUE_LIMIT it is disconnected.
+send_limiter = RateLimiter(settings.send_rate, settings.send_burst) if settings.send_rate > 0 else None
+room_limiter = RateLimiter(settings.room_rate, settings.room_burst) if settings.room_rate > 0 else None
+slow_consumers = SlowConsumerPolicy(high=settings.queue_high, low=settings.queue_low, limit=settings.queue_limit)
+consumer_watcher_started = False
+
+def outbound_depth(sid):
+    """Packets waiting in engine.io's send queue for a session; 0 when it can't be measured."""
+    try:
+        eio_sid = socketio.server.manager.eio_sid_from_sid(sid, '/')
+        return socketio.server.eio.sockets[eio_sid].queue.qsize()
+    except (AttributeError, KeyError, TypeError, NotImplementedError):
+        return 0
+
+def watch_consumers():
+    """Mark sessions that have fallen behind as congested and disconnect those too far behind."""
+    while True:
+        socketio.sleep(settings.consumer_check_interval)
+        for sid in list(sessions):
+            session = sessions.get(sid)
+            if session is None:
+                continue
+            if slow_consumers.state(sid, outbound_depth(sid)) == EVICT:
+                shared_count('slow_consumers_evicted')
+                log_event(log, logging.WARNING, 'slow consumer evicted', username=session.username, sid=sid)
+                socketio.server.disconnect(sid, namespace='/')
+        for limiter in (send_limiter, room_limiter):
+            if limiter:
+                limiter.prune()
+
+def emit_droppable(event, data, room_code):
+    """Emit an update a member can do without, skipping the room's congested members."""
+    congested = slow_consumers.congested
+    skipped = [sid for sid in sessions.members(room_code) if sid in congested] if congested else []
+    if skipped:
+        shared_count('dropped_low_priority', len(skipped))
+    socketio.emit(event, data, room=room_code, skip_sid=skipped or None)
+
+def rate_limited(room_code):
+    """Check the sender's and the room's budgets; returns the name of the limit hit, if any."""
+    if send_limiter and not send_limiter.allow(request.sid):
+        shared_count('rate_limited_messages')
+        return 'connection'
+    if room_limiter and not room_limiter.allow(room_code):
+        shared_count('rate_limited_room_messages')
+        return 'room'
+    return None
+
 @socketio.on('connect')
 def on_connect():
     """Handle new user connections"""
     global user_count
-    user_count += 1
-    username = f"User{user_count}"
-    active_users[request.sid] = {
-        'username': username,
-        'room': None,
-        'join_time': time.time()
-    }
+    user_count = cluster.incr('user_count') if cluster else user_count + 1
+    username = sessions.add(request.sid, user_count).username
     
-    network_stats['total_connections'] += 1
-    network_stats['active_connections'] = len(active_users)
+    shared_count('total_connections')
+    shared_count('active_connections')
+    live_stats.users_changed()
     
-    print(f"[+] {username} connected ({request.sid}) from {request.remote_addr}")
-    print(f"[DEBUG] Total active users: {len(active_users)}")
+    log_event(log, logging.INFO, 'user connected', username=username, sid=request.sid,
+              remote_addr=request.remote_addr)
+    log_event(log, logging.DEBUG, 'active users', count=len(sessions))
     
     emit('user_connected', {
         'username': username,
@@ -315,17 +623,20 @@ def on_connect():
         'server_info': {
             'protocol': 'WebSocket',
             'encryption': 'AES-256-GCM',
-            'server_ip': socket.gethostbyname(socket.gethostname())
+            'server_ip': server_ip()
         }
     })
 
 @socketio.on('join_room')
 def handle_join_room(data):
     """Handle user joining a specific room"""
+    global room_stats_flusher_started, consumer_watcher_started
+    start = time.perf_counter()
     room_code = data.get('room', 'default')
-    username = active_users.get(request.sid, {}).get('username', 'Unknown')
+    session = sessions.get(request.sid)
+    username = session.username if session else 'Unknown'
     
-    if room_code not in stored_rooms and room_code != 'default':
+    if find_room(room_code) is None and room_code != 'default':
         emit('room_error', {
             'error': 'Room not found',
             'message': f'Room {room_code} does not exist or has been deleted.'
@@ -340,7 +651,7 @@ def handle_join_room(data):
         room_name = 'General Chat'
         max_users = 50
     
-    current_users = len(active_rooms.get(room_code, {}).get('users', set()))
+    current_users = room_user_count(room_code)
     if current_users >= max_users:
         emit('room_error', {
             'error': 'Room is full',
@@ -348,13 +659,20 @@ def handle_join_room(data):
         })
         return
     
-    old_room = active_users[request.sid].get('room')
+    old_room = sessions.leave(request.sid)
     if old_room:
         leave_room(old_room)
+        typing_tracker.remove(request.sid)
         if old_room in active_rooms:
-            active_rooms[old_room]['users'].discard(request.sid)
-            if not active_rooms[old_room]['users']:
+            track_room_member(old_room, -1)
+            live_stats.room_changed(old_room)
+            room_stats.mark(old_room)
+            if not sessions.count(old_room):
                 del active_rooms[old_room]
+                room_stats.forget(old_room)
+                if message_batcher:
+                    message_batcher.forget(old_room)
+                metrics.forget_room(old_room)
                 network_stats['active_rooms'] = len(active_rooms)
     
     join_room(room_code)
@@ -362,26 +680,29 @@ def handle_join_room(data):
     if room_code not in active_rooms:
         active_rooms[room_code] = {
             'name': room_name,
-            'users': set(),
             'created_at': time.time(),
             'message_count': 0,
-            'message_history': []
+            'message_history': new_room_history(room_code)
         }
+        if message_log:
+            for record in history_from_log(room_code, message_log.read_last(room_code, settings.history_depth)):
+                active_rooms[room_code]['message_history'].append(record)
         if room_code not in stored_rooms:
-            network_stats['rooms_created'] += 1
+            shared_count('rooms_created')
     
-    was_already_in_room = request.sid in active_rooms[room_code]['users']
+    was_already_in_room = sessions.room_of(request.sid) == room_code
     
-    active_rooms[room_code]['users'].add(request.sid)
-    active_users[request.sid]['room'] = room_code
+    if not was_already_in_room:
+        track_room_member(room_code, 1)
+    sessions.join(request.sid, room_code)
+    live_stats.room_changed(room_code)
     network_stats['active_rooms'] = len(active_rooms)
     
-    print(f"[+] {username} joined room {room_code} ({room_name})")
-    print(f"[DEBUG] Room {room_code} now has {len(active_rooms[room_code]['users'])} users")
-    print(f"[DEBUG] Session IDs in room: {list(active_rooms[room_code]['users'])}")
-    print(f"[DEBUG] Usernames in room: {[active_users[sid]['username'] for sid in active_rooms[room_code]['users']]}")
-    print(f"[DEBUG] Current user session ID: {request.sid}")
-    print(f"[DEBUG] Was already in room: {was_already_in_room}")
+    log_event(log, logging.INFO, 'user joined', username=username, room=room_code, room_name=room_name)
+    log_event(log, logging.DEBUG, 'room members', room=room_code, count=sessions.count(room_code),
+              sids=lambda: sessions.members(room_code),
+              usernames=lambda: sessions.usernames(room_code),
+              sid=request.sid, was_already_in_room=was_already_in_room)
     
     if not was_already_in_room:
         emit('user_joined', {
@@ -393,142 +714,216 @@ def handle_join_room(data):
     emit('room_joined', {
         'room': room_code,
         'room_name': room_name,
-        'user_count': len(active_rooms[room_code]['users']),
+        'user_count': room_user_count(room_code),
         'max_users': max_users
     })
     
-    if active_rooms[room_code]['message_history']:
-        emit('message_history', {
-            'messages': active_rooms[room_code]['message_history']
-        })
+    history = active_rooms[room_code]['message_history']
+    # Sequenced rooms always answer, so the client learns the epoch and next_seq.
+    if history or history.epoch is not None:
+        emit('message_history', history_reply(room_code, data))
     
-    emit('room_stats', {
-        'user_count': len(active_rooms[room_code]['users']),
-        'message_count': active_rooms[room_code]['message_count']
-    }, room=room_code)
+    # The joiner gets its room's stats now; the other members get them with the next flush.
+    emit('room_stats', room_stats_payload(room_code))
+    room_stats.mark(room_code)
+    if not room_stats_flusher_started:
+        room_stats_flusher_started = True
+        socketio.start_background_task(flush_room_stats)
+    if not consumer_watcher_started:
+        consumer_watcher_started = True
+        socketio.start_background_task(watch_consumers)
+    metrics.since('join', start)
+
+@socketio.on('sync_history')
+def handle_sync_history(data):
+    """Resend the messages from since_seq on to a client that saw a gap in the seqs it received."""
+    room_code = sessions.room_of(request.sid)
+    if room_code in active_rooms and isinstance(data, dict):
+        emit('message_history', history_reply(room_code, data))
 
 @socketio.on('disconnect')
 def on_disconnect():
     """Handle user disconnections"""
-    if request.sid in active_users:
-        user_data = active_users[request.sid]
-        username = user_data['username']
-        room_code = user_data.get('room')
+    session = sessions.remove(request.sid)
+    if session is not None:
+        username = session.username
+        room_code = session.room
         
         if room_code and room_code in active_rooms:
-            active_rooms[room_code]['users'].discard(request.sid)
+            track_room_member(room_code, -1)
+            live_stats.room_changed(room_code)
             emit('user_left', {
                 'username': username,
                 'message': f'{username} left the room'
             }, room=room_code)
             
-            if active_rooms[room_code]['users']:
-                emit('room_stats', {
-                    'user_count': len(active_rooms[room_code]['users']),
-                    'message_count': active_rooms[room_code]['message_count']
-                }, room=room_code)
-            else:
+            room_stats.mark(room_code)
+            if not sessions.count(room_code):
                 del active_rooms[room_code]
+                room_stats.forget(room_code)
+                if message_batcher:
+                    message_batcher.forget(room_code)
+                if room_limiter:
+                    room_limiter.forget(room_code)
+                metrics.forget_room(room_code)
                 network_stats['active_rooms'] = len(active_rooms)
         
-        del active_users[request.sid]
+        typing_tracker.remove(request.sid)
+        slow_consumers.forget(request.sid)
+        if send_limiter:
+            send_limiter.forget(request.sid)
         
-        network_stats['active_connections'] = len(active_users)
+        shared_count('active_connections', -1)
+        live_stats.users_changed()
         
-        print(f"[-] {username} disconnected")
+        log_event(log, logging.INFO, 'user disconnected', username=username)
+
+# Optional micro-batching: messages to a room within SECURETALK_BATCH_WINDOW_MS (5-50 ms, 0 = off)
+# or SECURETALK_BATCH_MAX messages go out as one receive_batch packet.
+message_batcher = MessageBatcher(
+    window=settings.batch_window_ms / 1000, max_messages=settings.batch_max
+) if settings.batch_window_ms > 0 else None
+batch_flusher_started = False
+
+def flush_message_batches():
+    """Emit each room's pending messages once the oldest has waited a full window."""
+    while True:
+        socketio.sleep(message_batcher.tick)
+        for room_code, batch in message_batcher.flush().items():
+            socketio.emit('receive_batch', batch, room=room_code)
 
 @socketio.on('send_message')
 def handle_message(data):
-    """Handle encrypted message sending"""
+    """Handle a chat message: encrypt it (or relay the client's ciphertext) and serialize it once"""
+    global batch_flusher_started
     try:
-        user_data = active_users.get(request.sid, {})
-        username = user_data.get('username', 'Unknown')
-        room_code = user_data.get('room', 'default')
-        message = data.get('message', '').strip()
+        start = t = time.perf_counter()
+        session = sessions.get(request.sid)
+        username = session.username if session else 'Unknown'
+        room_code = session.room if session else 'default'
+        timestamp = data.get('timestamp') or datetime.now().strftime('%H:%M:%S')
+        ciphertext = data.get('ciphertext')
+        history = active_rooms[room_code]['message_history'] if room_code in active_rooms else None
+        seq = history.next_seq if history is not None and history.epoch is not None else None
         
-        if not message:
+        limit = rate_limited(room_code)
+        if limit:
+            emit('rate_limited', {'limit': limit, 'message': 'You are sending messages too fast'})
             return
         
-        print(f"[MSG] {username} in {room_code}: {message}")
-        
-        network_stats['total_messages'] += 1
-        message_size = len(message.encode('utf-8'))
-        network_stats['bytes_transferred'] += message_size
-        
-        if room_code in active_rooms:
-            active_rooms[room_code]['message_count'] += 1
+        if ciphertext is not None:
+            if not isinstance(ciphertext, str) or not ciphertext or len(ciphertext) > settings.e2e_max_ciphertext:
+                emit('error', {'message': 'Invalid encrypted message'})
+                return
+            try:
+                logged = E2E_PREFIX + ciphertext.encode('ascii')
+            except UnicodeEncodeError:
+                emit('error', {'message': 'Invalid encrypted message'})
+                return
+            message_size = len(ciphertext)
+            log_event(log, logging.DEBUG, 'message', username=username, room=room_code, size=message_size, e2e=True)
+            t = metrics.since('log', t)
+            packet = message_packet(username, room_code, timestamp, message_size, ciphertext=ciphertext, seq=seq)
+        else:
+            message = data.get('message', '').strip()
+            if not message:
+                return
             
-            message_data = {
-                'username': username,
-                'message': message,
-                'timestamp': data.get('timestamp', datetime.now().strftime('%H:%M:%S')),
-                'encrypted_message': None
-            }
+            message_size = len(message.encode('utf-8'))
+            log_event(log, logging.DEBUG, 'message', username=username, room=room_code, size=message_size,
+                      **({'text': message} if settings.log_plaintext else {}))
+            t = metrics.since('log', t)
             
-            active_rooms[room_code]['message_history'].append(message_data)
-            if len(active_rooms[room_code]['message_history']) > 50:
-                active_rooms[room_code]['message_history'].pop(0)
-        
-        network_stats['message_history'].append({
-            'timestamp': datetime.now().isoformat(),
-            'username': username,
-            'room': room_code,
-            'size_bytes': message_size,
-            'encrypted': True
-        })
-        if len(network_stats['message_history']) > 100:
-            network_stats['message_history'].pop(0)
+            key_id, room_key = key_manager.room_key(room_code)
+            logged = encrypt_message(room_key, message, key_id=key_id)
+            t = metrics.since('encrypt', t)
+            packet = message_packet(username, room_code, timestamp, message_size, message=message, encrypted=logged,
+                                    seq=seq)
         
-        encrypted_msg = encrypt_message(shared_key, message)
+        shared_count('total_messages')
+        shared_count('bytes_transferred', message_size)
+        metrics.room_message(room_code)
         
-        if room_code in active_rooms and active_rooms[room_code]['message_history']:
-            active_rooms[room_code]['message_history'][-1]['encrypted_message'] = encrypted_msg.decode('utf-8')
+        if history is not None:
+            active_rooms[room_code]['message_count'] += 1
+            if cluster:
+                cluster.incr(f'room:{room_code}:messages')
+            live_stats.room_changed(room_code)
+            history.append(PacketRecord(username, timestamp, packet, seq))
         
-        emit('receive_message', {
-            'username': username,
-            'message': message,
-            'encrypted_message': encrypted_msg.decode('utf-8'),
-            'timestamp': data.get('timestamp'),
-            'room': room_code,
-            'packet_info': {
-                'size_bytes': message_size,
-                'protocol': 'WebSocket',
-                'encrypted': True
-            }
-        }, room=room_code, include_self=False)
+        network_stats['message_history'].append(
+            TrafficRecord(datetime.now().isoformat(), username, room_code, message_size)
+        )
+        if message_log:
+            message_log.append(room_code, username, logged)
+        t = metrics.since('history', t)
         
-        emit('message_sent', {
-            'message': message,
-            'timestamp': data.get('timestamp'),
-            'bytes_sent': message_size,
-            'room': room_code
-        })
-        
-        if room_code in active_rooms:
-            emit('room_stats', {
-                'user_count': len(active_rooms[room_code]['users']),
-                'message_count': active_rooms[room_code]['message_count']
-            }, room=room_code)
+        room_stats.mark(room_code)
+        stats = room_stats.take(room_code)
+        # Room stats are appended to the stored packet's text; the message itself is not re-encoded.
+        broadcast = packet.with_fields(room_stats=stats) if stats is not None else packet
+        if message_batcher:
+            # The batch goes to the whole room; senders skip their own messages in it.
+            batch = message_batcher.add(room_code, broadcast)
+            if batch is not None:
+                emit('receive_batch', batch, room=room_code)
+            if not batch_flusher_started:
+                batch_flusher_started = True
+                socketio.start_background_task(flush_message_batches)
+        else:
+            emit('receive_message', broadcast, room=room_code, include_self=False)
+        emit('message_sent', broadcast)
+        metrics.since('fanout', t)
+        metrics.since('message', start)
         
-    except Exception as e:
-        print(f"[ERROR] Failed to handle message: {e}")
+    except Exception:
+        log.exception('failed to handle message')
         emit('error', {'message': 'Failed to send message'})
 
+typing_tracker = TypingTracker(tick=settings.typing_tick)
+typing_flusher_started = False
+# Each worker publishes the typers of its own sessions; clients merge the sets by source.
+TYPING_SOURCE = str(os.getpid())
+
+def flush_typing():
+    """Emit each room's typing set once per tick, and only when it changed."""
+    while True:
+        socketio.sleep(typing_tracker.tick)
+        for room_code, users in typing_tracker.flush().items():
+            emit_droppable('typing_users', {'room': room_code, 'users': users, 'source': TYPING_SOURCE},
+                           room_code)
+
 @socketio.on('typing')
 def handle_typing(data):
     """Handle typing indicators"""
-    user_data = active_users.get(request.sid, {})
-    username = user_data.get('username', 'Unknown')
-    room_code = user_data.get('room', 'default')
+    global typing_flusher_started
+    session = sessions.get(request.sid)
+    username = session.username if session else 'Unknown'
+    room_code = (session.room if session else None) or 'default'
     
-    emit('user_typing', {
-        'username': username,
-        'is_typing': data.get('is_typing', False),
-        'room': room_code
-    }, room=room_code, include_self=False)
+    typing_tracker.update(request.sid, room_code, username, bool(data.get('is_typing', False)))
+    if not typing_flusher_started:
+        typing_flusher_started = True
+        socketio.start_background_task(flush_typing)
+
+def warm_up():
+    """Do the slow one-time setup that first requests would otherwise wait for."""
+    start = time.perf_counter()
+    key_manager.warm()
+    get_cipher()
+    server_ip()
+    log_event(log, logging.DEBUG, 'warm-up done', ms=round((time.perf_counter() - start) * 1000, 1))
+
+socketio.start_background_task(warm_up)
+startup.mark('services')
 
 if __name__ == '__main__':
     print("[*] Starting Web SecureTalk Server...")
-    port = int(os.environ.get("PORT", 5000))
+    port = settings.port
     print(f"[*] Listening on 0.0.0.0:{port}")
-    socketio.run(app, host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
+    if cluster:
+        # One of several workers started by web_cluster.py: share the port with SO_REUSEPORT.
+        import eventlet.wsgi
+        eventlet.wsgi.server(eventlet.listen(('0.0.0.0', port), reuse_port=True), app, log_output=False)
+    else:
+        socketio.run(app, host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
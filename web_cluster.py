@@ -0,0 +1,55 @@
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+from message_bus import BusBroker
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def start_workers(workers, port, bus_url, env=None):
+    """Start `workers` web_chat_server.py processes sharing `port` and the bus at `bus_url`."""
+    env = dict(env or os.environ, SECURETALK_BUS=bus_url, PORT=str(port))
+    return [
+        subprocess.Popen([sys.executable, os.path.join(ROOT, 'web_chat_server.py')], env=env)
+        for _ in range(workers)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several SecureTalk web workers behind one port")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    parser.add_argument('--bus', default=None,
+                        help="message bus URL (redis://... or unix:///path); "
+                             "by default a local Unix-socket broker is started")
+    args = parser.parse_args()
+
+    broker = None
+    bus_url = args.bus
+    if bus_url is None:
+        path = os.path.join(tempfile.gettempdir(), f'securetalk-bus-{os.getpid()}.sock')
+        broker = BusBroker(path).start()
+        bus_url = f'unix://{path}'
+
+    print(f"[*] Starting {args.workers} SecureTalk workers on port {args.port} (bus: {bus_url})")
+    procs = start_workers(args.workers, args.port, bus_url)
+    try:
+        for proc in procs:
+            proc.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for proc in procs:
+            if proc.poll() is None:
+                proc.send_signal(signal.SIGTERM)
+        for proc in procs:
+            proc.wait()
+        if broker:
+            broker.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import json
+import re
+import secrets
+
+loads = json.loads
+
+_PLACEHOLDER = re.compile(r'"\\u0000([0-9a-f]{16}):(\d+)\\u0000"')
+
+
+class RawJSON:
+    """Already-serialized JSON that dumps() splices into its output verbatim."""
+
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+    @classmethod
+    def encode(cls, obj):
+        return cls(json.dumps(obj, separators=(',', ':')))
+
+    def with_fields(self, **fields):
+        """A copy of this encoded object with `fields` appended, without re-encoding the rest."""
+        if not fields:
+            return self
+        extra = json.dumps(fields, separators=(',', ':'))
+        return RawJSON(f'{self.text[:-1]},{extra[1:]}')
+
+    def __len__(self):
+        return len(self.text)
+
+
+def dumps(obj, **kwargs):
+    """json.dumps() that writes RawJSON values as their stored text.
+
+    Packets without RawJSON go through the C encoder untouched, and a list
+    holding RawJSON items is joined without re-encoding them. Any other
+    RawJSON is first written as a placeholder string carrying a per-call random
+    token, so client-supplied strings can never be mistaken for one, and the
+    placeholders are swapped for the stored text afterwards.
+    """
+    if type(obj) is list and any(type(item) is RawJSON for item in obj):
+        # python-socketio encodes every packet as [event, *args]; join those directly.
+        separator = kwargs.get('separators', (', ', ': '))[0]
+        return '[' + separator.join(item.text if type(item) is RawJSON else dumps(item, **kwargs)
+                                    for item in obj) + ']'
+    spliced = []
+    token = None
+
+    def splice(o):
+        nonlocal token
+        if not isinstance(o, RawJSON):
+            raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+        if token is None:
+            token = secrets.token_hex(8)
+        spliced.append(o.text)
+        return f'\x00{token}:{len(spliced) - 1}\x00'
+
+    text = json.dumps(obj, default=splice, **kwargs)
+    if not spliced:
+        return text
+    return _PLACEHOLDER.sub(lambda m: spliced[int(m.group(2))] if m.group(1) == token else m.group(0), text)